@@ -7,18 +7,125 @@ import json
 import time
 import uvicorn
 from fastapi import FastAPI, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel, Field
 from typing import Optional, List
 
-from app.db import get_db_connection, get_vectorstore
+from app.db import get_db_connection, get_db_pool_snapshot, close_db_pool, get_vectorstore
 from app.embedding import get_embeddings, load_documents
-from app.llm import query
-from app.config import MODEL_SCHEMA_FILE, PROMPT_TEMPLATE_FILE
+from app.llm import query, stream_query
+from app.config import (MODEL_SCHEMA_FILE, PROMPT_TEMPLATE_FILE, LLM_WARMUP_ON_START, LLM_QUEUE_TIMEOUT,
+                        LLM_CASCADE_ENABLED, LLM_SMALL_MODEL)
+from app.async_pipeline import has_async_dependencies, aquery, get_async_pool, close_async_resources
+from app.llm_client import get_ollama_client, warmup_llm
+from app.metrics import get_metrics
+from app.registry import load_definitions
+from app.scheduler import (get_scheduler, llm_request_context, set_request_options, LLMQueueTimeout,
+                           PRIORITY_INTERACTIVE)
+from app.coalesce import get_single_flight, get_query_key, bump_corpus_version
+from app.sessions import create_session, get_session, delete_session
+
+
+def answer_to_dict(answer):
+    """
+    Sorgu yanıtını JSON olarak döndürülebilecek sözlüğe dönüştürür.
+    """
+    # Yanıt bir model örneği ise
+    if hasattr(answer, "__dict__"):
+        result = {}
+        for key, value in answer.__dict__.items():
+            if key not in ["__pydantic_private__", "model_fields", "model_config"]:
+                result[key] = value
+        return result
+
+    # Ham yanıt
+    return {"answer": answer}
 
 
-def start_api(port=8000):
+def format_sse(event, data):
     """
-    API servisini başlat
+    Olayı Server-Sent Events biçiminde kodlar.
+    """
+    payload = json.dumps(data, ensure_ascii=False, default=str)
+    return f"event: {event}\ndata: {payload}\n\n"
+
+
+# Belgeleri gruplandırarak listele (psycopg2 ve asyncpg yer tutucuları ile biçimlendirilir)
+LIST_DOCUMENTS_SQL = """
+SELECT
+    document_id,
+    MIN(title) as title,
+    COUNT(*) as chunk_count,
+    MAX(created_at) as last_updated
+FROM document_chunks
+GROUP BY document_id
+ORDER BY last_updated DESC
+LIMIT {limit} OFFSET {offset}
+"""
+
+
+def delete_document_chunks(document_id):
+    """
+    Belgenin tüm parçalarını siler ve silinen parça sayısını döndürür.
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("DELETE FROM document_chunks WHERE document_id = %s", (document_id,))
+        deleted_count = cursor.rowcount
+        conn.commit()
+        bump_corpus_version()
+        return deleted_count
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def list_document_rows(limit, offset):
+    """
+    Belge özet satırlarını ve toplam belge sayısını döndürür.
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute(LIST_DOCUMENTS_SQL.format(limit="%s", offset="%s"), (limit, offset))
+        results = cursor.fetchall()
+
+        # Toplam belge sayısını al
+        cursor.execute("SELECT COUNT(DISTINCT document_id) FROM document_chunks")
+        total_count = cursor.fetchone()[0]
+        return results, total_count
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def check_db_connection():
+    """
+    Veritabanı bağlantısını basit bir sorgu ile doğrular.
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT 1")
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def create_app(warmup=LLM_WARMUP_ON_START, sessions=True):
+    """
+    API uygulamasını oluşturur.
+
+    Args:
+        warmup: Servis başlarken LLM modeli belleğe yüklensin mi (çok işçili modda
+            model ana süreçte bir kez yüklendiği için işçilerde kapatılır)
+        sessions: Konuşma oturumları etkin mi (oturumlar süreç içinde tutulduğundan çok
+            işçili modda kapatılır; /sessions ve session_id istekleri 501 ile reddedilir)
+
+    Returns:
+        FastAPI uygulaması
     """
     app = FastAPI(title="RAG API",
                   description="Vektör tabanlı bilgi erişimi için API",
@@ -29,6 +136,19 @@ def start_api(port=8000):
         template: Optional[str] = Field("default", description="Kullanılacak şablon")
         model: Optional[str] = Field("DocumentResponse", description="Kullanılacak yanıt modeli")
         embedding_model: Optional[str] = Field("all-MiniLM-L6-v2", description="Kullanılacak embedding modeli")
+        rerank: Optional[bool] = Field(None, description="Cross-encoder ile yeniden sıralama (None=varsayılan)")
+        mmr: Optional[bool] = Field(None, description="MMR ile çeşitlendirme (None=varsayılan)")
+        mmr_lambda: Optional[float] = Field(None, ge=0.0, le=1.0, description="MMR ilgi/çeşitlilik dengesi")
+        mmr_fetch_k: Optional[int] = Field(None, ge=1, le=200, description="MMR aday havuzu büyüklüğü")
+        adaptive: Optional[bool] = Field(None, description="Uyarlanabilir k ile arama (None=varsayılan)")
+        sql_filter: Optional[bool] = Field(None, description="Skor eşiğini SQL içinde uygula (None=varsayılan)")
+        window: Optional[int] = Field(None, ge=0, le=10, description="İsabetlere eklenecek ±komşu parça sayısı")
+        compress: Optional[bool] = Field(None, description="Bağlamı cümle düzeyinde sıkıştır (None=varsayılan)")
+        cascade: Optional[bool] = Field(None, description="Önce küçük modelle yanıtla, gerekirse büyük modele geç "
+                                                          "(None=varsayılan, akış modunda kullanılmaz)")
+        timeout: Optional[float] = Field(None, gt=0, le=600,
+                                         description="LLM kuyruğunda en fazla bekleme süresi (saniye, None=varsayılan)")
+        session_id: Optional[str] = Field(None, description="POST /sessions ile alınan oturum kimliği (None=oturumsuz)")
 
     class IndexTextRequest(BaseModel):
         text: str = Field(..., description="İndekslenecek metin içeriği")
@@ -38,33 +158,145 @@ def start_api(port=8000):
     class DeleteDocumentRequest(BaseModel):
         document_id: str = Field(..., description="Silinecek belge ID")
 
+    if not has_async_dependencies:
+        print("⚠️ asyncpg/httpx bulunamadı, istekler iş parçacığı havuzunda senkron yolla işlenecek")
+
+    @app.on_event("startup")
+    async def startup_event():
+        # İlk sorgunun model yükleme süresini beklememesi için modeli önceden yükle
+        if warmup:
+            await run_in_threadpool(warmup_llm)
+            if LLM_CASCADE_ENABLED:
+                await run_in_threadpool(warmup_llm, LLM_SMALL_MODEL)
+
+    @app.on_event("shutdown")
+    async def shutdown_event():
+        await close_async_resources()
+        get_ollama_client().close()
+        close_db_pool()
+
+    def require_sessions():
+        """Oturumlar kapalıysa 501 fırlatır"""
+        if not sessions:
+            raise HTTPException(status_code=501,
+                                detail="Oturumlar çok işçili modda desteklenmiyor; servisi tek işçiyle başlatın")
+
+    def resolve_session(session_id):
+        """İstekteki oturumu döndürür; oturum yoksa veya süresi dolduysa 404 fırlatır"""
+        if session_id is None:
+            return None
+        require_sessions()
+        session = get_session(session_id)
+        if session is None:
+            raise HTTPException(status_code=404, detail=f"Oturum bulunamadı: {session_id}")
+        return session
+
+    @app.post("/sessions", summary="Konuşma oturumu başlat")
+    async def create_session_endpoint():
+        require_sessions()
+        return {"session_id": create_session().session_id}
+
+    @app.get("/sessions/{session_id}", summary="Oturum bilgisi")
+    async def get_session_endpoint(session_id: str):
+        return resolve_session(session_id).to_dict()
+
+    @app.delete("/sessions/{session_id}", summary="Oturumu sonlandır")
+    async def delete_session_endpoint(session_id: str):
+        require_sessions()
+        if not delete_session(session_id):
+            raise HTTPException(status_code=404, detail=f"Oturum bulunamadı: {session_id}")
+        return {"status": "success", "session_id": session_id}
+
     @app.post("/query", summary="Sorgu yap")
     async def query_endpoint(request: QueryRequest):
+        session = resolve_session(request.session_id)
         try:
-            answer, sources = query(
-                request.query,
-                request.template,
-                request.model,
-                request.embedding_model
+            retrieval_options = dict(
+                rerank=request.rerank,
+                mmr=request.mmr,
+                mmr_lambda=request.mmr_lambda,
+                mmr_fetch_k=request.mmr_fetch_k,
+                adaptive=request.adaptive,
+                sql_filter=request.sql_filter,
+                window=request.window,
+                compress=request.compress,
+                cascade=request.cascade
             )
-
-            # Yanıt bir model örneği ise
-            if hasattr(answer, "__dict__"):
-                result = {}
-                for key, value in answer.__dict__.items():
-                    if key not in ["__pydantic_private__", "model_fields", "model_config"]:
-                        result[key] = value
-            else:
-                # Ham yanıt
-                result = {"answer": answer}
+            # Aynı anda gelen aynı sorgular tek hesaplamayı paylaşır; oturumlu sorgular
+            # geçmişe bağlı olduğundan yalnızca aynı oturum içinde birleştirilir
+            key = get_query_key(request.query, request.template, request.model,
+                                embedding_model=request.embedding_model, **retrieval_options)
+            single_flight = get_single_flight()
+            if session is not None:
+                retrieval_options["session"] = session
+                key = (key, session.session_id)
+
+            # Etkileşimli sorgular LLM kuyruğunda toplu işlerin önüne geçer
+            with llm_request_context(PRIORITY_INTERACTIVE, request.timeout or LLM_QUEUE_TIMEOUT):
+                if has_async_dependencies:
+                    answer, sources = await single_flight.ado(key, lambda: aquery(
+                        request.query,
+                        request.template,
+                        request.model,
+                        request.embedding_model,
+                        **retrieval_options
+                    ))
+                else:
+                    answer, sources = await run_in_threadpool(
+                        single_flight.do,
+                        key,
+                        query,
+                        request.query,
+                        request.template,
+                        request.model,
+                        request.embedding_model,
+                        **retrieval_options
+                    )
 
             return {
-                "result": result,
-                "sources": sources
+                "result": answer_to_dict(answer),
+                "sources": sources,
+                "session_id": request.session_id
             }
+        except LLMQueueTimeout as e:
+            raise HTTPException(status_code=503, detail=str(e))
         except Exception as e:
             raise HTTPException(status_code=500, detail=str(e))
 
+    @app.post("/query/stream", summary="Akış modunda sorgu yap (SSE)")
+    async def query_stream_endpoint(request: QueryRequest):
+        session = resolve_session(request.session_id)
+        # Akış, bu isteğin görevinde tüketildiği için bağlam değeri üretici boyunca geçerli kalır
+        set_request_options(PRIORITY_INTERACTIVE, request.timeout or LLM_QUEUE_TIMEOUT)
+
+        def event_stream():
+            try:
+                events = stream_query(
+                    request.query,
+                    request.template,
+                    request.model,
+                    request.embedding_model,
+                    rerank=request.rerank,
+                    mmr=request.mmr,
+                    mmr_lambda=request.mmr_lambda,
+                    mmr_fetch_k=request.mmr_fetch_k,
+                    adaptive=request.adaptive,
+                    sql_filter=request.sql_filter,
+                    window=request.window,
+                    compress=request.compress,
+                    session=session
+                )
+                for event, data in events:
+                    if event == "result":
+                        data = answer_to_dict(data)
+                    yield format_sse(event, data)
+            except Exception as e:
+                yield format_sse("error", {"detail": str(e)})
+
+        # Senkron üretici Starlette tarafından iş parçacığı havuzunda tüketilir
+        return StreamingResponse(event_stream(), media_type="text/event-stream",
+                                 headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
     @app.post("/index_text", summary="Metin indeksle")
     async def index_text_endpoint(request: IndexTextRequest):
         try:
@@ -87,8 +319,8 @@ def start_api(port=8000):
                     f.write(f"# {title}\n\n")
                 f.write(text)
 
-            # Dosyayı indeksle
-            count = load_documents(file_path)
+            # Dosyayı indeksle (embedding ve veritabanı yazımı bloklayıcıdır)
+            count = await run_in_threadpool(load_documents, file_path)
 
             return {
                 "status": "success",
@@ -101,39 +333,30 @@ def start_api(port=8000):
     @app.get("/templates", summary="Şablonları listele")
     async def list_templates():
         try:
-            with open(PROMPT_TEMPLATE_FILE, 'r', encoding='utf-8') as f:
-                return json.load(f)
+            return load_definitions(PROMPT_TEMPLATE_FILE)
         except Exception as e:
             raise HTTPException(status_code=500, detail=str(e))
 
     @app.get("/models", summary="Modelleri listele")
     async def list_models():
         try:
-            with open(MODEL_SCHEMA_FILE, 'r', encoding='utf-8') as f:
-                return json.load(f)
+            return load_definitions(MODEL_SCHEMA_FILE)
         except Exception as e:
             raise HTTPException(status_code=500, detail=str(e))
 
     @app.delete("/documents/{document_id}", summary="Belge sil")
     async def delete_document_endpoint(document_id: str):
         try:
-            conn = get_db_connection()
-            cursor = conn.cursor()
-
-            # Belgenin chunk'larını sil
-            delete_query = """
-            DELETE FROM document_chunks 
-            WHERE document_id = %s
-            RETURNING COUNT(*)
-            """
-
-            cursor.execute(delete_query, (document_id,))
-            result = cursor.fetchone()
-            deleted_count = result[0] if result else 0
-
-            conn.commit()
-            cursor.close()
-            conn.close()
+            if has_async_dependencies:
+                pool = await get_async_pool()
+                async with pool.acquire() as conn:
+                    # Belgenin chunk'larını sil ("DELETE <n>" durum metninden sayıyı al)
+                    status = await conn.execute("DELETE FROM document_chunks WHERE document_id = $1",
+                                                document_id)
+                deleted_count = int(status.split()[-1])
+                bump_corpus_version()
+            else:
+                deleted_count = await run_in_threadpool(delete_document_chunks, document_id)
 
             return {
                 "status": "success",
@@ -146,28 +369,15 @@ def start_api(port=8000):
     @app.get("/documents", summary="Belgeleri listele")
     async def list_documents_endpoint(limit: int = Query(10, ge=1, le=100), offset: int = Query(0, ge=0)):
         try:
-            conn = get_db_connection()
-            cursor = conn.cursor()
-
-            # Belgeleri gruplandırarak listele
-            query = """
-            SELECT 
-                document_id, 
-                FIRST_VALUE(title) OVER (PARTITION BY document_id ORDER BY id) as title,
-                COUNT(*) as chunk_count,
-                MAX(created_at) as last_updated
-            FROM document_chunks
-            GROUP BY document_id
-            ORDER BY last_updated DESC
-            LIMIT %s OFFSET %s
-            """
-
-            cursor.execute(query, (limit, offset))
-            results = cursor.fetchall()
-
-            # Toplam belge sayısını al
-            cursor.execute("SELECT COUNT(DISTINCT document_id) FROM document_chunks")
-            total_count = cursor.fetchone()[0]
+            if has_async_dependencies:
+                pool = await get_async_pool()
+                async with pool.acquire() as conn:
+                    results = await conn.fetch(LIST_DOCUMENTS_SQL.format(limit="$1", offset="$2"),
+                                               limit, offset)
+                    total_count = await conn.fetchval("SELECT COUNT(DISTINCT document_id) FROM document_chunks")
+                results = [tuple(row) for row in results]
+            else:
+                results, total_count = await run_in_threadpool(list_document_rows, limit, offset)
 
             documents = []
             for doc_id, title, chunk_count, last_updated in results:
@@ -178,9 +388,6 @@ def start_api(port=8000):
                     "last_updated": last_updated.isoformat() if last_updated else None
                 })
 
-            cursor.close()
-            conn.close()
-
             return {
                 "documents": documents,
                 "total": total_count,
@@ -193,11 +400,12 @@ def start_api(port=8000):
     @app.get("/health", summary="Sağlık kontrolü")
     async def health_check():
         try:
-            conn = get_db_connection()
-            cursor = conn.cursor()
-            cursor.execute("SELECT 1")
-            cursor.close()
-            conn.close()
+            if has_async_dependencies:
+                pool = await get_async_pool()
+                async with pool.acquire() as conn:
+                    await conn.fetchval("SELECT 1")
+            else:
+                await run_in_threadpool(check_db_connection)
 
             return {
                 "status": "healthy",
@@ -211,5 +419,29 @@ def start_api(port=8000):
                 "timestamp": time.time()
             }
 
-    # API servisini başlat
-    uvicorn.run(app, host="0.0.0.0", port=port)
\ No newline at end of file
+    @app.get("/metrics", summary="LLM süre ve kuyruk metrikleri")
+    async def metrics_endpoint():
+        metrics = get_metrics()
+        metrics["scheduler"] = get_scheduler().snapshot()
+        metrics["db_pool"].update(get_db_pool_snapshot())
+        metrics["pid"] = os.getpid()
+        return metrics
+
+    return app
+
+
+def start_api(port=8000, host="0.0.0.0", workers=1):
+    """
+    API servisini başlat
+
+    Args:
+        port: Dinlenecek port
+        host: Dinlenecek adres
+        workers: İşçi süreç sayısı; 1'den büyükse modeller ana süreçte yüklenip işçiler fork ile başlatılır
+    """
+    if workers > 1:
+        from app.prefork import run_prefork
+        run_prefork(host, port, workers)
+        return
+
+    uvicorn.run(create_app(), host=host, port=port)
\ No newline at end of file
@@ -0,0 +1,418 @@
+"""
+FastAPI servisi için asenkron sorgu hattı.
+Veritabanı erişimi asyncpg havuzu, Ollama çağrıları httpx ile yapılır;
+embedding ve CPU yoğun adımlar sınırlı bir iş parçacığı havuzunda çalışır.
+"""
+import json
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Tuple, Sequence
+
+from langchain_core.documents import Document
+
+from app.config import (DB_CONNECTION, COLLECTION_NAME, LLM_MODEL, OLLAMA_BASE_URL, LLM_REQUEST_TIMEOUT,
+                        LLM_KEEP_ALIVE, LLM_POOL_SIZE, ASYNC_DB_POOL_MIN_SIZE, ASYNC_DB_POOL_MAX_SIZE,
+                        ASYNC_EXECUTOR_WORKERS, LLM_SMALL_MODEL, LLM_CASCADE_ENABLED)
+from app.metrics import record_generation, record_error
+from app.scheduler import get_scheduler
+from app.llm_client import resolve_prompt_context, store_prompt_context
+
+try:
+    import asyncpg
+    import httpx
+
+    has_async_dependencies = True
+except ImportError:
+    has_async_dependencies = False
+
+_pool = None
+_pool_lock = None
+_http_client = None
+_executor = ThreadPoolExecutor(max_workers=ASYNC_EXECUTOR_WORKERS, thread_name_prefix="ragcli-worker")
+
+
+async def run_blocking(func, *args, **kwargs):
+    """Bloklayan bir fonksiyonu sınırlı iş parçacığı havuzunda çalıştırır"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, functools.partial(func, *args, **kwargs))
+
+
+async def get_async_pool():
+    """asyncpg bağlantı havuzunu döndür veya oluştur"""
+    global _pool, _pool_lock
+
+    if _pool is not None:
+        return _pool
+
+    if _pool_lock is None:
+        _pool_lock = asyncio.Lock()
+
+    async with _pool_lock:
+        if _pool is None:
+            print(f"INFO - Asenkron veritabanı havuzu oluşturuluyor ({ASYNC_DB_POOL_MIN_SIZE}-{ASYNC_DB_POOL_MAX_SIZE})")
+            _pool = await asyncpg.create_pool(
+                DB_CONNECTION,
+                min_size=ASYNC_DB_POOL_MIN_SIZE,
+                max_size=ASYNC_DB_POOL_MAX_SIZE
+            )
+    return _pool
+
+
+def get_http_client():
+    """Ollama için paylaşılan asenkron HTTP istemcisini döndür"""
+    global _http_client
+
+    if _http_client is None:
+        _http_client = httpx.AsyncClient(base_url=OLLAMA_BASE_URL, timeout=LLM_REQUEST_TIMEOUT,
+                                         limits=httpx.Limits(max_keepalive_connections=LLM_POOL_SIZE))
+    return _http_client
+
+
+async def close_async_resources():
+    """Havuzu ve HTTP istemcisini kapatır (servis kapanırken çağrılır)"""
+    global _pool, _http_client
+
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+
+def reset_async_resources():
+    """
+    Havuz ve HTTP istemcisi referanslarını kapatmadan bırakır.
+
+    Fork ile başlatılan işçide çağrılır; her işçi kendi havuzunu ve istemcisini oluşturur.
+    """
+    global _pool, _pool_lock, _http_client
+    _pool = None
+    _pool_lock = None
+    _http_client = None
+
+
+async def aembed_query(question: str, model_name: str = None) -> List[float]:
+    """Sorgu embedding'ini iş parçacığı havuzunda hesaplar"""
+    from app.embedding import get_embedding_model
+
+    def encode():
+        return get_embedding_model(model_name).encode(question).tolist()
+
+    return await run_blocking(encode)
+
+
+async def asearch_collection(query_embedding: Sequence[float], k: int) -> List[Tuple[Document, float]]:
+    """
+    LangChain PGVector koleksiyonunda asenkron benzerlik araması yapar.
+
+    PGVector'ün varsayılan kosinüs uzaklığını kullanır, böylece senkron
+    similarity_search_with_score ile aynı sıralamayı ve ham skorları döndürür.
+
+    Args:
+        query_embedding: Sorgu vektörü
+        k: Getirilecek belge sayısı
+
+    Returns:
+        (belge, uzaklık) tuple'larının listesi (en yakın üstte)
+    """
+    from app.retrieval import to_vector_literal
+
+    pool = await get_async_pool()
+    async with pool.acquire() as conn:
+        rows = await conn.fetch("""
+        SELECT e.document, e.cmetadata, e.embedding <=> $1::text::vector AS distance
+        FROM langchain_pg_embedding e
+        JOIN langchain_pg_collection c ON e.collection_id = c.uuid
+        WHERE c.name = $2
+        ORDER BY distance
+        LIMIT $3
+        """, to_vector_literal(query_embedding), COLLECTION_NAME, k)
+
+    results = []
+    for row in rows:
+        metadata = row["cmetadata"]
+        if isinstance(metadata, str):
+            metadata = json.loads(metadata)
+        results.append((Document(page_content=row["document"], metadata=metadata or {}), float(row["distance"])))
+    return results
+
+
+async def asearch_collection_filtered(query_embedding: Sequence[float], k: int, threshold: float, min_docs: int = 3,
+                                      max_docs: int = None) -> List[Tuple[Document, float]]:
+    """
+    search_collection_filtered'ın asenkron karşılığı (normalizasyon ve eşik SQL içinde).
+
+    Returns:
+        (belge, normalize_skor) tuple'larının listesi (yüksek->düşük sıralı)
+    """
+    from app.retrieval import to_vector_literal, FILTERED_SEARCH_SQL
+
+    params = ("query", "collection", "k", "threshold", "min_docs", "max_docs")
+    sql = FILTERED_SEARCH_SQL.format(**{name: f"${i}" for i, name in enumerate(params, start=1)})
+
+    pool = await get_async_pool()
+    async with pool.acquire() as conn:
+        rows = await conn.fetch(sql, to_vector_literal(query_embedding), COLLECTION_NAME, k,
+                                threshold, min_docs, max_docs)
+
+    results = []
+    for row in rows:
+        metadata = row["cmetadata"]
+        if isinstance(metadata, str):
+            metadata = json.loads(metadata)
+        results.append((Document(page_content=row["document"], metadata=metadata or {}), float(row["similarity"])))
+    return results
+
+
+async def aexpand_chunk_windows(docs: List[Document], window: int = 1) -> List[Document]:
+    """
+    expand_chunk_windows'ın asenkron karşılığı (komşu parçalar tek toplu sorguyla).
+
+    Returns:
+        Genişletilmiş belge listesi
+    """
+    from app.retrieval import merge_chunk_windows, assemble_chunk_windows, WINDOW_CHUNKS_SQL
+
+    if window <= 0 or not docs:
+        return docs
+
+    windows, doc_windows = merge_chunk_windows(docs, window)
+    if not windows:
+        return docs
+
+    params = ("document_ids", "start_indexes", "end_indexes", "window_ids")
+    sql = WINDOW_CHUNKS_SQL.format(**{name: f"${i}" for i, name in enumerate(params, start=1)})
+
+    pool = await get_async_pool()
+    async with pool.acquire() as conn:
+        rows = await conn.fetch(sql,
+                                [w["document_id"] for w in windows],
+                                [w["start"] for w in windows],
+                                [w["end"] for w in windows],
+                                list(range(len(windows))))
+
+    return assemble_chunk_windows(docs, windows, doc_windows, [tuple(row) for row in rows])
+
+
+async def agenerate(prompt: str, model: str = None, response_format=None, cache_prefix: str = None,
+                    conversation_id: str = None) -> str:
+    """
+    Ollama /api/generate uç noktasından asenkron olarak tam yanıt alır.
+
+    response_format verilirse (JSON şeması) çıktı bu şemaya kısıtlanır; cache_prefix ve
+    conversation_id verilirse konuşmanın aynı önek için saklanan context token'ları yeniden kullanılır.
+    """
+    prompt, context, key = resolve_prompt_context(prompt, model, cache_prefix, conversation_id)
+    payload = {
+        "model": model or LLM_MODEL,
+        "prompt": prompt,
+        "stream": False,
+        "keep_alive": LLM_KEEP_ALIVE
+    }
+    if response_format is not None:
+        payload["format"] = response_format
+    if context is not None:
+        payload["context"] = context
+
+    scheduler = get_scheduler()
+    await scheduler.aacquire()
+    try:
+        response = await get_http_client().post("/api/generate", json=payload)
+        response.raise_for_status()
+        data = response.json()
+    except Exception:
+        record_error()
+        raise
+    finally:
+        scheduler.release()
+    record_generation(data)
+    store_prompt_context(key, data, reused=context is not None)
+    return data.get("response", "")
+
+
+async def aretrieve_documents(question, embedding_model=None, rerank=None, mmr=None, mmr_lambda=None,
+                             mmr_fetch_k=None, adaptive=None, sql_filter=None, window=None):
+    """
+    retrieve_documents'ın asenkron karşılığı.
+
+    Arama ve genişletme adımları olay döngüsünü bloklamadan yapılır. MMR yolu
+    document_chunks embedding'lerine ihtiyaç duyduğu için senkron yol iş parçacığı
+    havuzunda çalıştırılır.
+
+    Returns:
+        Belge listesi (ilgi sırasıyla)
+    """
+    from app.config import (EMBEDDING_MODEL, SIMILARITY_THRESHOLD, MAX_DOCUMENTS, RERANK_ENABLED,
+                            RERANK_CANDIDATES, MMR_ENABLED, ADAPTIVE_K_ENABLED, ADAPTIVE_INITIAL_K,
+                            ADAPTIVE_MAX_K, ADAPTIVE_SCORE_GAP, ADAPTIVE_KNEE_SENSITIVITY, SQL_FILTER_ENABLED,
+                            WINDOW_EXPANSION)
+    from app.category_centroids import classify_query
+    from app.llm import retrieve_documents, retrieve_fallback_documents, select_documents, add_sample_documents
+    from app.similarity import adaptive_search_step
+
+    if embedding_model is None:
+        embedding_model = EMBEDDING_MODEL
+    if rerank is None:
+        rerank = RERANK_ENABLED
+    if mmr is None:
+        mmr = MMR_ENABLED
+    if adaptive is None:
+        adaptive = ADAPTIVE_K_ENABLED
+    if sql_filter is None:
+        sql_filter = SQL_FILTER_ENABLED
+    if window is None:
+        window = WINDOW_EXPANSION
+
+    if mmr:
+        return await run_blocking(retrieve_documents, question, embedding_model=embedding_model, rerank=rerank,
+                                  mmr=mmr, mmr_lambda=mmr_lambda, mmr_fetch_k=mmr_fetch_k, adaptive=adaptive,
+                                  sql_filter=sql_filter, window=window)
+
+    threshold = max(0.1, min(SIMILARITY_THRESHOLD, 0.4))  # 0.1-0.4 arasında sınırla
+    score_type = "l2"
+    docs = []
+
+    try:
+        query_embedding = await aembed_query(question, embedding_model)
+        # Merkez hesabı ve gerekirse merkezlerin yüklenmesi (embedding/veritabanı) havuzda yapılır
+        query_category = await run_blocking(classify_query, question, query_embedding, embedding_model)
+        print(f"INFO - Algılanan sorgu kategorisi: {query_category}")
+
+        if adaptive and not rerank:
+            # Küçük k ile başla, kuyruk hâlâ ilgiliyse genişlet
+            k = max(1, min(ADAPTIVE_INITIAL_K, ADAPTIVE_MAX_K))
+            while True:
+                raw_results = await asearch_collection(query_embedding, k)
+                next_k, original_docs_with_scores = adaptive_search_step(
+                    raw_results, k,
+                    max_k=ADAPTIVE_MAX_K,
+                    threshold=threshold,
+                    min_gap=ADAPTIVE_SCORE_GAP,
+                    knee_sensitivity=ADAPTIVE_KNEE_SENSITIVITY
+                )
+                if next_k is None:
+                    break
+                k = next_k
+        elif sql_filter and not rerank:
+            original_docs_with_scores = await asearch_collection_filtered(
+                query_embedding,
+                k=MAX_DOCUMENTS * 2,
+                threshold=threshold,
+                min_docs=3,
+                max_docs=MAX_DOCUMENTS if query_category in (None, "general") else None
+            )
+            score_type = "similarity"
+        else:
+            candidate_count = max(RERANK_CANDIDATES, MAX_DOCUMENTS) if rerank else MAX_DOCUMENTS * 2
+            original_docs_with_scores = await asearch_collection(query_embedding, candidate_count)
+
+        # Cross-encoder ve adayların anahtar kelime kategorilemesi CPU yoğun olduğundan havuzda çalıştırılır
+        if rerank:
+            docs = await run_blocking(select_documents, question, original_docs_with_scores,
+                                      query_category=query_category, rerank=True, threshold=threshold)
+        else:
+            docs = await run_blocking(select_documents, question, original_docs_with_scores,
+                                      query_category=query_category, threshold=threshold, score_type=score_type)
+
+        if window:
+            docs = await aexpand_chunk_windows(docs, window)
+    except Exception as e:
+        print(f"Benzerlik araması hatası: {e}")
+        import traceback
+        traceback.print_exc()
+
+        # Senkron yolla aynı geri dönüş: standart retriever havuzda çalıştırılır
+        docs = await run_blocking(retrieve_fallback_documents, question, docs, embedding_model)
+
+    return add_sample_documents(question, docs)
+
+
+async def aquery(question, template_name="default", model_name="DocumentResponse", embedding_model=None,
+                 compress=None, session=None, cascade=None, **retrieval_options):
+    """
+    query'nin asenkron karşılığı.
+
+    Args:
+        question: Kullanıcı sorusu
+        template_name: Kullanılacak prompt şablonu (default, academic, vb.)
+        model_name: Kullanılacak yanıt modeli (DocumentResponse, FilmInfo, vb.)
+        embedding_model: Kullanılacak embedding modeli (None=varsayılan model)
+        compress: Bağlam cümle düzeyinde sıkıştırılsın mı (None=config değeri)
+        session: Konuşma oturumu (app.sessions.Session, None=oturumsuz)
+        cascade: Önce küçük modelle yanıtlansın mı (None=config değeri)
+        **retrieval_options: aretrieve_documents'a iletilecek seçenekler (rerank, mmr, adaptive, ...)
+
+    Returns:
+        (cevap, kaynaklar) tuple'ı
+    """
+    from app.context import prepare_documents
+    from app.cascade import check_answer, record_cascade_result
+    from app.llm import build_context, build_sources
+
+    # Oturumdaki parçalar takip sorusu için yeterliyse arama yapılmaz (benzerlik hesabı havuzda)
+    docs = await run_blocking(session.get_cached_documents, question, embedding_model) if session else None
+    if docs is None:
+        docs = await aretrieve_documents(question, embedding_model=embedding_model, **retrieval_options)
+        if session is not None:
+            await run_blocking(session.remember_documents, docs, embedding_model)
+    print(f"DEBUG - Toplam {len(docs)} belge getirildi")
+
+    # Sıkıştırma ve token sayımı CPU'ya bağlıdır; olay döngüsünü bloke etmemesi için havuzda çalışır
+    docs = await run_blocking(prepare_documents, question, docs, compress=compress, embedding_model=embedding_model)
+    context = build_context(docs)
+    sources = build_sources(docs)
+
+    if cascade is None:
+        cascade = LLM_CASCADE_ENABLED
+
+    if cascade and LLM_SMALL_MODEL != LLM_MODEL:
+        # Önce küçük model; ucuz güven kontrolü başarısız olursa büyük modele geçilir
+        answer, valid = await agenerate_answer(question, context, template_name, model_name,
+                                               llm_model=LLM_SMALL_MODEL, session=session)
+        reason = check_answer(answer, context, valid)
+        record_cascade_result(reason)
+        if reason is not None:
+            print(f"INFO - {LLM_SMALL_MODEL} yanıtı yetersiz ({reason}), {LLM_MODEL} ile yeniden yanıtlanıyor")
+            answer, _ = await agenerate_answer(question, context, template_name, model_name, session=session)
+    else:
+        answer, _ = await agenerate_answer(question, context, template_name, model_name, session=session)
+
+    if session is not None:
+        await run_blocking(session.add_turn, question, answer)
+    return answer, sources
+
+
+async def agenerate_answer(question, context, template_name, model_name, llm_model=None, session=None):
+    """
+    generate_answer'ın asenkron karşılığı.
+
+    Returns:
+        (cevap, geçerli_mi) tuple'ı; geçerli_mi yalnızca JSON istenen yapılandırılmış yanıt şemaya
+        uymadığında False olur
+    """
+    from langchain.output_parsers import PydanticOutputParser
+    from app.llm import (is_structured_request, build_structured_prompt, parse_structured_answer,
+                         load_prompt_template, load_model_schema, parse_raw_response, get_response_format,
+                         get_conversation_context)
+
+    if is_structured_request(model_name, template_name):
+        print(f"INFO - Yapılandırılmış veri sorgusu algılandı: {model_name} modeli ile işleniyor...")
+        context, _ = get_conversation_context(None, context, session)
+        prompt = build_structured_prompt(question, context, model_name)
+        raw_answer = await agenerate(prompt, model=llm_model, response_format=get_response_format(model_name))
+        return parse_structured_answer(raw_answer, model_name)
+
+    prompt_template = load_prompt_template(template_name)
+    # Oturumdaki takip sorularında önek için saklanan context token'ları yeniden kullanılır
+    context, cache_options = get_conversation_context(prompt_template, context, session, llm_model)
+    prompt = prompt_template.format(query=question, context=context)
+    raw_answer = await agenerate(prompt, model=llm_model, **cache_options)
+
+    try:
+        output_schema = load_model_schema(model_name)
+        return PydanticOutputParser(pydantic_object=output_schema).parse(raw_answer), True
+    except Exception as e:
+        print(f"Not: Yapılandırılmış yanıt analizi başarısız, ham yanıt döndürülüyor. ({e})")
+        return parse_raw_response(raw_answer), True
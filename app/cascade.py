@@ -0,0 +1,90 @@
+"""
+Model kademesi (cascade) için ucuz güven kontrolleri.
+Soru önce küçük ve hızlı modelle (LLM_SMALL_MODEL) yanıtlanır; JSON istenen yanıt
+şemaya uymuyorsa, modelin bildirdiği güven düşükse veya yanıt bağlamla yeterince
+örtüşmüyorsa büyük modele (LLM_MODEL) geçilir. Serbest metin yanıtlarında yalnızca
+boşluk ve örtüşme kontrolleri uygulanır.
+"""
+import re
+from typing import Optional
+
+from app.config import CASCADE_MIN_CONFIDENCE, CASCADE_MIN_CONTEXT_OVERLAP
+from app.metrics import record_cascade
+
+WORD_PATTERN = re.compile(r"\w+", re.UNICODE)
+MIN_WORD_CHARS = 4  # Bağ/edat gibi kısa kelimeler örtüşme hesabına katılmaz
+
+
+def get_answer_fields(answer) -> dict:
+    """Yanıt modelini veya sözlüğü alan sözlüğüne dönüştürür"""
+    if hasattr(answer, "model_dump"):
+        return answer.model_dump()
+    if isinstance(answer, dict):
+        return answer
+    return {"answer": str(answer)}
+
+
+def collect_text(value) -> str:
+    """Alan değerlerindeki tüm metinleri birleştirir"""
+    if isinstance(value, dict):
+        return " ".join(collect_text(item) for item in value.values())
+    if isinstance(value, (list, tuple)):
+        return " ".join(collect_text(item) for item in value)
+    if isinstance(value, str):
+        return value
+    return ""
+
+
+def get_content_words(text: str) -> set:
+    """Metindeki anlamlı kelimeleri küçük harfe çevirerek döndürür"""
+    return {word for word in WORD_PATTERN.findall(text.casefold()) if len(word) >= MIN_WORD_CHARS}
+
+
+def get_context_overlap(answer_text: str, context: str) -> float:
+    """
+    Yanıttaki anlamlı kelimelerin bağlamda geçen oranını döndürür.
+
+    Returns:
+        0-1 arası oran; yanıtta anlamlı kelime yoksa 0
+    """
+    answer_words = get_content_words(answer_text)
+    if not answer_words:
+        return 0.0
+    return len(answer_words & get_content_words(context)) / len(answer_words)
+
+
+def check_answer(answer, context: str, valid: bool = True) -> Optional[str]:
+    """
+    Küçük modelin yanıtının yeterli olup olmadığını ucuz kontrollerle belirler.
+
+    Args:
+        answer: Yanıt modeli örneği veya sözlük
+        context: Yanıtın üretildiği bağlam metni
+        valid: JSON istenen yanıt şemaya uygun mu (serbest metin yanıtlarında True)
+
+    Returns:
+        Büyük modele geçme nedeni ("invalid_json", "empty", "low_confidence", "low_overlap")
+        veya yanıt yeterliyse None
+    """
+    if not valid:
+        return "invalid_json"
+
+    fields = get_answer_fields(answer)
+    confidence = fields.get("confidence")
+    answer_text = collect_text({key: value for key, value in fields.items() if key != "confidence"}).strip()
+    if not answer_text:
+        return "empty"
+
+    if isinstance(confidence, (int, float)) and confidence < CASCADE_MIN_CONFIDENCE:
+        return "low_confidence"
+
+    if get_context_overlap(answer_text, context) < CASCADE_MIN_CONTEXT_OVERLAP:
+        return "low_overlap"
+    return None
+
+
+def record_cascade_result(reason: Optional[str]):
+    """Kontrol sonucunu metriklere ekler ve yazdırır"""
+    record_cascade(reason)
+    if reason is None:
+        print("INFO - Küçük model yanıtı güven kontrolünden geçti")
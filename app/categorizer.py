@@ -4,14 +4,193 @@ Belge kategori algılama ve filtreleme işlevleri.
 İçerik kategorilerini tespit etmek için çeşitli yöntemler sunar.
 """
 import re
-from typing import List, Dict, Any, Tuple, Optional, Union
+from typing import List, Dict, Any, Tuple, Optional, Union, Iterable
 from langchain_core.documents import Document
 
+try:
+    import ahocorasick
+
+    has_ahocorasick = True
+except ImportError:
+    has_ahocorasick = False
+
+# Belge kategorileri için anahtar kelime taksonomisi (sıra, eşit skorda önceliği belirler)
+DOCUMENT_CATEGORY_KEYWORDS = {
+    "film": (
+        "film", "movie", "sinema", "cinema", "yönetmen", "director",
+        "oyuncu", "actor", "imdb", "cast", "inception", "leonardo dicaprio",
+        "vizyon", "box office", "gişe", "hollywood", "senaryo", "screenplay",
+        "başrol", "yardımcı rol", "oscar", "ödül"
+    ),
+    "book": (
+        "kitap", "book", "yazar", "author", "sayfa", "page", "cilt",
+        "roman", "novel", "yüzük", "lord of rings", "tolkien", "fantasy",
+        "fantastik", "edition", "basım", "baskı", "yayınevi", "publisher",
+        "chapter", "bölüm", "okuma", "reading"
+    ),
+    "person": (
+        "doğum", "birth", "ölüm", "death", "hayat", "life", "curie", "marie",
+        "biyografi", "biography", "bilim insanı", "scientist", "fizikçi", "physicist",
+        "kimyager", "chemist", "polonium", "radium", "nobel", "ödül", "prize",
+        "yaşam", "career", "kariyeri", "başarıları", "achievements"
+    )
+}
+
+# Herhangi biri geçerse kategoriye +5 eklenen terimler
+DOCUMENT_BOOST_TERMS = {
+    "film": ("inception", "cobb"),
+    "book": ("yüzük", "tolkien"),
+    "person": ("curie", "marie")
+}
+
+# İlk satırda (başlıkta) geçerse kategoriye +10 eklenen terimler
+DOCUMENT_TITLE_TERMS = {
+    "film": ("inception", "film"),
+    "book": ("yüzük", "lord"),
+    "person": ("marie", "curie")
+}
+
+# Sorgu kategorileri için anahtar kelime taksonomisi
+QUERY_CATEGORY_KEYWORDS = {
+    "film": (
+        "film", "movie", "sinema", "izle", "yönetmen", "vizyon",
+        "director", "oyuncu", "actor", "actress", "cast", "senaryo",
+        "imdb", "oscar", "box office", "gişe", "başrol", "screenplay",
+        "fragman", "trailer", "cinema"
+    ),
+    "book": (
+        "kitap", "book", "roman", "novel", "yazar", "author", "eser",
+        "oku", "read", "sayfa", "page", "bölüm", "chapter",
+        "yayınevi", "publisher", "basım", "edition", "cilt", "volume"
+    ),
+    "person": (
+        "kimdir", "who is", "doğum", "birth", "ölüm", "death",
+        "hayatı", "life", "biyografi", "biography", "kişi", "person",
+        "yaşamı", "kariyeri", "career", "başarı", "achievement", "ne yapmıştır",
+        "bilim insanı", "scientist", "tarih", "history", "bilim", "science"
+    )
+}
+
+_document_matcher = None
+_query_matcher = None
+
+
+class KeywordMatcher:
+    """
+    Bir anahtar kelime kümesini metin üzerinde tek geçişte arayan eşleştirici.
+
+    pyahocorasick kuruluysa Aho-Corasick otomatı, değilse anahtar kelimelerden
+    oluşturulan tek bir derlenmiş trie düzenli ifadesi kullanılır. Her iki yol da
+    her anahtar kelimenin metinde alt dize olarak geçip geçmediğini bulur.
+    """
+
+    def __init__(self, keywords: Iterable[str]):
+        self.keywords = sorted(set(keywords))
+
+        if has_ahocorasick:
+            self.automaton = ahocorasick.Automaton()
+            for keyword in self.keywords:
+                self.automaton.add_word(keyword, keyword)
+            self.automaton.make_automaton()
+        else:
+            self.automaton = None
+            self.pattern = re.compile(self._build_trie_pattern(self.keywords))
+            # Aynı konumda başlayan daha kısa anahtar kelimeler (en uzun eşleşmenin önekleri)
+            self.prefixes = {
+                keyword: [other for other in self.keywords if other != keyword and keyword.startswith(other)]
+                for keyword in self.keywords
+            }
+
+    @staticmethod
+    def _build_trie_pattern(keywords: List[str]) -> str:
+        """Anahtar kelimelerden ortak önekleri paylaşan bir düzenli ifade oluşturur"""
+        trie = {}
+        for keyword in keywords:
+            node = trie
+            for char in keyword:
+                node = node.setdefault(char, {})
+            node[""] = True
+
+        def to_pattern(node):
+            branches = [re.escape(char) + to_pattern(child) for char, child in sorted(node.items()) if char]
+            if not branches:
+                return ""
+            pattern = "(?:" + "|".join(branches) + ")"
+            # Kelime burada bitebiliyorsa devamı opsiyoneldir (açgözlü: en uzun eşleşme önce)
+            return pattern + "?" if "" in node else pattern
+
+        return to_pattern(trie)
+
+    def find(self, text: str) -> Dict[str, int]:
+        """
+        Metinde geçen anahtar kelimeleri bulur.
+
+        Args:
+            text: Aranacak (küçük harfe çevrilmiş) metin
+
+        Returns:
+            Anahtar kelime -> ilk geçtiği yerin bitiş indeksi (dahil değil) sözlüğü
+        """
+        found = {}
+
+        if self.automaton is not None:
+            for end_index, keyword in self.automaton.iter(text):
+                if keyword not in found:
+                    found[keyword] = end_index + 1
+            return found
+
+        # Her konumda en uzun eşleşme alınır, bir sonraki arama bir karakter sonra başlar
+        match = self.pattern.search(text)
+        while match:
+            start = match.start()
+            keyword = match.group()
+            for matched in [keyword] + self.prefixes[keyword]:
+                if matched not in found:
+                    found[matched] = start + len(matched)
+            match = self.pattern.search(text, start + 1)
+        return found
+
+
+def get_document_matcher() -> KeywordMatcher:
+    """Belge kategorisi eşleştiricisini döndür veya taksonomiden oluştur"""
+    global _document_matcher
+
+    if _document_matcher is None:
+        keywords = set()
+        for terms in (DOCUMENT_CATEGORY_KEYWORDS, DOCUMENT_BOOST_TERMS, DOCUMENT_TITLE_TERMS):
+            for category_terms in terms.values():
+                keywords.update(category_terms)
+        _document_matcher = KeywordMatcher(keywords)
+    return _document_matcher
+
+
+def get_query_matcher() -> KeywordMatcher:
+    """Sorgu kategorisi eşleştiricisini döndür veya taksonomiden oluştur"""
+    global _query_matcher
+
+    if _query_matcher is None:
+        keywords = set()
+        for category_terms in QUERY_CATEGORY_KEYWORDS.values():
+            keywords.update(category_terms)
+        _query_matcher = KeywordMatcher(keywords)
+    return _query_matcher
+
+
+def pick_category(scores: Dict[str, int], default: str) -> str:
+    """En yüksek skorlu kategoriyi döndürür (eşitlikte taksonomi sırası geçerlidir)"""
+    max_score = max(scores.values())
+    if max_score == 0:
+        return default
+    return next(category for category, score in scores.items() if score == max_score)
+
 
 def detect_document_category(content: str) -> str:
     """
     İçerik metnine göre belgenin kategorisini tespit eder.
 
+    Tüm kategorilerin anahtar kelimeleri tek geçişte aranır ve skorlar
+    bulunan anahtar kelime kümesinden hesaplanır.
+
     Args:
         content (str): Belge içeriği
 
@@ -31,68 +210,29 @@ def detect_document_category(content: str) -> str:
     if ("yüzüklerin efendisi" in content_lower or "lord of the rings" in content_lower) and "tolkien" in content_lower:
         return "book"
 
-    # Film/dizi kategorisi anahtar kelimeleri
-    film_keywords = [
-        "film", "movie", "sinema", "cinema", "yönetmen", "director",
-        "oyuncu", "actor", "imdb", "cast", "inception", "leonardo dicaprio",
-        "vizyon", "box office", "gişe", "hollywood", "senaryo", "screenplay",
-        "başrol", "yardımcı rol", "oscar", "ödül"
-    ]
-
-    # Kitap kategorisi anahtar kelimeleri
-    book_keywords = [
-        "kitap", "book", "yazar", "author", "sayfa", "page", "cilt",
-        "roman", "novel", "yüzük", "lord of rings", "tolkien", "fantasy",
-        "fantastik", "edition", "basım", "baskı", "yayınevi", "publisher",
-        "chapter", "bölüm", "okuma", "reading"
-    ]
-
-    # Kişi/biyografi kategorisi anahtar kelimeleri
-    person_keywords = [
-        "doğum", "birth", "ölüm", "death", "hayat", "life", "curie", "marie",
-        "biyografi", "biography", "bilim insanı", "scientist", "fizikçi", "physicist",
-        "kimyager", "chemist", "polonium", "radium", "nobel", "ödül", "prize",
-        "yaşam", "career", "kariyeri", "başarıları", "achievements"
-    ]
+    found = get_document_matcher().find(content_lower)
 
     # Her kategoriden kaç anahtar kelime var?
-    film_score = sum(1 for word in film_keywords if word in content_lower)
-    book_score = sum(1 for word in book_keywords if word in content_lower)
-    person_score = sum(1 for word in person_keywords if word in content_lower)
-
-    # Marie Curie ile ilgili ek kontroller
-    if "curie" in content_lower or "marie" in content_lower:
-        person_score += 5
-    # Inception filmi ile ilgili ek kontroller
-    if "inception" in content_lower or "cobb" in content_lower:
-        film_score += 5
-    # Yüzüklerin Efendisi ile ilgili ek kontroller
-    if "yüzük" in content_lower or "tolkien" in content_lower:
-        book_score += 5
-
-    # Başlık analizi
-    first_line = content_lower.split("\n")[0] if "\n" in content_lower else content_lower[:100]
-    if "marie" in first_line or "curie" in first_line:
-        person_score += 10
-    if "inception" in first_line or "film" in first_line:
-        film_score += 10
-    if "yüzük" in first_line or "lord" in first_line:
-        book_score += 10
+    scores = {
+        category: sum(1 for word in keywords if word in found)
+        for category, keywords in DOCUMENT_CATEGORY_KEYWORDS.items()
+    }
+
+    # Marie Curie, Inception ve Yüzüklerin Efendisi ile ilgili ek kontroller
+    for category, terms in DOCUMENT_BOOST_TERMS.items():
+        if any(term in found for term in terms):
+            scores[category] += 5
+
+    # Başlık analizi: ilk satır (yoksa ilk 100 karakter) içinde biten eşleşmeler
+    title_end = content_lower.find("\n")
+    if title_end == -1:
+        title_end = 100
+    for category, terms in DOCUMENT_TITLE_TERMS.items():
+        if any(found.get(term, title_end + 1) <= title_end for term in terms):
+            scores[category] += 10
 
     # En yüksek skora sahip kategoriyi döndür
-    max_score = max(film_score, book_score, person_score)
-
-    if max_score == 0:
-        return "other"  # Hiçbir kategoriye uymuyorsa
-
-    if film_score == max_score:
-        return "film"
-    elif book_score == max_score:
-        return "book"
-    elif person_score == max_score:
-        return "person"
-    else:
-        return "other"
+    return pick_category(scores, "other")
 
 
 def detect_query_category(query: str) -> str:
@@ -118,68 +258,36 @@ def detect_query_category(query: str) -> str:
     if "yüzüklerin efendisi" in query_lower or "lord of the rings" in query_lower or "tolkien" in query_lower:
         return "book"
 
-    # Film ile ilgili anahtar kelimeler
-    film_keywords = [
-        'film', 'movie', 'sinema', 'izle', 'yönetmen', 'vizyon',
-        'director', 'oyuncu', 'actor', 'actress', 'cast', 'senaryo',
-        'imdb', 'oscar', 'box office', 'gişe', 'başrol', 'screenplay',
-        'fragman', 'trailer', 'cinema'
-    ]
-
-    # Kitap ile ilgili anahtar kelimeler
-    book_keywords = [
-        'kitap', 'book', 'roman', 'novel', 'yazar', 'author', 'eser',
-        'oku', 'read', 'sayfa', 'page', 'bölüm', 'chapter',
-        'yayınevi', 'publisher', 'basım', 'edition', 'cilt', 'volume'
-    ]
-
-    # Kişi ile ilgili anahtar kelimeler
-    person_keywords = [
-        'kimdir', 'who is', 'doğum', 'birth', 'ölüm', 'death',
-        'hayatı', 'life', 'biyografi', 'biography', 'kişi', 'person',
-        'yaşamı', 'kariyeri', 'career', 'başarı', 'achievement', 'ne yapmıştır',
-        'bilim insanı', 'scientist', 'tarih', 'history', 'bilim', 'science'
-    ]
-
-    # Her kategorideki eşleşme sayısını hesapla - tam kelime eşleşmesi
-    query_words = set(query_lower.split())
-    film_matches = sum(1 for keyword in film_keywords if keyword in query_words)
-    book_matches = sum(1 for keyword in book_keywords if keyword in query_words)
-    person_matches = sum(1 for keyword in person_keywords if keyword in query_words)
-
-    # Her kategorideki kısmi eşleşme sayısını hesapla
-    film_partial = sum(1 for keyword in film_keywords if keyword in query_lower)
-    book_partial = sum(1 for keyword in book_keywords if keyword in query_lower)
-    person_partial = sum(1 for keyword in person_keywords if keyword in query_lower)
+    found = get_query_matcher().find(query_lower)
 
-    # Kombine eşleşme skoru
-    film_score = film_matches * 2 + film_partial
-    book_score = book_matches * 2 + book_partial
-    person_score = person_matches * 2 + person_partial
+    # Tam kelime eşleşmeleri iki, kısmi eşleşmeler bir puan değerindedir
+    query_words = set(query_lower.split())
+    scores = {}
+    for category, keywords in QUERY_CATEGORY_KEYWORDS.items():
+        partial = [keyword for keyword in keywords if keyword in found]
+        scores[category] = sum(2 for keyword in partial if keyword in query_words) + len(partial)
 
     # En çok eşleşme olan kategoriyi belirle
-    max_score = max(film_score, book_score, person_score)
+    return pick_category(scores, "general")
 
-    if max_score == 0:
-        return "general"  # Hiçbir kategoriye uymuyorsa
 
-    if film_score == max_score:
-        return "film"
-    elif book_score == max_score:
-        return "book"
-    elif person_score == max_score:
-        return "person"
+def get_document_category(doc: Document) -> str:
+    """
+    Belgenin kategorisini döndürür.
 
-    # Belirli anahtar kelimeleri kontrol et (son çare)
-    if any(word in query_lower for word in ['film', 'movie', 'sinema', 'izle']):
-        return "film"
-    elif any(word in query_lower for word in ['kitap', 'book', 'novel', 'roman']):
-        return "book"
-    elif any(word in query_lower for word in ['kimdir', 'who is', 'biyografi']):
-        return "person"
+    İndeksleme sırasında saklanan metadata 'category' değerini kullanır; saklanmamışsa
+    (eski kayıtlar) içerikten tespit eder.
 
-    # Varsayılan kategori
-    return "general"
+    Args:
+        doc: Belge
+
+    Returns:
+        str: Belge kategorisi
+    """
+    category = doc.metadata.get("category") if isinstance(doc.metadata, dict) else None
+    if category:
+        return category
+    return detect_document_category(doc.page_content)
 
 
 def filter_documents_by_category(documents: List[Document], category: str) -> List[Document]:
@@ -203,10 +311,8 @@ def filter_documents_by_category(documents: List[Document], category: str) -> Li
     other_docs = []
 
     for doc in documents:
-        doc_content = doc.page_content
-
-        # Belge kategorisini tespit et
-        doc_category = detect_document_category(doc_content)
+        # Belge kategorisini al (saklanan değer veya içerikten tespit)
+        doc_category = get_document_category(doc)
         doc_source = doc.metadata.get('source', 'bilinmiyor')
 
         # Eğer kategorisi sorgu kategorisiyle aynıysa
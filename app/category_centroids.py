@@ -0,0 +1,186 @@
+"""
+Embedding merkezleri (centroid) ile kategori sınıflandırma.
+Her kategori için bir merkez vektörü çevrimdışı oluşturulur; sorgular ve belge
+parçaları, arama için zaten hesaplanmış embedding ile tek bir matris çarpımıyla
+sınıflandırılır.
+"""
+import os
+import json
+from datetime import datetime
+from typing import List, Tuple, Optional, Sequence
+
+import numpy as np
+
+from app.config import CATEGORY_CENTROIDS_FILE, CENTROID_MIN_SIMILARITY, EMBEDDING_MODEL
+
+# Sorgu tarafında kategori sayılmayan belge kategorileri
+UNCATEGORIZED = ("other", "unknown")
+
+_centroids = None
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """Matris satırlarını birim uzunluğa getirir"""
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def build_category_centroids(model_name: str = None, labels_file: str = None) -> dict:
+    """
+    Kategori merkezlerini oluşturur.
+
+    Etiketli örnek dosyası verilirse örnekler embedding'e dönüştürülür; verilmezse
+    document_chunks tablosunda saklanan kategori ve embedding'ler kullanılır.
+
+    Args:
+        model_name: Embedding modeli (None=varsayılan model)
+        labels_file: Kategori -> örnek metin listesi içeren JSON dosyası
+
+    Returns:
+        Kaydedilmeye hazır merkez sözlüğü
+    """
+    if model_name is None:
+        model_name = EMBEDDING_MODEL
+
+    categories = {}
+
+    if labels_file:
+        from app.embedding import get_embedding_model
+
+        with open(labels_file, "r", encoding="utf-8") as f:
+            labels = json.load(f)
+
+        model = get_embedding_model(model_name)
+        for category, texts in labels.items():
+            if not texts:
+                continue
+            vectors = normalize_rows(np.asarray(model.encode(texts), dtype=np.float32))
+            categories[category] = {"count": len(texts), "centroid": vectors.mean(axis=0)}
+    else:
+        from app.db import get_db_connection
+
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute("""
+            SELECT category, COUNT(*), AVG(embedding)::real[]
+            FROM document_chunks
+            WHERE category IS NOT NULL AND category <> 'unknown'
+              AND (embedding_model = %s OR embedding_model IS NULL)
+            GROUP BY category
+            """, (model_name,))
+            for category, count, centroid in cursor.fetchall():
+                categories[category] = {"count": count, "centroid": np.asarray(centroid, dtype=np.float32)}
+        finally:
+            cursor.close()
+            conn.close()
+
+    return {
+        "model": model_name,
+        "created_at": datetime.now().isoformat(),
+        "categories": {
+            category: {
+                "count": int(info["count"]),
+                "centroid": [float(x) for x in info["centroid"]]
+            }
+            for category, info in sorted(categories.items())
+        }
+    }
+
+
+def save_category_centroids(data: dict, path: str = CATEGORY_CENTROIDS_FILE) -> str:
+    """Merkezleri JSON dosyasına yazar ve önbelleği sıfırlar"""
+    global _centroids
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+    _centroids = None
+    return path
+
+
+def load_category_centroids(path: str = CATEGORY_CENTROIDS_FILE) -> Optional[dict]:
+    """
+    Merkez dosyasını yükler; dosya değişmediyse önbellekteki matrisi döndürür.
+
+    Returns:
+        {"model", "categories", "matrix"} sözlüğü veya dosya yoksa None
+    """
+    global _centroids
+
+    if not os.path.exists(path):
+        return None
+
+    mtime = os.path.getmtime(path)
+    if _centroids is not None and _centroids.get("path") == path and _centroids.get("mtime") == mtime:
+        return _centroids
+
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+
+    names = list(data.get("categories", {}).keys())
+    if not names:
+        return None
+
+    matrix = np.asarray([data["categories"][name]["centroid"] for name in names], dtype=np.float32)
+    _centroids = {
+        "path": path,
+        "mtime": mtime,
+        "model": data.get("model"),
+        "categories": names,
+        "matrix": normalize_rows(matrix)
+    }
+    print(f"INFO - {len(names)} kategori merkezi yüklendi ({data.get('model')})")
+    return _centroids
+
+
+def classify_embeddings(embeddings: Sequence[Sequence[float]], model_name: str = None,
+                        min_similarity: float = CENTROID_MIN_SIMILARITY) -> Optional[List[Tuple[str, float]]]:
+    """
+    Embedding'leri en yakın kategori merkezine göre sınıflandırır.
+
+    Args:
+        embeddings: (n, boyut) embedding matrisi veya vektör listesi
+        model_name: Embedding'leri üreten model (None=varsayılan model)
+        min_similarity: Bu benzerliğin altındaki eşleşmeler 'other' sayılır
+
+    Returns:
+        (kategori, kosinüs_benzerliği) listesi; merkezler bu model için yoksa None
+    """
+    centroids = load_category_centroids()
+    if centroids is None or centroids["model"] != (model_name or EMBEDDING_MODEL):
+        return None
+
+    vectors = np.atleast_2d(np.asarray(embeddings, dtype=np.float32))
+    if vectors.shape[1] != centroids["matrix"].shape[1]:
+        print(f"⚠️ Kategori merkezleri {centroids['matrix'].shape[1]} boyutlu, embedding {vectors.shape[1]} boyutlu")
+        return None
+
+    similarities = normalize_rows(vectors) @ centroids["matrix"].T
+    best = similarities.argmax(axis=1)
+    best_scores = similarities[np.arange(len(best)), best]
+
+    return [
+        (centroids["categories"][index] if score >= min_similarity else "other", float(score))
+        for index, score in zip(best, best_scores)
+    ]
+
+
+def classify_query(question: str, query_embedding: Sequence[float], model_name: str = None) -> str:
+    """
+    Sorgu kategorisini arama için hesaplanan embedding ile belirler.
+
+    Kategori merkezleri yoksa anahtar kelime tabanlı detect_query_category kullanılır.
+
+    Returns:
+        str: Sorgu kategorisi (ör. 'film', 'book', 'person', 'general')
+    """
+    result = classify_embeddings([query_embedding], model_name)
+    if result is None:
+        from app.categorizer import detect_query_category
+        return detect_query_category(question)
+
+    category, score = result[0]
+    print(f"DEBUG - Merkez benzerliği: {category} ({score:.3f})")
+    return "general" if category in UNCATEGORIZED else category
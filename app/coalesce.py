@@ -0,0 +1,132 @@
+"""
+Eşzamanlı aynı sorguların birleştirilmesi (single-flight).
+Aynı soru, şablon, model, seçenekler ve külliyat sürümüyle gelen istekler hâlâ
+işlenirken tekrar gelirse yeni bir embedding/arama/LLM çalıştırılmaz; sonradan
+gelenler ilk isteğin sonucunu bekler ve aynı sonucu paylaşır.
+
+Külliyat sürümü bu süreçte yapılan her yazma işleminde artırılır; böylece belge
+eklendikten veya silindikten sonra gelen istek, önceki içerikle başlamış bir
+hesaplamaya bağlanmaz. Sonuçlar yalnızca hesaplama sürdüğü sürece paylaşılır,
+tamamlandıktan sonra saklanmaz.
+"""
+import re
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable
+
+from app.config import COALESCE_ENABLED
+from app.metrics import record_coalesced
+
+WHITESPACE_PATTERN = re.compile(r"\s+")
+
+_corpus_version = 0
+_corpus_lock = threading.Lock()
+
+
+def get_corpus_version() -> int:
+    """Bu süreçteki külliyat sürümünü döndürür"""
+    return _corpus_version
+
+
+def bump_corpus_version():
+    """Belgeler eklendiğinde, silindiğinde veya güncellendiğinde çağrılır"""
+    global _corpus_version
+    with _corpus_lock:
+        _corpus_version += 1
+
+
+def normalize_question(question: str) -> str:
+    """Soruyu büyük/küçük harf, boşluk ve sondaki noktalama farklarından arındırır"""
+    return WHITESPACE_PATTERN.sub(" ", question).strip().rstrip("?!.").strip().casefold()
+
+
+def get_query_key(question: str, template_name: str, model_name: str, **options) -> tuple:
+    """
+    Birleştirme anahtarını oluşturur.
+
+    Args:
+        question: Kullanıcı sorusu
+        template_name: Prompt şablonu
+        model_name: Yanıt modeli
+        **options: Sonucu etkileyen diğer seçenekler (embedding modeli, rerank, mmr, ...)
+
+    Returns:
+        (normalize_soru, şablon, model, seçenekler, külliyat_sürümü) tuple'ı
+    """
+    return (normalize_question(question), template_name, model_name,
+            tuple(sorted(options.items())), get_corpus_version())
+
+
+class SingleFlight:
+    """
+    Aynı anahtarla eşzamanlı gelen çağrılardan yalnızca birini çalıştırır.
+
+    Senkron çağrılar do() ile, eşzamansız çağrılar ado() ile birleştirilir; iki
+    yolun bekleyen çağrıları ayrı tutulur.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = {}
+        self.tasks = {}
+
+    def do(self, key, fn: Callable[..., Any], *args, **kwargs):
+        """
+        fn(*args, **kwargs) sonucunu döndürür; aynı anahtarla çalışan çağrı varsa onu bekler.
+
+        İlk çağrı hata verirse bekleyenlere aynı hata fırlatılır.
+        """
+        if not COALESCE_ENABLED:
+            return fn(*args, **kwargs)
+
+        with self.lock:
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = self.calls[key] = {"done": threading.Event(), "result": None, "error": None}
+
+        if not leader:
+            record_coalesced()
+            print("DEBUG - Aynı sorgu zaten işleniyor, sonucu bekleniyor")
+            call["done"].wait()
+            if call["error"] is not None:
+                raise call["error"]
+            return call["result"]
+
+        try:
+            call["result"] = fn(*args, **kwargs)
+            return call["result"]
+        except BaseException as e:
+            call["error"] = e
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+            call["done"].set()
+
+    async def ado(self, key, coro_factory: Callable[[], Awaitable[Any]]):
+        """
+        do()'nun eşzamansız karşılığı.
+
+        Hesaplama ayrı bir görevde çalışır; ilk isteğin iptal edilmesi bekleyen
+        diğer istekleri etkilemez.
+        """
+        if not COALESCE_ENABLED:
+            return await coro_factory()
+
+        task = self.tasks.get(key)
+        if task is None:
+            task = self.tasks[key] = asyncio.ensure_future(coro_factory())
+            task.add_done_callback(lambda _: self.tasks.pop(key, None))
+        else:
+            record_coalesced()
+            print("DEBUG - Aynı sorgu zaten işleniyor, sonucu bekleniyor")
+        return await asyncio.shield(task)
+
+
+_single_flight = SingleFlight()
+
+
+def get_single_flight() -> SingleFlight:
+    """Paylaşılan birleştiriciyi döndürür"""
+    return _single_flight
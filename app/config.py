@@ -25,15 +25,96 @@ COLLECTION_NAME = "document_chunks"
 # Model ayarları
 EMBEDDING_MODEL = "all-MiniLM-L6-v2"  # 384 boyutlu vektörler (veritabanıyla uyumlu)
 LLM_MODEL = "gemma3:12b"
+LLM_SMALL_MODEL = os.getenv("RAGCLI_LLM_SMALL_MODEL", "gemma3:1b")  # Kademeli modda ilk denenen hızlı model
+LLM_CASCADE_ENABLED = False  # Önce küçük modelle yanıtla, güven kontrolü başarısızsa LLM_MODEL'e geç
+CASCADE_MIN_CONFIDENCE = 0.6  # Yanıttaki confidence alanı bundan düşükse büyük modele geçilir
+CASCADE_MIN_CONTEXT_OVERLAP = 0.3  # Yanıt kelimelerinin bağlamda geçme oranı bundan düşükse büyük modele geçilir
+OLLAMA_BASE_URL = os.getenv("RAGCLI_OLLAMA_URL", "http://localhost:11434")
+LLM_REQUEST_TIMEOUT = 300  # Ollama istekleri için zaman aşımı (saniye)
+LLM_KEEP_ALIVE = os.getenv("RAGCLI_LLM_KEEP_ALIVE", "30m")  # Modelin boşta bellekte kalma süresi (-1 = sürekli)
+LLM_POOL_SIZE = 10  # Ollama için açık tutulacak maksimum HTTP bağlantısı
+LLM_WARMUP_ON_START = True  # serve başlarken modeli belleğe yükle
+LLM_MAX_CONCURRENCY = int(os.getenv("RAGCLI_LLM_CONCURRENCY", "1"))  # Ollama'ya aynı anda gönderilecek istek sayısı
+LLM_QUEUE_TIMEOUT = 60  # Etkileşimli isteklerin başlamak için bekleyebileceği maksimum süre (saniye)
+LLM_BATCH_QUEUE_TIMEOUT = None  # Toplu işlerin maksimum bekleme süresi (None = sınırsız)
+LLM_CONTEXT_REUSE = True  # Oturumda aynı bağlamla sorulan takip sorularında Ollama context token'larını yeniden kullan
+LLM_CONTEXT_REUSE_MAX_TURNS = 4  # Bir bağlam için art arda yeniden kullanım sayısı (sonra tam prompt gönderilir)
+LLM_CONTEXT_REUSE_TTL = 600  # Önbellekteki context token'larının geçerlilik süresi (saniye)
+LLM_CONTEXT_CACHE_SIZE = 32  # Önbellekte tutulacak en fazla bağlam sayısı
+COALESCE_ENABLED = True  # Eşzamanlı aynı sorguları tek hesaplamada birleştir
+
+# Veritabanı bağlantı havuzu ayarları
+DB_POOL_MIN_SIZE = 1  # psycopg2 havuzunda açık tutulacak minimum bağlantı sayısı
+DB_POOL_MAX_SIZE = int(os.getenv("RAGCLI_DB_POOL_SIZE", "10"))  # psycopg2 havuzundaki maksimum bağlantı sayısı
+DB_POOL_TIMEOUT = 30  # Boş bağlantı için en fazla beklenecek süre (saniye)
+DB_POOL_HEALTH_CHECK_IDLE = 30  # Bu süreden uzun boşta kalan bağlantı verilmeden önce SELECT 1 ile doğrulanır (saniye)
+DB_CONN_MAX_LIFETIME = 1800  # Bağlantının en fazla kullanılma süresi; dolunca kapatılıp yenisi açılır (saniye)
+
+# Asenkron API ayarları
+ASYNC_DB_POOL_MIN_SIZE = 1  # asyncpg havuzundaki minimum bağlantı sayısı
+ASYNC_DB_POOL_MAX_SIZE = 10  # asyncpg havuzundaki maksimum bağlantı sayısı
+ASYNC_EXECUTOR_WORKERS = 2  # Embedding ve CPU yoğun işler için iş parçacığı sayısı
+API_WORKERS = int(os.getenv("RAGCLI_API_WORKERS", "1"))  # serve için işçi süreç sayısı (>1 ise prefork modu)
+WORKER_GRACEFUL_TIMEOUT = 30  # Kapanış/yeniden yüklemede işçinin devam eden istekleri bitirme süresi (saniye)
+WORKER_RESTART_DELAY = 1.0  # Beklenmedik şekilde kapanan işçi yeniden başlatılmadan önce beklenen süre (saniye)
 
 # Belge parçalama ayarları
 DEFAULT_CHUNK_SIZE = 1000  # Varsayılan parça boyutu
 DEFAULT_CHUNK_OVERLAP = 200  # Varsayılan parça örtüşme miktarı
 
+# Bağlam paketleme ayarları
+CONTEXT_TOKEN_BUDGET = 2048  # LLM'e gönderilecek bağlamın maksimum token sayısı (None = sınırsız)
+# LLM_MODEL (gemma3) ile aynı tokenizer; google/gemma-3-* depoları erişim onayı (token) istediğinden
+# aynı tokenizer'ı içeren açık kopya kullanılır (yüklenemezse ~4 karakter/token)
+CONTEXT_TOKENIZER = os.getenv("RAGCLI_CONTEXT_TOKENIZER", "unsloth/gemma-3-12b-it")
+CONTEXT_MIN_PARTIAL_TOKENS = 64  # Bütçeye sığmayan belge en az bu kadar token ile kısaltılarak eklenir
+
+# Çıkarımsal bağlam sıkıştırma ayarları
+CONTEXT_COMPRESSION_ENABLED = False  # Varsayılan olarak kapalı, sorgu bazında açılabilir
+CONTEXT_COMPRESSION_RATIO = 0.3  # Korunacak cümlelerin toplam metne oranı (karakter)
+CONTEXT_COMPRESSION_MIN_SENTENCES = 3  # Oran ne olursa olsun korunacak minimum cümle sayısı
+
+# Konuşma oturumu ayarları
+SESSION_TTL = 1800  # Kullanılmayan oturumun silinme süresi (saniye)
+SESSION_MAX_COUNT = 1000  # Bellekte tutulacak en fazla oturum sayısı (en eski kullanılan silinir)
+SESSION_HISTORY_TOKEN_BUDGET = 1024  # Prompt'a eklenecek konuşma geçmişinin maksimum token sayısı
+SESSION_MAX_DOCUMENTS = 20  # Oturumda saklanacak en fazla belge parçası
+SESSION_REUSE_THRESHOLD = 0.45  # Takip sorusu saklanan parçalara bu kosinüs benzerliğiyle yakınsa arama yapılmaz
+
 # Sorgu ayarları
 SIMILARITY_THRESHOLD = 0.7  # Benzerlik skoru eşiği (0-1 arası, 1 en benzer)
 MAX_DOCUMENTS = 5  # Sorgu başına maksimum belge sayısı
 
+# Yeniden sıralama (cross-encoder) ayarları
+RERANK_ENABLED = False  # Varsayılan olarak kapalı, sorgu bazında açılabilir
+RERANK_MODEL = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+RERANK_CANDIDATES = 20  # Yeniden sıralama için getirilecek aday belge sayısı
+RERANK_BATCH_SIZE = 8  # Cross-encoder'a tek seferde gönderilecek (sorgu, parça) çifti
+RERANK_TIME_BUDGET = 1.5  # Sorgu başına yeniden sıralama süre bütçesi (saniye)
+RERANK_CACHE_SIZE = 4096  # Önbellekte tutulacak maksimum skor sayısı
+
+# Skor normalizasyonu ve eşiklemenin SQL içinde yapılması
+SQL_FILTER_ENABLED = False  # Açıkken yalnızca kullanılacak satırlar veritabanından aktarılır
+
+# Komşu parça penceresi genişletme
+WINDOW_EXPANSION = 0  # İsabet başına her yönde eklenecek komşu parça sayısı (0 = kapalı)
+
+# Maksimum marjinal ilgi (MMR) çeşitlendirme ayarları
+MMR_ENABLED = False  # Varsayılan olarak kapalı, sorgu bazında açılabilir
+MMR_LAMBDA = 0.5  # 1.0 = yalnızca ilgi, 0.0 = yalnızca çeşitlilik
+MMR_FETCH_K = 20  # MMR seçimi için getirilecek aday havuzu büyüklüğü
+
+# Uyarlanabilir k ayarları (skor dağılımına göre erken durdurma)
+ADAPTIVE_K_ENABLED = False  # Varsayılan olarak kapalı, sorgu bazında açılabilir
+ADAPTIVE_INITIAL_K = 2  # İlk aramada getirilecek belge sayısı
+ADAPTIVE_MAX_K = MAX_DOCUMENTS * 2  # Genişletme üst sınırı
+ADAPTIVE_SCORE_GAP = 0.05  # Bağlamı kesmek için ardışık skorlar arasındaki minimum düşüş
+ADAPTIVE_KNEE_SENSITIVITY = 0.3  # Dirsek noktasının belirgin sayılması için minimum sapma
+
+# Embedding merkezli (centroid) kategori sınıflandırıcı ayarları
+CATEGORY_CENTROIDS_FILE = os.path.join(TEMPLATE_DIR, "category_centroids.json")
+CENTROID_MIN_SIMILARITY = 0.2  # En yakın merkeze kosinüs benzerliği bunun altındaysa kategorisiz say
+
 # Document kategori filtreleme için anahtar kelimeler
 DOCUMENT_CATEGORIES = {
     "film": ["film", "movie", "yönetmen", "director", "cast", "oyuncular", "imdb", "cinema", "sinema", "actor", "aktör"],
@@ -0,0 +1,336 @@
+"""
+LLM bağlamı hazırlama işlemleri.
+Seçilen belgelerden aynı belgenin parçaları arasındaki örtüşmeleri çıkarır,
+isteğe bağlı olarak sorguyla ilgisiz cümleleri ayıklar ve bağlamı hedef LLM'in
+tokenizer'ı ile sayılan bir token bütçesine göre doldurur.
+"""
+import re
+from typing import List, Optional
+
+import numpy as np
+from langchain_core.documents import Document
+
+from app.config import (CONTEXT_TOKEN_BUDGET, CONTEXT_TOKENIZER, CONTEXT_MIN_PARTIAL_TOKENS,
+                        DEFAULT_CHUNK_OVERLAP, EMBEDDING_MODEL, CONTEXT_COMPRESSION_ENABLED,
+                        CONTEXT_COMPRESSION_RATIO, CONTEXT_COMPRESSION_MIN_SENTENCES)
+
+try:
+    from transformers import AutoTokenizer
+
+    has_transformers = True
+except ImportError:
+    has_transformers = False
+
+CHARS_PER_TOKEN = 4  # Tokenizer yüklenemediğinde kullanılan yaklaşık oran
+MIN_OVERLAP_CHARS = 20  # Bundan kısa ortak parçalar örtüşme sayılmaz
+MIN_SENTENCE_CHARS = 3  # Bundan kısa parçalar cümle sayılmaz
+
+# Cümle sonu noktalamasından sonraki boşluklarda ve satır sonlarında böler
+SENTENCE_SPLIT_PATTERN = re.compile(r"(?<=[.!?…])\s+|\n+")
+
+_tokenizer = None
+
+
+def warn_approximate_tokens(reason: str):
+    """Token bütçesinin tahmini sayımla uygulanacağını belirgin şekilde bildirir (tokenizer başına bir kez)"""
+    print("=" * 80)
+    print(f"⚠️ UYARI - {reason}.")
+    print(f"⚠️ Bağlam token bütçesi ({CONTEXT_TOKEN_BUDGET}) gerçek token sayısıyla değil, yaklaşık "
+          f"{CHARS_PER_TOKEN} karakter/token tahminiyle uygulanacak.")
+    print("⚠️ Tokenizer'ı RAGCLI_CONTEXT_TOKENIZER ile değiştirebilir, erişim onayı gereken depolar için "
+          "HF_TOKEN tanımlayabilirsiniz.")
+    print("=" * 80)
+
+
+def get_tokenizer(model_name: str = CONTEXT_TOKENIZER):
+    """Yüklü tokenizer'ı döndür veya yükle; yüklenemezse None döndürür"""
+    global _tokenizer
+
+    if _tokenizer is not None and _tokenizer.get("name") == model_name:
+        return _tokenizer.get("tokenizer")
+
+    tokenizer = None
+    if model_name and has_transformers:
+        try:
+            print(f"INFO - Tokenizer yükleniyor: {model_name}")
+            tokenizer = AutoTokenizer.from_pretrained(model_name)
+        except Exception as e:
+            warn_approximate_tokens(f"{model_name} tokenizer'ı yüklenemedi ({e})")
+    elif model_name:
+        warn_approximate_tokens("transformers kurulu değil")
+
+    _tokenizer = {
+        "name": model_name,
+        "tokenizer": tokenizer
+    }
+    return tokenizer
+
+
+def count_tokens(text: str) -> int:
+    """Metnin hedef LLM tokenizer'ına göre token sayısını döndürür"""
+    tokenizer = get_tokenizer()
+    if tokenizer is None:
+        return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+    return len(tokenizer.encode(text, add_special_tokens=False))
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """
+    Metni en fazla max_tokens token olacak şekilde keser.
+
+    Mümkünse son cümle sonunda, değilse son boşlukta keser.
+    """
+    tokenizer = get_tokenizer()
+    if tokenizer is None:
+        truncated = text[:max_tokens * CHARS_PER_TOKEN]
+    else:
+        token_ids = tokenizer.encode(text, add_special_tokens=False)
+        if len(token_ids) <= max_tokens:
+            return text
+        truncated = tokenizer.decode(token_ids[:max_tokens])
+
+    if len(truncated) >= len(text):
+        return text
+
+    sentence_end = max(truncated.rfind(". "), truncated.rfind(".\n"), truncated.rfind("\n\n"))
+    if sentence_end > len(truncated) // 2:
+        return truncated[:sentence_end + 1].rstrip()
+    space = truncated.rfind(" ")
+    return (truncated[:space] if space > 0 else truncated).rstrip() + " ..."
+
+
+def find_overlap(previous: str, following: str, max_overlap: int = DEFAULT_CHUNK_OVERLAP * 2) -> int:
+    """
+    previous metninin sonu ile following metninin başı arasındaki en uzun ortak kısmın uzunluğunu bulur.
+
+    Args:
+        previous: Belgede önce gelen parça
+        following: Belgede sonra gelen parça
+        max_overlap: Aranacak maksimum örtüşme (karakter)
+
+    Returns:
+        Örtüşen karakter sayısı (yoksa 0)
+    """
+    tail = previous[-max_overlap:]
+    probe = following[:MIN_OVERLAP_CHARS]
+    if len(probe) < MIN_OVERLAP_CHARS:
+        return 0
+
+    # En erken eşleşme en uzun örtüşmedir
+    start = tail.find(probe)
+    while start != -1:
+        overlap = len(tail) - start
+        if following.startswith(tail[start:]):
+            return overlap
+        start = tail.find(probe, start + 1)
+    return 0
+
+
+def get_document_key(doc: Document) -> Optional[str]:
+    """Aynı belgeye ait parçaları eşleştirmek için belge anahtarını döndürür"""
+    metadata = doc.metadata if isinstance(doc.metadata, dict) else {}
+    key = metadata.get("document_id") or metadata.get("source")
+    return str(key) if key is not None else None
+
+
+def remove_overlaps(text: str, doc: Document, packed: List[Document]) -> str:
+    """
+    Aynı belgeden daha önce pakete alınmış komşu parçalarla örtüşen kısımları çıkarır.
+
+    Args:
+        text: Pakete eklenecek parça metni
+        doc: Parçanın belgesi
+        packed: Pakete daha önce eklenen belgeler
+
+    Returns:
+        Örtüşmeleri çıkarılmış metin (tamamen tekrarsa boş metin)
+    """
+    key = get_document_key(doc)
+    if key is None:
+        return text
+
+    index = doc.metadata.get("chunk_index")
+    for other in packed:
+        if get_document_key(other) != key:
+            continue
+        other_text = other.page_content
+        if text in other_text:
+            return ""
+
+        other_index = other.metadata.get("chunk_index")
+        if index is not None and other_index is not None:
+            # Parça sırası biliniyorsa yalnızca komşularla karşılaştır
+            if int(other_index) == int(index) - 1:
+                text = text[find_overlap(other_text, text):]
+            elif int(other_index) == int(index) + 1:
+                overlap = find_overlap(text, other_text)
+                text = text[:len(text) - overlap]
+        else:
+            text = text[find_overlap(other_text, text):]
+    return text.strip()
+
+
+def format_context_entry(position: int, doc: Document) -> str:
+    """build_context ile aynı biçimde tek bir belge girdisi oluşturur"""
+    source = doc.metadata.get("source", f"Belge {position}")
+    return f"[BELGE {position}] {source}:\n{doc.page_content}\n\n"
+
+
+def pack_documents(docs: List[Document], token_budget: Optional[int] = CONTEXT_TOKEN_BUDGET) -> List[Document]:
+    """
+    Belgeleri ilgi sırasıyla token bütçesine sığacak şekilde paketler.
+
+    Aynı belgenin komşu parçaları arasındaki örtüşmeler (DEFAULT_CHUNK_OVERLAP) çıkarılır,
+    tamamen tekrar eden parçalar atlanır. Bütçeye sığmayan belge, kalan bütçe yeterliyse
+    kısaltılarak eklenir; sonraki daha kısa belgeler kalan bütçeyi doldurabilir.
+
+    Args:
+        docs: İlgi sırasındaki belgeler
+        token_budget: Bağlam için maksimum token sayısı (None = sınırsız)
+
+    Returns:
+        Metni düzenlenmiş belge kopyalarının listesi (ilgi sırasıyla)
+    """
+    packed = []
+    used_tokens = 0
+
+    for doc in docs:
+        text = remove_overlaps(doc.page_content, doc, packed)
+        if not text:
+            continue
+
+        candidate = Document(page_content=text, metadata=dict(doc.metadata))
+        entry_tokens = count_tokens(format_context_entry(len(packed) + 1, candidate))
+
+        if token_budget is not None and used_tokens + entry_tokens > token_budget:
+            remaining = token_budget - used_tokens - (entry_tokens - count_tokens(text))
+            if remaining < CONTEXT_MIN_PARTIAL_TOKENS:
+                continue
+            candidate.page_content = truncate_to_tokens(text, remaining)
+            candidate.metadata["truncated"] = True
+            entry_tokens = count_tokens(format_context_entry(len(packed) + 1, candidate))
+            if used_tokens + entry_tokens > token_budget:
+                continue
+
+        packed.append(candidate)
+        used_tokens += entry_tokens
+
+    if docs:
+        print(f"INFO - Bağlam paketlendi: {len(packed)}/{len(docs)} belge, {used_tokens} token"
+              + (f" (bütçe {token_budget})" if token_budget is not None else ""))
+    return packed
+
+
+def remove_document_overlaps(docs: List[Document]) -> List[Document]:
+    """
+    Aynı belgenin komşu parçaları arasındaki örtüşmeleri token bütçesi uygulamadan çıkarır.
+
+    Args:
+        docs: İlgi sırasındaki belgeler
+
+    Returns:
+        Metni düzenlenmiş belge kopyalarının listesi (tamamen tekrar eden parçalar atlanır)
+    """
+    deduplicated = []
+    for doc in docs:
+        text = remove_overlaps(doc.page_content, doc, deduplicated)
+        if text:
+            deduplicated.append(Document(page_content=text, metadata=dict(doc.metadata)))
+    return deduplicated
+
+
+def split_sentences(text: str) -> List[str]:
+    """Metni cümlelere böler; çok kısa parçaları atar"""
+    return [sentence.strip() for sentence in SENTENCE_SPLIT_PATTERN.split(text)
+            if len(sentence.strip()) >= MIN_SENTENCE_CHARS]
+
+
+def compress_documents(question: str, docs: List[Document], ratio: float = CONTEXT_COMPRESSION_RATIO,
+                       min_sentences: int = CONTEXT_COMPRESSION_MIN_SENTENCES,
+                       model_name: str = EMBEDDING_MODEL) -> List[Document]:
+    """
+    Belgeleri sorguyla en ilgili cümlelerine indirger (çıkarımsal sıkıştırma).
+
+    Soru ve tüm cümleler tek bir encode çağrısıyla vektörleştirilir. Cümleler soruya
+    kosinüs benzerliğine göre sıralanır ve toplam metnin ratio oranı kadar karakter
+    dolana kadar (en az min_sentences cümle) seçilir. Seçilen cümleler her belgede
+    orijinal sıralarıyla birleştirilir; hiç cümlesi seçilmeyen belgeler atlanır.
+
+    Args:
+        question: Kullanıcı sorusu
+        docs: İlgi sırasındaki belgeler
+        ratio: Korunacak karakter oranı (0-1 arası)
+        min_sentences: Korunacak minimum cümle sayısı
+        model_name: Kullanılacak embedding modeli
+
+    Returns:
+        Sıkıştırılmış belge kopyalarının listesi (ilgi sırasıyla)
+    """
+    sentences = []
+    owners = []
+    for position, doc in enumerate(docs):
+        for sentence in split_sentences(doc.page_content):
+            sentences.append(sentence)
+            owners.append(position)
+
+    if len(sentences) <= min_sentences:
+        return docs
+
+    from app.embedding import get_embedding_model
+
+    vectors = np.asarray(get_embedding_model(model_name).encode([question] + sentences), dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1)
+    norms[norms == 0] = 1.0
+    vectors /= norms[:, None]
+    scores = vectors[1:] @ vectors[0]
+
+    # Yüksek skordan düşüğe; eşit skorlarda önce gelen cümle tercih edilir
+    order = np.argsort(-scores, kind="stable")
+    lengths = np.fromiter((len(sentence) for sentence in sentences), dtype=np.int64, count=len(sentences))
+    char_budget = ratio * lengths.sum()
+    keep_count = max(min_sentences, int(np.searchsorted(np.cumsum(lengths[order]), char_budget, side="right")))
+    keep = np.zeros(len(sentences), dtype=bool)
+    keep[order[:keep_count]] = True
+
+    kept_sentences = {}
+    for index in np.flatnonzero(keep):
+        kept_sentences.setdefault(owners[index], []).append(sentences[index])
+
+    compressed = []
+    for position, doc in enumerate(docs):
+        if position not in kept_sentences:
+            continue
+        metadata = dict(doc.metadata)
+        metadata["compressed"] = True
+        compressed.append(Document(page_content=" ".join(kept_sentences[position]), metadata=metadata))
+
+    kept_chars = int(lengths[keep].sum())
+    print(f"INFO - Bağlam sıkıştırıldı: {keep_count}/{len(sentences)} cümle, "
+          f"{kept_chars}/{int(lengths.sum())} karakter, {len(compressed)}/{len(docs)} belge")
+    return compressed
+
+
+def prepare_documents(question: str, docs: List[Document], compress: Optional[bool] = None,
+                      embedding_model: Optional[str] = None) -> List[Document]:
+    """
+    Getirilen belgeleri bağlam oluşturmaya hazırlar.
+
+    Sıkıştırma açıksa önce örtüşmeler çıkarılır (aynı cümle iki kez puanlanmasın),
+    ardından ilgisiz cümleler ayıklanır. Son olarak belgeler token bütçesine göre paketlenir.
+
+    Args:
+        question: Kullanıcı sorusu
+        docs: İlgi sırasındaki belgeler
+        compress: Çıkarımsal sıkıştırma yapılsın mı (None=config değeri)
+        embedding_model: Cümle puanlamada kullanılacak embedding modeli (None=varsayılan model)
+
+    Returns:
+        LLM bağlamına girecek belgelerin listesi
+    """
+    if compress is None:
+        compress = CONTEXT_COMPRESSION_ENABLED
+
+    if compress and docs:
+        docs = compress_documents(question, remove_document_overlaps(docs),
+                                  model_name=embedding_model or EMBEDDING_MODEL)
+    return pack_documents(docs)
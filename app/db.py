@@ -1,19 +1,300 @@
 # app/db.py
 """
 Veritabanı işlemleri.
+
+Tüm senkron veritabanı erişimi süreç içinde paylaşılan, iş parçacığı güvenli bir
+psycopg2 bağlantı havuzu üzerinden yapılır. get_db_connection() havuzdan bir
+bağlantı ödünç verir; bağlantının close() metodu bağlantıyı kapatmak yerine
+havuza geri bırakır. Uzun süre boşta kalan bağlantılar verilmeden önce doğrulanır,
+kullanım süresi dolan bağlantılar kapatılıp yenileriyle değiştirilir.
 """
+import time
+import threading
+from collections import deque
+
 import psycopg2
 from psycopg2 import sql
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+from psycopg2.pool import PoolError
+from sqlalchemy.pool import NullPool
 from langchain_community.vectorstores import PGVector
 
-from app.config import DB_CONNECTION, COLLECTION_NAME
+from app.config import (DB_CONNECTION, COLLECTION_NAME, DB_POOL_MIN_SIZE, DB_POOL_MAX_SIZE, DB_POOL_TIMEOUT,
+                        DB_POOL_HEALTH_CHECK_IDLE, DB_CONN_MAX_LIFETIME)
+from app.coalesce import bump_corpus_version
+from app.metrics import record_db_pool_wait, record_db_pool_event
+
+_pool = None
+_pool_lock = threading.Lock()
+_vectorstores = {}
+_vectorstores_lock = threading.Lock()
+
+
+class PooledConnection:
+    """
+    Havuzdan ödünç alınan psycopg2 bağlantısı.
+
+    cursor(), commit(), rollback() gibi tüm çağrılar asıl bağlantıya iletilir;
+    close() bağlantıyı havuza geri bırakır. Geri bırakıldıktan sonra nesne kullanılamaz.
+    """
+
+    _conn = None
+
+    def __init__(self, pool, conn, created_at: float):
+        self._pool = pool
+        self._conn = conn
+        self._created_at = created_at
+
+    def __getattr__(self, name):
+        if self._conn is None:
+            raise psycopg2.InterfaceError("bağlantı havuza geri bırakıldı")
+        return getattr(self._conn, name)
+
+    def __enter__(self):
+        self._conn.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return self._conn.__exit__(exc_type, exc_value, traceback)
+
+    @property
+    def closed(self) -> int:
+        return 1 if self._conn is None else self._conn.closed
+
+    def close(self):
+        """Bağlantıyı havuza geri bırakır; birden fazla çağrılması sorun değildir"""
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            self._pool.release(conn, self._created_at)
+
+    def __del__(self):
+        # close() çağrılmadan bırakılan bağlantı havuzdan düşmesin
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+class ConnectionPool:
+    """
+    psycopg2 bağlantıları için iş parçacığı güvenli havuz.
+
+    Boş bağlantı yoksa ve havuz doluysa bağlantı geri bırakılana kadar beklenir;
+    bekleme süresi metriklere eklenir.
+
+    Args:
+        dsn: PostgreSQL bağlantı dizesi
+        min_size: Açık tutulacak minimum bağlantı sayısı
+        max_size: Aynı anda açık olabilecek maksimum bağlantı sayısı
+        timeout: Bağlantı için en fazla bekleme süresi (saniye)
+        health_check_idle: Bu süreden uzun boşta kalan bağlantı verilmeden önce doğrulanır (saniye)
+        max_lifetime: Bağlantının en fazla kullanılma süresi (saniye)
+    """
+
+    def __init__(self, dsn: str = DB_CONNECTION, min_size: int = DB_POOL_MIN_SIZE, max_size: int = DB_POOL_MAX_SIZE,
+                 timeout: float = DB_POOL_TIMEOUT, health_check_idle: float = DB_POOL_HEALTH_CHECK_IDLE,
+                 max_lifetime: float = DB_CONN_MAX_LIFETIME):
+        self.dsn = dsn
+        self.min_size = min(min_size, max_size)
+        self.max_size = max_size
+        self.timeout = timeout
+        self.health_check_idle = health_check_idle
+        self.max_lifetime = max_lifetime
+        self.idle = deque()  # (bağlantı, oluşturulma_zamanı, son_kullanım_zamanı)
+        self.size = 0
+        self.closed = False
+        self.condition = threading.Condition()
+
+        for _ in range(self.min_size):
+            self.size += 1
+            try:
+                conn, created_at = self.open_connection()
+            except psycopg2.Error as e:
+                print(f"UYARI - Havuz için ilk bağlantılar açılamadı: {e}")
+                break
+            self.idle.append((conn, created_at, created_at))
+
+    def open_connection(self) -> tuple:
+        """Önceden ayrılmış yer için yeni bağlantı açar; açılamazsa yeri geri verir"""
+        try:
+            return psycopg2.connect(self.dsn), time.monotonic()
+        except Exception:
+            self.discard(None)
+            raise
+
+    def discard(self, conn):
+        """Bağlantıyı kapatır ve havuzdaki yerini boşaltır"""
+        if conn is not None:
+            try:
+                conn.close()
+            except Exception:
+                pass
+        with self.condition:
+            self.size -= 1
+            self.condition.notify()
+
+    def is_expired(self, created_at: float) -> bool:
+        return self.max_lifetime is not None and time.monotonic() - created_at >= self.max_lifetime
+
+    def is_healthy(self, conn) -> bool:
+        """Bağlantıyı SELECT 1 ile doğrular"""
+        try:
+            cursor = conn.cursor()
+            try:
+                cursor.execute("SELECT 1")
+            finally:
+                cursor.close()
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    def take_idle(self):
+        """
+        Kullanılabilir boş bağlantıyı döndürür; süresi dolan veya bozuk bağlantılar kapatılır.
+
+        Returns:
+            (bağlantı, oluşturulma_zamanı) veya boş bağlantı yoksa None
+        """
+        while True:
+            with self.condition:
+                if not self.idle:
+                    return None
+                conn, created_at, last_used = self.idle.pop()
+
+            if conn.closed or self.is_expired(created_at):
+                record_db_pool_event("expired")
+                self.discard(conn)
+                continue
+            if time.monotonic() - last_used >= self.health_check_idle and not self.is_healthy(conn):
+                record_db_pool_event("health_check_failures")
+                print("⚠️ Havuzdaki bağlantı sağlık kontrolünden geçemedi, yenisi açılacak")
+                self.discard(conn)
+                continue
+            return conn, created_at
+
+    def acquire(self, timeout=None) -> PooledConnection:
+        """
+        Havuzdan bağlantı ödünç alır.
+
+        Args:
+            timeout: En fazla bekleme süresi (None=havuzun varsayılanı)
+
+        Returns:
+            close() ile havuza geri bırakılan PooledConnection
+
+        Raises:
+            PoolError: Havuz kapatıldıysa veya süre içinde bağlantı bulunamadıysa
+        """
+        timeout = self.timeout if timeout is None else timeout
+        start_time = time.monotonic()
+        deadline = start_time + timeout
+
+        while True:
+            if self.closed:
+                raise PoolError("bağlantı havuzu kapatıldı")
+
+            entry = self.take_idle()
+            if entry is None:
+                with self.condition:
+                    if self.idle:
+                        continue
+                    if self.size >= self.max_size:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            record_db_pool_event("timeouts")
+                            raise PoolError(f"{timeout} saniye içinde boş veritabanı bağlantısı bulunamadı "
+                                            f"(havuz boyutu {self.max_size})")
+                        self.condition.wait(remaining)
+                        continue
+                    self.size += 1
+                entry = self.open_connection()
+
+            record_db_pool_wait(time.monotonic() - start_time)
+            return PooledConnection(self, *entry)
+
+    def release(self, conn, created_at: float):
+        """
+        Bağlantıyı havuza geri bırakır.
+
+        Yarım kalan işlem geri alınır; kapanmış, bozuk veya süresi dolan bağlantılar
+        havuza konmaz.
+        """
+        if self.closed or conn.closed or self.is_expired(created_at):
+            self.discard(conn)
+            return
+        try:
+            if conn.get_transaction_status() != TRANSACTION_STATUS_IDLE:
+                conn.rollback()
+            if conn.autocommit:
+                conn.autocommit = False
+        except Exception:
+            self.discard(conn)
+            return
+        with self.condition:
+            self.idle.append((conn, created_at, time.monotonic()))
+            self.condition.notify()
+
+    def snapshot(self) -> dict:
+        """Havuzdaki açık ve boş bağlantı sayılarını döndürür"""
+        with self.condition:
+            return {"size": self.size, "idle": len(self.idle), "max_size": self.max_size}
+
+    def close(self):
+        """Boştaki bağlantıları kapatır; ödünç verilenler geri bırakılınca kapatılır"""
+        with self.condition:
+            self.closed = True
+            idle, self.idle = list(self.idle), deque()
+            self.condition.notify_all()
+        for conn, _, _ in idle:
+            self.discard(conn)
+
+
+def get_db_pool() -> ConnectionPool:
+    """Paylaşılan veritabanı havuzunu döndür veya oluştur"""
+    global _pool
+
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool()
+    return _pool
+
+
+def get_db_pool_snapshot() -> dict:
+    """Havuz oluşturulduysa anlık durumunu, oluşturulmadıysa boş sözlük döndürür"""
+    return _pool.snapshot() if _pool is not None else {}
+
+
+def close_db_pool():
+    """Paylaşılan havuzu kapatır; sonraki çağrıda yeni havuz oluşturulur"""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.close()
+
+
+def reset_db_pool():
+    """
+    Paylaşılan havuzu kapatmadan bırakır; sonraki çağrıda yenisi oluşturulur.
+
+    Fork ile başlatılan işçide çağrılır. Ana süreç havuzu fork öncesinde close_db_pool()
+    ile kapattığından işçiye kopyalanan açık bağlantı kalmaz.
+    """
+    global _pool, _pool_lock
+    _pool = None
+    _pool_lock = threading.Lock()
 
 
 def get_db_connection():
     """
-    PostgreSQL veritabanı bağlantısı oluştur.
+    Paylaşılan havuzdan PostgreSQL bağlantısı ödünç al.
+
+    Returns:
+        psycopg2 bağlantısı gibi kullanılan PooledConnection; close() ile havuza geri bırakılır
     """
-    return psycopg2.connect(DB_CONNECTION)
+    return get_db_pool().acquire()
 
 
 def setup_db():
@@ -37,10 +318,17 @@ def setup_db():
         total_chunks INTEGER,
         embedding vector(384),
         embedding_model TEXT,
+        category TEXT,
         created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
     )
     """)
 
+    # Önceki sürümlerde oluşturulan tablolar için kategori sütunu ve indeksi
+    ensure_category_column(cursor)
+
+    # Komşu parça penceresi sorguları için birleşik indeks
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_doc_chunk ON document_chunks (document_id, chunk_index)")
+
     # İşlenmiş veri tablosunu oluştur
     cursor.execute("""
     CREATE TABLE IF NOT EXISTS processed_data (
@@ -58,20 +346,135 @@ def setup_db():
     return True
 
 
+def ensure_category_column(cursor):
+    """document_chunks tablosunda kategori sütununun ve indeksinin varlığını garanti eder"""
+    cursor.execute("ALTER TABLE document_chunks ADD COLUMN IF NOT EXISTS category TEXT")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_document_chunks_category ON document_chunks (category)")
+
+
+def backfill_document_categories(recompute: bool = False, batch_size: int = 500) -> dict:
+    """
+    Kategorisi saklanmamış parçaların kategorisini bir kez hesaplayıp kaydeder.
+
+    document_chunks tablosundaki category sütununu ve LangChain koleksiyonundaki
+    belgelerin metadata'sındaki 'category' alanını doldurur.
+
+    Args:
+        recompute: True ise tüm satırların kategorisi yeniden hesaplanır
+        batch_size: Tek UPDATE ifadesinde güncellenecek satır sayısı
+
+    Returns:
+        Tablo adı -> güncellenen satır sayısı sözlüğü
+    """
+    from psycopg2.extras import execute_values
+    from app.categorizer import detect_document_category
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    updated = {}
+
+    try:
+        ensure_category_column(cursor)
+
+        cursor.execute("SELECT id, content FROM document_chunks"
+                       + ("" if recompute else " WHERE category IS NULL"))
+        rows = [(row_id, detect_document_category(content)) for row_id, content in cursor.fetchall()]
+        for start in range(0, len(rows), batch_size):
+            execute_values(cursor, """
+            UPDATE document_chunks AS d SET category = v.category
+            FROM (VALUES %s) AS v(id, category)
+            WHERE d.id = v.id
+            """, rows[start:start + batch_size])
+        updated["document_chunks"] = len(rows)
+
+        cursor.execute("SELECT to_regclass('langchain_pg_embedding')")
+        if cursor.fetchone()[0] is not None:
+            cursor.execute("""
+            SELECT e.uuid::text, e.document
+            FROM langchain_pg_embedding e
+            JOIN langchain_pg_collection c ON e.collection_id = c.uuid
+            WHERE c.name = %s
+            """ + ("" if recompute else " AND e.cmetadata::jsonb ->> 'category' IS NULL"), (COLLECTION_NAME,))
+            rows = [(row_id, detect_document_category(content)) for row_id, content in cursor.fetchall()]
+            for start in range(0, len(rows), batch_size):
+                execute_values(cursor, """
+                UPDATE langchain_pg_embedding AS e
+                SET cmetadata = COALESCE(e.cmetadata::jsonb, '{}'::jsonb) || jsonb_build_object('category', v.category)
+                FROM (VALUES %s) AS v(uuid, category)
+                WHERE e.uuid = v.uuid::uuid
+                """, rows[start:start + batch_size])
+            updated["langchain_pg_embedding"] = len(rows)
+
+        conn.commit()
+        bump_corpus_version()
+        return updated
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+
+
+class BorrowingPool(NullPool):
+    """
+    PGVector'ün SQLAlchemy motoru için havuz; bağlantıları paylaşılan ConnectionPool'dan ödünç alır.
+
+    SQLAlchemy kendi bağlantılarını tutmaz: her oturum havuzdan bir bağlantı alır,
+    oturum bitince bağlantı kapatılmak yerine ConnectionPool'a geri bırakılır.
+    """
+
+    def __init__(self, creator=None, **kwargs):
+        self.borrowed = {}
+        self.borrowed_lock = threading.Lock()
+        super().__init__(self.borrow, **kwargs)
+
+    def borrow(self):
+        pooled = get_db_connection()
+        conn = pooled._conn
+        with self.borrowed_lock:
+            self.borrowed[id(conn)] = pooled
+        return conn
+
+    def _close_connection(self, connection, *, terminate=False):
+        with self.borrowed_lock:
+            pooled = self.borrowed.pop(id(connection), None)
+        if pooled is None:
+            super()._close_connection(connection, terminate=terminate)
+        elif terminate:
+            # Bozuk bağlantı havuza dönmesin
+            connection.close()
+            pooled.close()
+        else:
+            pooled.close()
+
+
 def get_vectorstore(embeddings=None):
-    """Vektör deposunu oluşturur ve döndürür"""
-    from app.config import DB_CONNECTION, COLLECTION_NAME, EMBEDDING_MODEL
+    """
+    Vektör deposunu döndürür; embedding modeli başına bir kez oluşturulur.
+
+    PGVector oluşturulurken yapılan eklenti/tablo/koleksiyon kontrolleri yalnızca
+    ilk çağrıda çalışır. Sorgular paylaşılan havuzdaki bağlantıları kullanır.
+    """
+    from app.config import EMBEDDING_MODEL
     if embeddings is None:
+        from app.embedding import get_embeddings
         embeddings = get_embeddings(EMBEDDING_MODEL)
 
-    # Config.py'den gelen bağlantı dizesini kullan
-    print(f"DEBUG - Veritabanı bağlantısı: {DB_CONNECTION}")
-
-    return PGVector(
-        connection_string=DB_CONNECTION,  # <-- BU SATIR ÇÖZÜM
-        embedding_function=embeddings,
-        collection_name=COLLECTION_NAME
-    )
+    key = getattr(embeddings, "model_name", None) or id(embeddings)
+    vectorstore = _vectorstores.get(key)
+    if vectorstore is None:
+        with _vectorstores_lock:
+            vectorstore = _vectorstores.get(key)
+            if vectorstore is None:
+                print(f"DEBUG - Vektör deposu oluşturuluyor: {COLLECTION_NAME} ({key})")
+                vectorstore = _vectorstores[key] = PGVector(
+                    connection_string="postgresql+psycopg2://",
+                    embedding_function=embeddings,
+                    collection_name=COLLECTION_NAME,
+                    engine_args={"poolclass": BorrowingPool}
+                )
+    return vectorstore
 
 
 def add_documents(documents):
@@ -91,17 +494,10 @@ def add_documents(documents):
 
         # Belgeleri ekle
         vectorstore.add_documents(documents)
+        bump_corpus_version()
 
         # Doğrulama yap
-        import psycopg2
-
-        conn = psycopg2.connect(
-            host=DB_HOST,
-            port=DB_PORT,
-            database=DB_NAME,
-            user=DB_USER,
-            password=DB_PASS
-        )
+        conn = get_db_connection()
         cursor = conn.cursor()
 
         # document_chunks tablosunda bu transaction ile eklenen belge sayısı
@@ -9,6 +9,7 @@ import time
 from typing import List, Dict, Any, Optional
 
 from app.db import get_db_connection
+from app.coalesce import bump_corpus_version
 from sentence_transformers import SentenceTransformer
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_community.embeddings import SentenceTransformerEmbeddings
@@ -119,12 +120,19 @@ def save_chunks_to_db(document_id: str, chunks: List[Dict[str, Any]],
 
         embeddings = generate_embeddings(texts, model_name)
 
+        # Kategori indeksleme sırasında bir kez hesaplanır, sorgu anında tekrar taranmaz.
+        # Kategori merkezleri varsa hazır embedding'lerle tek matris çarpımı yeterlidir.
+        from app.categorizer import detect_document_category
+        from app.category_centroids import classify_embeddings
+
+        centroid_categories = classify_embeddings(embeddings, model_name)
+
         # Her bir parçayı veritabanına kaydet
         for i, chunk in enumerate(chunks):
             cursor.execute("""
             INSERT INTO document_chunks 
-                (document_id, title, content, chunk_index, total_chunks, embedding, embedding_model)
-            VALUES (%s, %s, %s, %s, %s, %s, %s)
+                (document_id, title, content, chunk_index, total_chunks, embedding, embedding_model, category)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
             """, (
                 document_id,
                 chunk["title"],
@@ -132,10 +140,13 @@ def save_chunks_to_db(document_id: str, chunks: List[Dict[str, Any]],
                 chunk["chunk_index"],
                 chunk["total_chunks"],
                 embeddings[i],
-                model_name  # Burada model_name kullanılıyor
+                model_name,  # Burada model_name kullanılıyor
+                chunk.get("category") or (centroid_categories[i][0] if centroid_categories
+                                           else detect_document_category(chunk["content"]))
             ))
 
         conn.commit()
+        bump_corpus_version()
         print(f"INFO - {len(chunks)} belge parçası veritabanına kaydedildi")
         return len(chunks)
     except Exception as e:
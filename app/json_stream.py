@@ -0,0 +1,179 @@
+"""
+LLM çıktısı için artımlı ve hoşgörülü JSON ayrıştırıcı.
+Token'lar geldikçe her karakter yalnızca bir kez taranır; üst düzey alanlar
+tamamlandıkça ayrıştırılır ve beklenen nesnenin kapanış parantezi geldiğinde
+ayrıştırma biter. Böylece üretim erken durdurulabilir ve tam çıktı üzerinde
+regex geçişlerine gerek kalmaz.
+"""
+import ast
+import json
+from typing import Any, Dict, Optional, Tuple
+
+UNPARSED = object()
+
+
+def parse_value(text: str):
+    """
+    Tek bir JSON değerini ayrıştırır; geçersiz JSON için Python sözdizimini dener.
+
+    Tek tırnaklı metinleri, None/True/False değerlerini ve sondaki virgülleri
+    tolere eder. Hiçbiri olmazsa tırnaksız metni olduğu gibi döndürür; ayrıştırılamayan
+    nesne/liste değerleri ise ham metin olarak geçirilmez, UNPARSED döner.
+    """
+    text = text.strip()
+    if not text:
+        return UNPARSED
+    try:
+        return json.loads(text)
+    except ValueError:
+        pass
+    try:
+        return ast.literal_eval(text)
+    except (ValueError, TypeError, SyntaxError):
+        pass
+    if text[0] in "{[":
+        # Bozuk iç içe değer (ör. {"x": [1,}]) metin alanı gibi döndürülmez
+        return UNPARSED
+    return text.strip("'\"")
+
+
+class StreamingJSONParser:
+    """
+    Akış halindeki metinden ilk JSON nesnesini artımlı olarak ayrıştırır.
+
+    İlk '{' karakterinden önceki her şey (açıklama, kod bloğu işaretleri) atlanır.
+    Tırnaksız anahtarlar, tek tırnaklı metinler ve sondaki virgüller tolere edilir.
+
+    Kullanım:
+        parser = StreamingJSONParser()
+        for token in token_stream:
+            new_fields = parser.feed(token)
+            if parser.done:
+                break
+        data = parser.fields
+    """
+
+    def __init__(self):
+        self.fields: Dict[str, Any] = {}
+        self.done = False
+        self.started = False
+        self.buffer = []
+        self.depth = 0
+        self.quote = None
+        self.escape = False
+        self.colon = None
+
+    def feed(self, text: str) -> Dict[str, Any]:
+        """
+        Yeni gelen metni işler.
+
+        Args:
+            text: Akıştan gelen metin parçası
+
+        Returns:
+            Bu parçayla tamamlanan üst düzey alanlar (yoksa boş sözlük)
+        """
+        completed = {}
+        for ch in text:
+            if self.done:
+                break
+            if not self.started:
+                if ch == "{":
+                    self.started = True
+                    self.depth = 1
+                continue
+
+            if self.quote is not None:
+                self.buffer.append(ch)
+                if self.escape:
+                    self.escape = False
+                elif ch == "\\":
+                    self.escape = True
+                elif ch == self.quote:
+                    self.quote = None
+                continue
+
+            if ch in "\"'":
+                self.quote = ch
+            elif ch in "{[":
+                self.depth += 1
+            elif ch in "}]":
+                self.depth -= 1
+                if self.depth == 0:
+                    self.complete_member(completed)
+                    self.done = True
+                    break
+            elif self.depth == 1:
+                if ch == ",":
+                    self.complete_member(completed)
+                    continue
+                if ch == ":" and self.colon is None:
+                    self.colon = len(self.buffer)
+            self.buffer.append(ch)
+
+        self.fields.update(completed)
+        return completed
+
+    def complete_member(self, completed: dict):
+        """Tamponda biriken "anahtar: değer" çiftini ayrıştırıp completed'a ekler"""
+        member = "".join(self.buffer)
+        colon = self.colon
+        self.buffer = []
+        self.colon = None
+
+        if colon is None:
+            return
+        key = member[:colon].strip().strip("\"'")
+        value = parse_value(member[colon + 1:])
+        if key and value is not UNPARSED:
+            completed[key] = value
+
+    def result(self) -> Optional[dict]:
+        """Nesne tamamlandıysa alanları, hiç alan yoksa None döndürür"""
+        if self.done or self.fields:
+            return dict(self.fields)
+        return None
+
+
+def parse_json_object(text: str) -> Optional[dict]:
+    """
+    Tam bir metindeki ilk JSON nesnesini StreamingJSONParser ile ayrıştırır.
+
+    Args:
+        text: LLM yanıtı (kod bloğu veya açıklama içerebilir)
+
+    Returns:
+        Ayrıştırılan sözlük veya nesne bulunamazsa None
+    """
+    parser = StreamingJSONParser()
+    parser.feed(text)
+    return parser.result()
+
+
+def collect_json(token_stream) -> Tuple[str, StreamingJSONParser]:
+    """
+    Token akışını JSON nesnesi tamamlanana kadar tüketir ve akışı kapatır.
+
+    Akışın kapatılması Ollama bağlantısını kapatır; böylece kapanış parantezinden
+    sonra üretilecek token'lar (açıklamalar, kod bloğu sonu) beklenmez.
+
+    Args:
+        token_stream: Metin parçaları üreten iterator (ör. llm.stream(prompt))
+
+    Returns:
+        (alınan_ham_metin, parser) tuple'ı
+    """
+    parser = StreamingJSONParser()
+    raw_tokens = []
+    try:
+        for token in token_stream:
+            raw_tokens.append(token)
+            parser.feed(token)
+            if parser.done:
+                print("DEBUG - JSON nesnesi tamamlandı, üretim durduruldu")
+                break
+    finally:
+        close = getattr(token_stream, "close", None)
+        if close is not None:
+            close()
+    return "".join(raw_tokens), parser
@@ -2,92 +2,164 @@
 """
 LLM işlemleri.
 """
-import json
-import os
-import re
-from pydantic import create_model, Field
-from langchain_community.llms import Ollama
+from typing import get_origin
+
+from pydantic import ValidationError
 from langchain.prompts import ChatPromptTemplate
 from langchain.output_parsers import PydanticOutputParser
 from langchain.schema.runnable import RunnablePassthrough
 from langchain.schema.output_parser import StrOutputParser
 from langchain_core.documents import Document
 
-from app.config import LLM_MODEL, MODEL_SCHEMA_FILE, PROMPT_TEMPLATE_FILE
+from app.config import LLM_MODEL, LLM_SMALL_MODEL, LLM_CASCADE_ENABLED, MODEL_SCHEMA_FILE, PROMPT_TEMPLATE_FILE
 from app.embedding import get_embeddings
 from app.db import get_vectorstore
-from app.categorizer import detect_query_category, detect_document_category, filter_documents_by_category
+from app.context import prepare_documents
+from app.llm_client import PooledOllama, has_prompt_context
+from app.registry import get_compiled, get_compiled_file
+from app.schema_types import compile_model_schemas
+from app.json_stream import StreamingJSONParser, collect_json, parse_json_object
+from app.cascade import check_answer, record_cascade_result
+
+
+_llms = {}
+_structured_models = None
+_response_formats = {}
+
+# Prompt önekini bulmak için şablona soru yerine yerleştirilen işaret
+QUERY_MARKER = "\x00RAGCLI_QUERY\x00"
 
 
-def get_llm():
+def get_llm(model=None):
     """
     LLM modelini döndür.
+
+    Tüm çağrılar paylaşılan, bağlantı havuzlu Ollama istemcisini kullanır.
+
+    Args:
+        model: Ollama model adı (None=LLM_MODEL)
+    """
+    model = model or LLM_MODEL
+    if model not in _llms:
+        _llms[model] = PooledOllama(model=model)
+    return _llms[model]
+
+
+DEFAULT_MODEL_SCHEMAS = {
+    "DocumentResponse": {
+        "fields": {
+            "title": {"type": "str", "description": "Belgenin başlığı"},
+            "summary": {"type": "str", "description": "İçerik özeti"},
+            "key_points": {"type": "list[str]", "description": "Anahtar noktalar"}
+        }
+    }
+}
+
+# Yapılandırılmış veri yolunun yerleşik modelleri (build_structured_prompt ile aynı alanlar).
+# models.json aynı adla bir şema tanımlarsa dosyadaki tanım kullanılır.
+STRUCTURED_MODEL_SCHEMAS = {
+    "FilmInfo": {
+        "fields": {
+            "title": {"type": "str", "description": "Filmin başlığı"},
+            "plot_summary": {"type": "str", "description": "Film özeti"},
+            "cast": {"type": "list[str]", "description": "Oyuncular"},
+            "director": {"type": "str", "description": "Yönetmen adı"},
+            "genre": {"type": "list[str]", "description": "Türler"},
+            "release_year": {"type": "str", "description": "Çıkış yılı"},
+            "imdb_rating": {"type": "str", "description": "IMDb puanı"}
+        }
+    },
+    "BookInfo": {
+        "fields": {
+            "title": {"type": "str", "description": "Kitap başlığı"},
+            "author": {"type": "str", "description": "Yazar adı"},
+            "summary": {"type": "str", "description": "Kitap özeti"},
+            "genre": {"type": "list[str]", "description": "Türler"},
+            "publish_year": {"type": "str", "description": "Yayın yılı"},
+            "page_count": {"type": "str", "description": "Sayfa sayısı"},
+            "rating": {"type": "str", "description": "Puanlama"}
+        }
+    },
+    "PersonInfo": {
+        "fields": {
+            "name": {"type": "str", "description": "Kişinin adı"},
+            "birth_date": {"type": "str", "description": "Doğum tarihi"},
+            "death_date": {"type": "str", "description": "Ölüm tarihi (varsa)"},
+            "nationality": {"type": "str", "description": "Uyruk"},
+            "occupation": {"type": "list[str]", "description": "Meslekler"},
+            "biography": {"type": "str", "description": "Kısa biyografi"},
+            "notable_works": {"type": "list[str]", "description": "Önemli eserler"},
+            "awards": {"type": "list[str]", "description": "Ödüller"}
+        }
+    }
+}
+
+DEFAULT_PROMPT_TEMPLATES = {
+    "default": {
+        "messages": [
+            {"role": "system",
+             "content": "Sen bir uzman asistansın. Kullanıcının sorgusunu, verilen bağlamı kullanarak yanıtla."},
+            {"role": "user", "content": "Bağlam:\n{context}\n\nSoru: {query}\nCevap:"}
+        ]
+    }
+}
+
+
+def compile_prompt_template(template_name, template_def):
+    """
+    Şablon tanımından ChatPromptTemplate oluşturur.
     """
-    return Ollama(model=LLM_MODEL)
+    messages = [(msg["role"], msg["content"]) for msg in template_def["messages"]]
+
+    return ChatPromptTemplate.from_messages(messages)
 
 
 def load_model_schema(schema_name="DocumentResponse", schema_file=MODEL_SCHEMA_FILE):
     """
     Dinamik model şablonunu yükle.
-    """
-    if not os.path.exists(schema_file):
-        os.makedirs(os.path.dirname(schema_file), exist_ok=True)
-        default_schema = {
-            "DocumentResponse": {
-                "fields": {
-                    "title": {"type": "str", "description": "Belgenin başlığı"},
-                    "summary": {"type": "str", "description": "İçerik özeti"},
-                    "key_points": {"type": "list[str]", "description": "Anahtar noktalar"}
-                }
-            }
-        }
-        with open(schema_file, 'w', encoding='utf-8') as f:
-            json.dump(default_schema, f, indent=2, ensure_ascii=False)
 
-    with open(schema_file, 'r', encoding='utf-8') as f:
-        schemas = json.load(f)
+    Dosyadaki tüm şemalar yüklenirken bir kez derlenir (app.schema_types); sınıflar
+    dosya değişene kadar kayıttan (app.registry) döndürülür.
+    """
+    global _structured_models
 
-    if schema_name not in schemas:
-        raise ValueError(f"Şema '{schema_name}' bulunamadı")
+    compiled = get_compiled_file(schema_file, compile_model_schemas, default=DEFAULT_MODEL_SCHEMAS)
 
-    schema_def = schemas[schema_name]
-    fields = {}
+    if schema_name in compiled["errors"]:
+        raise ValueError(f"Şema '{schema_name}' geçersiz: {compiled['errors'][schema_name]}")
+    if schema_name in compiled["models"]:
+        return compiled["models"][schema_name]
 
-    for field_name, field_props in schema_def["fields"].items():
-        field_type = eval(field_props["type"])
-        fields[field_name] = (field_type, Field(description=field_props["description"]))
+    if schema_name in STRUCTURED_MODEL_SCHEMAS:
+        if _structured_models is None:
+            _structured_models = compile_model_schemas(STRUCTURED_MODEL_SCHEMAS)["models"]
+        return _structured_models[schema_name]
 
-    return create_model(schema_name, **fields)
+    raise ValueError(f"Şema '{schema_name}' bulunamadı")
 
 
-def load_prompt_template(template_name="default", template_file=PROMPT_TEMPLATE_FILE):
-    """
-    Dinamik prompt şablonunu yükle.
+def get_response_format(model_name):
     """
-    if not os.path.exists(template_file):
-        os.makedirs(os.path.dirname(template_file), exist_ok=True)
-        default_templates = {
-            "default": {
-                "messages": [
-                    {"role": "system",
-                     "content": "Sen bir uzman asistansın. Kullanıcının sorgusunu, verilen bağlamı kullanarak yanıtla."},
-                    {"role": "user", "content": "Soru: {query}\nBağlam: {context}\nCevap:"}
-                ]
-            }
-        }
-        with open(template_file, 'w', encoding='utf-8') as f:
-            json.dump(default_templates, f, indent=2, ensure_ascii=False)
+    Ollama'ya yapılandırılmış çıktı kısıtı (format) olarak gönderilecek JSON şemasını döndürür.
 
-    with open(template_file, 'r', encoding='utf-8') as f:
-        templates = json.load(f)
+    Şema, model sınıfı değişene (dosya düzenlenene) kadar önbellekten döndürülür.
+    """
+    model_schema = load_model_schema(model_name)
+    response_format = _response_formats.get(model_name)
+    if response_format is None or response_format[0] is not model_schema:
+        response_format = (model_schema, model_schema.model_json_schema())
+        _response_formats[model_name] = response_format
+    return response_format[1]
 
-    if template_name not in templates:
-        raise ValueError(f"Şablon '{template_name}' bulunamadı")
 
-    template_def = templates[template_name]
-    messages = [(msg["role"], msg["content"]) for msg in template_def["messages"]]
+def load_prompt_template(template_name="default", template_file=PROMPT_TEMPLATE_FILE):
+    """
+    Dinamik prompt şablonunu yükle.
 
-    return ChatPromptTemplate.from_messages(messages)
+    Derlenen şablon, dosya değişene kadar kayıttan (app.registry) döndürülür.
+    """
+    return get_compiled(template_file, template_name, compile_prompt_template,
+                        default=DEFAULT_PROMPT_TEMPLATES, kind="Şablon")
 
 
 def create_rag_chain(template_name="default"):
@@ -108,32 +180,23 @@ def create_rag_chain(template_name="default"):
     )
 
 
-def parse_structured_data(question, context, model_name, template_name, sources):
+def is_structured_request(model_name, template_name):
     """
-    Yapılandırılmış veri modelleri için metinsel verileri analiz eder.
-
-    Sorguya göre uygun JSON formatı talep eder ve LLM yanıtını ilgili
-    Pydantic şemasına dönüştürür.
-
-    Args:
-        question: Kullanıcı sorusu
-        context: Bağlam metni (indekslenen belgelerden)
-        model_name: Kullanılacak model adı (FilmInfo, BookInfo, PersonInfo vb.)
-        template_name: Kullanılacak şablon adı (film_query, book_query, person_query vb.)
-        sources: Kaynak belgeler
-
-    Returns:
-        Yapılandırılmış veri nesnesi ve kullanılan kaynaklar
+    Sorgunun yapılandırılmış veri (JSON) yolundan işlenip işlenmeyeceğini döndürür.
     """
-    print(f"INFO - Yapılandırılmış veri sorgusu algılandı: {model_name} modeli ile işleniyor...")
+    return model_name in ["FilmInfo", "BookInfo", "PersonInfo"] or template_name in ["film_query", "book_query",
+                                                                                     "person_query",
+                                                                                     "structured_data"]
 
-    # Prompt hazırlama
-    prompt = f"""Sen bir veri ayrıştırma uzmanısın. Verilen metni analiz ederek ilgili tüm bilgileri çıkar ve JSON formatında yapılandır.
 
-Soru: {question}
+def build_structured_prefix(context, model_name):
+    """
+    Yapılandırılmış veri prompt'unun sorudan önceki sabit kısmını oluşturur.
 
-İlgili belgeler:
-{context}
+    Talimatlar ve JSON formatı başta, bağlam sonda yer alır; böylece aynı bağlamla
+    sorulan takip sorularında önek değişmez ve LLM sunucusunda yeniden kullanılabilir.
+    """
+    prompt = """Sen bir veri ayrıştırma uzmanısın. Verilen metni analiz ederek ilgili tüm bilgileri çıkar ve JSON formatında yapılandır.
 
 Metinden tüm önemli bilgileri çıkar ve aşağıdaki JSON formatında döndür:
 
@@ -182,181 +245,307 @@ Metinden tüm önemli bilgileri çıkar ve aşağıdaki JSON formatında döndü
 
     prompt += "\n\nSadece JSON formatında yanıt ver, başka açıklama ekleme. Eğer belirli bir bilgiyi bulamazsan, ilgili alanı boş bırak veya \"\" değerini kullan - null değerini kullanma."
 
+    prompt += f"\n\nİlgili belgeler:\n{context}\n"
+
+    return prompt
+
+
+def build_structured_prompt(question, context, model_name):
+    """
+    Yapılandırılmış veri sorgusu için JSON formatı talep eden prompt'u oluşturur.
+
+    Prompt, build_structured_prefix ile başlar; soruya bağlı kısımlar en sona eklenir.
+    """
+    prompt = build_structured_prefix(context, model_name)
+
     # Önemli - Marie Curie sorgusu için ek bilgi
     if "marie curie" in question.lower() and model_name == "PersonInfo":
-        prompt += "\n\nMarie Curie, 1867-1934 yılları arasında yaşamış, Polonya doğumlu bir fizikçi ve kimyagerdir. Radyoaktivite alanında öncü çalışmalar yapmış, Polonyum ve Radyum elementlerini keşfetmiştir. Fizik ve Kimya alanlarında iki Nobel Ödülü almıştır."
+        prompt += "\nMarie Curie, 1867-1934 yılları arasında yaşamış, Polonya doğumlu bir fizikçi ve kimyagerdir. Radyoaktivite alanında öncü çalışmalar yapmış, Polonyum ve Radyum elementlerini keşfetmiştir. Fizik ve Kimya alanlarında iki Nobel Ödülü almıştır.\n"
 
-    # LLM çağrısı - temperature düşürülmüş (daha deterministik sonuçlar için)
-    llm = get_llm()
-    raw_answer = llm(prompt)
+    prompt += f"\nSoru: {question}\n"
+
+    return prompt
+
+
+def get_prompt_prefix(prompt_template, context):
+    """
+    Şablondan üretilecek prompt'un soruya kadar olan sabit kısmını döndürür.
+
+    Args:
+        prompt_template: ChatPromptTemplate
+        context: Bağlam metni
+
+    Returns:
+        Önek metni; şablonda bağlam sorudan sonra geliyorsa None
+    """
+    rendered = prompt_template.format(query=QUERY_MARKER, context=context)
+    marker = rendered.find(QUERY_MARKER)
+    if marker < 0:
+        return None
+
+    # Önek, sorunun bulunduğu satırdan önceki son satır sonuna kadar uzanır
+    prefix = rendered[:rendered.rfind("\n", 0, marker) + 1]
+    if not prefix or context not in prefix:
+        return None
+    return prefix
+
+
+def parse_structured_data(question, context, model_name, template_name, sources, llm_model=None):
+    """
+    Yapılandırılmış veri modelleri için metinsel verileri analiz eder.
+
+    Sorguya göre uygun JSON formatı talep eder ve LLM yanıtını ilgili
+    Pydantic şemasına dönüştürür.
+
+    Args:
+        question: Kullanıcı sorusu
+        context: Bağlam metni (indekslenen belgelerden)
+        model_name: Kullanılacak model adı (FilmInfo, BookInfo, PersonInfo vb.)
+        template_name: Kullanılacak şablon adı (film_query, book_query, person_query vb.)
+        sources: Kaynak belgeler
+        llm_model: Kullanılacak Ollama modeli (None=LLM_MODEL)
+
+    Returns:
+        Yapılandırılmış veri nesnesi ve kullanılan kaynaklar
+    """
+    answer, _ = generate_structured_answer(question, context, model_name, llm_model=llm_model)
+    return answer, sources
+
+
+def generate_structured_answer(question, context, model_name, llm_model=None):
+    """
+    Yapılandırılmış veri prompt'uyla LLM'den JSON yanıt alır ve şemaya dönüştürür.
+
+    Returns:
+        (yanıt_modeli, geçerli_mi) tuple'ı; JSON şemaya uymadıysa geçerli_mi False olur
+    """
+    print(f"INFO - Yapılandırılmış veri sorgusu algılandı: {model_name} modeli ile işleniyor...")
+
+    prompt = build_structured_prompt(question, context, model_name)
+
+    # Çıktı modelin JSON şemasına kısıtlanır ve akış modunda alınır;
+    # JSON nesnesi kapandığında üretim durdurulur. Akış done olayından önce
+    # kesildiğinden context token'ları alınmaz ve context önbelleği kullanılmaz
+    raw_answer, parser = collect_json(get_llm(llm_model).stream(prompt, format=get_response_format(model_name)))
 
     print(f"DEBUG - Yapılandırılmış veri LLM yanıtı alındı ({len(raw_answer)} karakter)")
 
-    # JSON formatını çıkar - regex kullanarak
+    return parse_structured_answer(raw_answer, model_name, parsed=parser.result())
+
+
+def get_empty_value(annotation):
+    """Alan tipine göre boş değer döndürür (liste -> [], sözlük -> {}, metin -> "")"""
+    origin = get_origin(annotation) or annotation
+    if origin in (list, dict):
+        return origin()
+    if annotation is str:
+        return ""
+    return None
+
+
+def convert_structured_answer(raw_answer, question, model_name, parsed=None):
+    """
+    Ham LLM yanıtındaki JSON'ı ilgili Pydantic şemasına dönüştürür.
+
+    Yanıt Ollama'da modelin JSON şemasına kısıtlandığı için doğrudan doğrulanır.
+    Şema kısıtını uygulamayan eski Ollama sürümleri veya yarıda kesilen yanıtlar için
+    eksik/geçersiz alanlar tipine göre boş değerle doldurulur.
+
+    Args:
+        raw_answer: Ham LLM yanıtı
+        question: Kullanıcı sorusu
+        model_name: Kullanılacak model adı
+        parsed: Akış sırasında ayrıştırılmış alanlar (None ise raw_answer ayrıştırılır)
+    """
+    return parse_structured_answer(raw_answer, model_name, parsed=parsed)[0]
+
+
+def parse_structured_answer(raw_answer, model_name, parsed=None):
+    """
+    convert_structured_answer gibi dönüştürür ve yanıtın şemaya uyup uymadığını da bildirir.
+
+    Returns:
+        (yanıt_modeli, geçerli_mi) tuple'ı; JSON bulunamadıysa veya alanlar boş değerle
+        doldurulduysa geçerli_mi False olur
+    """
+    model_schema = load_model_schema(model_name)
+    structured_data = parsed if parsed is not None else parse_json_object(raw_answer)
+    if structured_data is None:
+        print("HATA: Yapılandırılmış veri ayrıştırılamadı: yanıtta JSON nesnesi bulunamadı")
+        structured_data = {}
+
     try:
-        # Kod bloğu işaretlerini kaldır (```json ve ```)
-        cleaned_json = raw_answer
-        if "```" in cleaned_json:
-            # Sadece içeriği al
-            code_block_pattern = r"```(?:json)?\s*([\s\S]*?)```"
-            matches = re.findall(code_block_pattern, cleaned_json)
-            if matches:
-                cleaned_json = matches[0].strip()
-
-        # Metindeki son JSON bloğunu bul ({...} yapısı)
-        json_pattern = r"\{[\s\S]*\}"
-        matches = re.findall(json_pattern, cleaned_json)
-        if matches:
-            # Son eşleşmeyi al (birden fazla JSON bloğu olabilir)
-            cleaned_json = matches[-1].strip()
-
-        # JSON'ı parse et
-        structured_data = json.loads(cleaned_json)
-
-        # Null değerleri varsayılan değerlerle değiştir
-        for key in structured_data:
-            if structured_data[key] is None:
-                # Liste tipleri için boş liste
-                if key in ["occupation", "notable_works", "genre", "cast", "key_points", "awards"]:
-                    structured_data[key] = []
-                # String türleri için boş string
-                else:
-                    structured_data[key] = ""
-
-        # Model şablonunu yükle
-        model_schema = load_model_schema(model_name)
-
-        # Modele göre dönüşüm yap
-        try:
-            result = model_schema(**structured_data)
-            return result, sources
-        except Exception as e:
-            print(f"HATA: Yapılandırılmış veri modele dönüştürülürken hata: {e}")
-            # Başka bir deneme - eksik alanları tamamla
-            default_values = {}
-            for field_name in model_schema.__annotations__:
-                if field_name in ["occupation", "notable_works", "genre", "cast", "key_points", "awards"]:
-                    default_values[field_name] = []
-                else:
-                    default_values[field_name] = "Bilgi bulunamadı"
-
-            # Bulunan değerleri ekle
-            for key, value in structured_data.items():
-                if key in default_values and value not in [None, ""]:
-                    default_values[key] = value
-
-            return model_schema(**default_values), sources
+        return model_schema(**structured_data), True
+    except ValidationError as e:
+        print(f"UYARI - Yanıt {model_name} şemasına uymuyor ({e.error_count()} alan), "
+              f"eksik/geçersiz alanlar boş değerle dolduruluyor")
+        invalid_fields = {error["loc"][0] for error in e.errors() if error.get("loc")}
+
+    values = {}
+    for field_name, field_info in model_schema.model_fields.items():
+        value = structured_data.get(field_name)
+        if value is None or field_name in invalid_fields:
+            value = get_empty_value(field_info.annotation)
+        values[field_name] = value
+    return model_schema.model_construct(**values), False
+
+
+def retrieve_fallback_documents(question, docs, embedding_model=None):
+    """
+    Benzerlik araması başarısız olduğunda standart LangChain retriever ile belge getirir.
 
-    except Exception as e:
-        print(f"HATA: Yapılandırılmış veri ayrıştırılamadı: {e}")
-        import traceback
-        traceback.print_exc()
+    Senkron ve asenkron arama yolları aynı geri dönüşü kullanır.
 
-        # Özel durum - Marie Curie sorgusu
-        if "marie curie" in question.lower() and model_name == "PersonInfo":
-            # Marie Curie için örnek veri döndür
-            empty_schema = load_model_schema(model_name)
-            default_values = {
-                "name": "Marie Curie",
-                "birth_date": "7 Kasım 1867",
-                "death_date": "4 Temmuz 1934",
-                "nationality": "Polonyalı-Fransız",
-                "occupation": ["Fizikçi", "Kimyager", "Bilim insanı"],
-                "biography": "Marie Curie (1867-1934), radyoaktivite üzerine çalışmalarıyla tanınan Nobel ödüllü bir fizikçi ve kimyagerdir. Polonya'da doğmuş, sonradan Fransa'ya yerleşmiştir. Polonyum ve Radyum elementlerini keşfetmiştir.",
-                "notable_works": ["Radyoaktivite araştırmaları", "Polonyum ve Radyum'un keşfi"],
-                "awards": ["Nobel Fizik Ödülü (1903)", "Nobel Kimya Ödülü (1911)"]
-            }
-            return empty_schema(**default_values), sources
-
-        # Boş bir şablon nesne döndür - varsayılan değerlerle
-        empty_schema = load_model_schema(model_name)
-        default_values = {}
-        for field_name in empty_schema.__annotations__:
-            if field_name in ["occupation", "notable_works", "genre", "cast", "key_points", "awards"]:
-                default_values[field_name] = []
-            else:
-                default_values[field_name] = "Bilgi bulunamadı"
+    Args:
+        question: Kullanıcı sorusu
+        docs: Retriever da başarısız olursa döndürülecek belgeler
+        embedding_model: Kullanılacak embedding modeli (None=varsayılan model)
 
-        return empty_schema(**default_values), sources
+    Returns:
+        Belge listesi
+    """
+    from app.config import MAX_DOCUMENTS
 
+    try:
+        vectorstore = get_vectorstore(get_embeddings(embedding_model))
+        retriever = vectorstore.as_retriever(search_kwargs={"k": MAX_DOCUMENTS})
+        docs = retriever.get_relevant_documents(question)
+        print(f"Standart retriever ile {len(docs)} belge bulundu")
+    except Exception as e:
+        print(f"Standart retriever hatası: {e}")
+    return docs
 
-def query(question, template_name="default", model_name="DocumentResponse", embedding_model=None):
+
+def retrieve_documents(question, embedding_model=None, rerank=None, mmr=None, mmr_lambda=None,
+                       mmr_fetch_k=None, adaptive=None, sql_filter=None, window=None):
     """
-    Sorgu yap ve yanıtı döndür.
+    Soruya en uygun belgeleri vektör veritabanından getirir.
 
-    Hibrit benzerlik hesaplama yaklaşımı kullanarak vektör veritabanını sorgular
-    ve sorguya en uygun belgeleri bulur. Sonra LLM ile yanıtı oluşturur.
+    Varsayılan yol PGVector benzerlik araması, L2 skor düzeltmesi ve hibrit
+    filtrelemedir. MMR, uyarlanabilir k ve yeniden sıralama isteğe bağlı aşamalardır.
 
     Args:
         question: Kullanıcı sorusu
-        template_name: Kullanılacak prompt şablonu (default, academic, vb.)
-        model_name: Kullanılacak yanıt modeli (DocumentResponse, FilmInfo, vb.)
         embedding_model: Kullanılacak embedding modeli (None=varsayılan model)
+        rerank: Cross-encoder ile yeniden sıralama yapılsın mı (None=config değeri)
+        mmr: MMR ile çeşitlendirme yapılsın mı (None=config değeri)
+        mmr_lambda: MMR ilgi/çeşitlilik dengesi (None=config değeri)
+        mmr_fetch_k: MMR aday havuzu büyüklüğü (None=config değeri)
+        adaptive: Küçük k ile başlayıp skor dağılımına göre genişletilsin mi (None=config değeri)
+        sql_filter: Skor normalizasyonu ve eşik SQL içinde uygulansın mı (None=config değeri)
+        window: İsabetlere eklenecek ±komşu parça sayısı (None=config değeri, 0=kapalı)
 
     Returns:
-        (cevap, kaynaklar) tuple'ı
+        Belge listesi (ilgi sırasıyla)
     """
-    from app.config import EMBEDDING_MODEL, SIMILARITY_THRESHOLD, MAX_DOCUMENTS
-    from app.categorizer import detect_query_category
-    from app.similarity import correct_similarity_scores, filter_irrelevant_documents
+    from app.config import (EMBEDDING_MODEL, SIMILARITY_THRESHOLD, MAX_DOCUMENTS,
+                            RERANK_ENABLED, RERANK_CANDIDATES, MMR_ENABLED, MMR_LAMBDA, MMR_FETCH_K,
+                            ADAPTIVE_K_ENABLED, ADAPTIVE_INITIAL_K, ADAPTIVE_MAX_K, ADAPTIVE_SCORE_GAP,
+                            ADAPTIVE_KNEE_SENSITIVITY, SQL_FILTER_ENABLED, WINDOW_EXPANSION)
+    from app.category_centroids import classify_query
 
     # Embedding modelini belirleme
     if embedding_model is None:
         embedding_model = EMBEDDING_MODEL
 
+    if rerank is None:
+        rerank = RERANK_ENABLED
+    if mmr is None:
+        mmr = MMR_ENABLED
+    if mmr_lambda is None:
+        mmr_lambda = MMR_LAMBDA
+    if mmr_fetch_k is None:
+        mmr_fetch_k = MMR_FETCH_K
+    if adaptive is None:
+        adaptive = ADAPTIVE_K_ENABLED
+    if sql_filter is None:
+        sql_filter = SQL_FILTER_ENABLED
+    if window is None:
+        window = WINDOW_EXPANSION
+
     print(f"INFO - Sorgu embedding modeli: {embedding_model}")
     embeddings = get_embeddings(embedding_model)
-    db = get_vectorstore(embeddings)
+    threshold = max(0.1, min(SIMILARITY_THRESHOLD, 0.4))  # 0.1-0.4 arasında sınırla
 
     # Veritabanı bağlantısını kontrol et
     print("DEBUG - Veritabanı kontrol ediliyor")
     docs = []
 
     try:
-        # Kategori tespiti
-        query_category = detect_query_category(question)
+        # Sorgu embedding'i bir kez hesaplanır; hem kategori tespitinde hem aramada kullanılır
+        query_embedding = embeddings.embed_query(question)
+        query_category = classify_query(question, query_embedding, embedding_model)
         print(f"INFO - Algılanan sorgu kategorisi: {query_category}")
 
         # Benzerlik araması yap
+        score_type = "l2"
         try:
-            # Daha fazla belge getir, sonra filtreleyeceğiz
-            original_docs_with_scores = db.similarity_search_with_score(
+            if mmr:
+                # Aday havuzunu saklanan embedding'leriyle getir ve MMR ile çeşitlendir
+                from app.retrieval import search_chunks
+                from app.similarity import maximal_marginal_relevance
+
+                candidate_count = max(RERANK_CANDIDATES, MAX_DOCUMENTS) if rerank else MAX_DOCUMENTS
+                pool, pool_embeddings = search_chunks(
+                    query_embedding,
+                    k=max(mmr_fetch_k, candidate_count),
+                    with_embeddings=True,
+                    embedding_model=embedding_model
+                )
+                selected = maximal_marginal_relevance(
+                    query_embedding,
+                    pool_embeddings,
+                    lambda_mult=mmr_lambda,
+                    k=candidate_count
+                )
+                original_docs_with_scores = [pool[i] for i in selected]
+                print(f"INFO - MMR: {len(pool)} aday arasından {len(selected)} belge seçildi (λ={mmr_lambda})")
+            elif adaptive and not rerank:
+                # Küçük k ile başla, kuyruk hâlâ ilgiliyse genişlet
+                from app.similarity import adaptive_similarity_search
+                vectorstore = get_vectorstore(embeddings)
+                original_docs_with_scores = adaptive_similarity_search(
+                    lambda k: vectorstore.similarity_search_with_score_by_vector(query_embedding, k=k),
+                    initial_k=ADAPTIVE_INITIAL_K,
+                    max_k=ADAPTIVE_MAX_K,
+                    threshold=threshold,
+                    min_gap=ADAPTIVE_SCORE_GAP,
+                    knee_sensitivity=ADAPTIVE_KNEE_SENSITIVITY
+                )
+            elif sql_filter and not rerank:
+                # Normalizasyon, eşik ve min-docs veritabanında uygulanır; yalnızca kullanılacak
+                # satırlar gelir. Kategori filtresi yoksa max_docs kesimi de SQL'de yapılır.
+                from app.retrieval import search_collection_filtered
+                original_docs_with_scores = search_collection_filtered(
+                    query_embedding,
+                    k=MAX_DOCUMENTS * 2,
+                    threshold=threshold,
+                    min_docs=3,  # filter_irrelevant_documents ile aynı
+                    max_docs=MAX_DOCUMENTS if query_category in (None, "general") else None
+                )
+                score_type = "similarity"
+            else:
+                # Daha fazla belge getir, sonra filtreleyeceğiz
+                # Yeniden sıralama açıksa daha geniş bir aday kümesi kullan
+                candidate_count = max(RERANK_CANDIDATES, MAX_DOCUMENTS) if rerank else MAX_DOCUMENTS * 2
+                original_docs_with_scores = get_vectorstore(embeddings).similarity_search_with_score_by_vector(
+                    query_embedding,
+                    k=candidate_count
+                )
+
+            docs = select_documents(
                 question,
-                k=MAX_DOCUMENTS * 2
-            )
-
-            # Sonuçları göster
-            print(f"\n🔍 '{question}' sorgusu için benzerlik skorları:")
-            print("=" * 50)
-            for i, (doc, score) in enumerate(original_docs_with_scores):
-                source = doc.metadata.get('source', 'bilinmiyor')
-                print(f"Belge {i + 1}: {source} - Benzerlik: {score} ({score * 100:.2f}%)")
-                content_preview = doc.page_content[:100].replace('\n', ' ')
-                print(f"  İçerik: {content_preview}...")
-
-            # ADIM 1: L2 uzaklığını benzerlik skorlarına dönüştür
-            # PGVector varsayılan olarak L2 uzaklığını kullanır (düşük=iyi)
-            corrected_docs_with_scores = correct_similarity_scores(
                 original_docs_with_scores,
-                score_type="l2"  # PGVector için L2 uzaklığı
-            )
-
-            # ADIM 2: Hibrit filtreleme uygula (benzerlik eşiği + kategori)
-            filtered_docs_with_scores = filter_irrelevant_documents(
-                corrected_docs_with_scores,
-                category=query_category,
-                threshold=max(0.1, min(SIMILARITY_THRESHOLD, 0.4)),  # 0.1-0.4 arasında sınırla
-                max_docs=MAX_DOCUMENTS
+                query_category=query_category,
+                rerank=rerank,
+                threshold=threshold,
+                score_type=score_type
             )
 
-            # Sonuçlar boşsa, düzeltilmiş sonuçları kullan
-            if not filtered_docs_with_scores and corrected_docs_with_scores:
-                print("⚠️ Filtreleme sonrası belge kalmadı, en yüksek skorlu belgeler kullanılıyor")
-                filtered_docs_with_scores = corrected_docs_with_scores[:3]
-
-            # Belge listesini çıkar
-            docs = [doc for doc, _ in filtered_docs_with_scores]
-            print(f"📊 Filtreleme sonrası {len(docs)} belge kaldı")
+            if window:
+                # Cevabın devamı çoğunlukla aynı belgenin komşu parçalarındadır
+                from app.retrieval import expand_chunk_windows
+                docs = expand_chunk_windows(docs, window)
 
         except Exception as e:
             print(f"Benzerlik araması hatası: {e}")
@@ -364,31 +553,238 @@ def query(question, template_name="default", model_name="DocumentResponse", embe
             traceback.print_exc()
 
             # Backup sorgu yöntemi - standart retriever kullan
-            try:
-                retriever = db.as_retriever(search_kwargs={"k": MAX_DOCUMENTS})
-                docs = retriever.get_relevant_documents(question)
-                print(f"Standart retriever ile {len(docs)} belge bulundu")
-            except Exception as e2:
-                print(f"Standart retriever hatası: {e2}")
-
-        # Kategori kontrolü - Marie Curie için özel durum
-        if "marie curie" in question.lower() and not any("marie" in doc.page_content.lower() for doc in docs):
-            print("⚠️ Marie Curie'ye ait belge bulunamadı, örnek veri ekleniyor")
-            from langchain_core.documents import Document
-            docs.append(Document(
-                page_content="Marie Curie (7 Kasım 1867 - 4 Temmuz 1934) Nobel ödüllü Polonyalı bilim insanıdır. Polonya doğumlu Fransız fizikçi ve kimyager. Radioaktivite alanında öncü çalışmalar yapmış ve Polonyum ve Radyum elementlerini keşfetmiştir. Fizik ve Kimya alanında iki Nobel Ödülü alan ilk ve tek kişidir.",
-                metadata={"source": "örnek_veri", "title": "Marie Curie"}
-            ))
+            docs = retrieve_fallback_documents(question, docs, embedding_model)
+
+        docs = add_sample_documents(question, docs)
 
     except Exception as e:
         print(f"DEBUG - Genel sorgu hatası: {e}")
         import traceback
         traceback.print_exc()
 
+    return docs
+
+
+def select_documents(question, original_docs_with_scores, query_category=None, rerank=False, threshold=0.3,
+                     score_type="l2"):
+    """
+    Vektör aramasından gelen adaylardan bağlama girecek belgeleri seçer.
+
+    Ham skorları normalize eder, ardından yeniden sıralama veya hibrit filtreleme uygular.
+
+    Args:
+        question: Kullanıcı sorusu
+        original_docs_with_scores: Vektör aramasından gelen (belge, ham_skor) tuple'ları
+        query_category: Sorgu kategorisi (film, book, person, general)
+        rerank: Cross-encoder ile yeniden sıralama yapılsın mı
+        threshold: Minimum benzerlik eşiği
+        score_type: Ham skor tipi ('cosine', 'l2', 'dot')
+
+    Returns:
+        Belge listesi (ilgi sırasıyla)
+    """
+    from app.config import MAX_DOCUMENTS
+    from app.similarity import ScoredResults, filter_irrelevant_documents
+
+    # Sonuçları göster
+    print(f"\n🔍 '{question}' sorgusu için benzerlik skorları:")
+    print("=" * 50)
+    for i, (doc, score) in enumerate(original_docs_with_scores):
+        source = doc.metadata.get('source', 'bilinmiyor')
+        print(f"Belge {i + 1}: {source} - Benzerlik: {score} ({score * 100:.2f}%)")
+        content_preview = doc.page_content[:100].replace('\n', ' ')
+        print(f"  İçerik: {content_preview}...")
+
+    # ADIM 1: L2 uzaklığını benzerlik skorlarına dönüştür
+    # PGVector varsayılan olarak L2 uzaklığını kullanır (düşük=iyi)
+    corrected = ScoredResults.from_pairs(original_docs_with_scores).normalized(
+        score_type=score_type  # PGVector için L2 uzaklığı
+    )
+
+    if rerank:
+        # ADIM 2: Cross-encoder ile yeniden sırala
+        # Eşik ve kategori sezgileri yerine (sorgu, parça) skorları kullanılır
+        from app.reranker import rerank_documents
+        filtered_docs_with_scores = rerank_documents(
+            question,
+            corrected.to_pairs(),
+            top_k=MAX_DOCUMENTS
+        )
+    else:
+        # ADIM 2: Hibrit filtreleme uygula (benzerlik eşiği + kategori)
+        filtered_docs_with_scores = filter_irrelevant_documents(
+            corrected,
+            category=query_category,
+            threshold=threshold,
+            max_docs=MAX_DOCUMENTS
+        )
+
+    # Sonuçlar boşsa, düzeltilmiş sonuçları kullan
+    if not filtered_docs_with_scores and corrected:
+        print("⚠️ Filtreleme sonrası belge kalmadı, en yüksek skorlu belgeler kullanılıyor")
+        filtered_docs_with_scores = corrected.head(3).to_pairs()
+
+    # Belge listesini çıkar
+    docs = [doc for doc, _ in filtered_docs_with_scores]
+    print(f"📊 Filtreleme sonrası {len(docs)} belge kaldı")
+
+    return docs
+
+
+def add_sample_documents(question, docs):
+    """
+    Bilinen örnek sorgular için belge bulunamadığında örnek veri ekler.
+    """
+    # Kategori kontrolü - Marie Curie için özel durum
+    if "marie curie" in question.lower() and not any("marie" in doc.page_content.lower() for doc in docs):
+        print("⚠️ Marie Curie'ye ait belge bulunamadı, örnek veri ekleniyor")
+        docs.append(Document(
+            page_content="Marie Curie (7 Kasım 1867 - 4 Temmuz 1934) Nobel ödüllü Polonyalı bilim insanıdır. Polonya doğumlu Fransız fizikçi ve kimyager. Radioaktivite alanında öncü çalışmalar yapmış ve Polonyum ve Radyum elementlerini keşfetmiştir. Fizik ve Kimya alanında iki Nobel Ödülü alan ilk ve tek kişidir.",
+            metadata={"source": "örnek_veri", "title": "Marie Curie"}
+        ))
+    return docs
+
+
+def query(question, template_name="default", model_name="DocumentResponse", embedding_model=None,
+          rerank=None, mmr=None, mmr_lambda=None, mmr_fetch_k=None, adaptive=None, sql_filter=None, window=None,
+          compress=None, session=None, cascade=None):
+    """
+    Sorgu yap ve yanıtı döndür.
+
+    Hibrit benzerlik hesaplama yaklaşımı kullanarak vektör veritabanını sorgular
+    ve sorguya en uygun belgeleri bulur. Sonra LLM ile yanıtı oluşturur.
+
+    Args:
+        question: Kullanıcı sorusu
+        template_name: Kullanılacak prompt şablonu (default, academic, vb.)
+        model_name: Kullanılacak yanıt modeli (DocumentResponse, FilmInfo, vb.)
+        embedding_model: Kullanılacak embedding modeli (None=varsayılan model)
+        rerank: Cross-encoder ile yeniden sıralama yapılsın mı (None=config değeri)
+        mmr: MMR ile çeşitlendirme yapılsın mı (None=config değeri)
+        mmr_lambda: MMR ilgi/çeşitlilik dengesi (None=config değeri)
+        mmr_fetch_k: MMR aday havuzu büyüklüğü (None=config değeri)
+        adaptive: Uyarlanabilir k ile arama yapılsın mı (None=config değeri)
+        sql_filter: Skor normalizasyonu ve eşik SQL içinde uygulansın mı (None=config değeri)
+        window: İsabetlere eklenecek ±komşu parça sayısı (None=config değeri, 0=kapalı)
+        compress: Bağlam cümle düzeyinde sıkıştırılsın mı (None=config değeri)
+        session: Konuşma oturumu (app.sessions.Session); verilirse geçmiş bağlama eklenir
+            ve saklanan parçalar yeniden kullanılabilir
+        cascade: Önce küçük modelle yanıtlansın mı (None=config değeri)
+
+    Returns:
+        (cevap, kaynaklar) tuple'ı
+    """
+    docs = retrieve_session_documents(
+        question,
+        session,
+        embedding_model=embedding_model,
+        rerank=rerank,
+        mmr=mmr,
+        mmr_lambda=mmr_lambda,
+        mmr_fetch_k=mmr_fetch_k,
+        adaptive=adaptive,
+        sql_filter=sql_filter,
+        window=window
+    )
+
     print(f"DEBUG - Sorgu: {question}")
     print(f"DEBUG - Toplam {len(docs)} belge getirildi")
 
-    # Belgeleri birleştirerek LLM için bağlam oluştur
+    # Örtüşmeleri çıkar, isteğe bağlı olarak sıkıştır ve bağlamı token bütçesine sığdır
+    docs = prepare_documents(question, docs, compress=compress, embedding_model=embedding_model)
+    context = build_context(docs)
+    sources = build_sources(docs)
+
+    if cascade is None:
+        cascade = LLM_CASCADE_ENABLED
+
+    if cascade and LLM_SMALL_MODEL != LLM_MODEL:
+        # Önce küçük model; ucuz güven kontrolü başarısız olursa büyük modele geçilir
+        result, valid = generate_answer(question, context, template_name, model_name, llm_model=LLM_SMALL_MODEL,
+                                        session=session)
+        reason = check_answer(result, context, valid)
+        record_cascade_result(reason)
+        if reason is not None:
+            print(f"INFO - {LLM_SMALL_MODEL} yanıtı yetersiz ({reason}), {LLM_MODEL} ile yeniden yanıtlanıyor")
+            result, _ = generate_answer(question, context, template_name, model_name, session=session)
+    else:
+        result, _ = generate_answer(question, context, template_name, model_name, session=session)
+
+    if session is not None:
+        session.add_turn(question, result)
+    return result, sources
+
+
+def generate_answer(question, context, template_name, model_name, llm_model=None, session=None):
+    """
+    Hazır bağlamla LLM'den yanıt üretir ve yanıt modeline dönüştürür.
+
+    Args:
+        question: Kullanıcı sorusu
+        context: build_context ile oluşturulan bağlam metni
+        template_name: Kullanılacak prompt şablonu
+        model_name: Kullanılacak yanıt modeli
+        llm_model: Kullanılacak Ollama modeli (None=LLM_MODEL)
+        session: Konuşma oturumu; verilirse geçmiş eklenir veya context token'ları yeniden kullanılır
+
+    Returns:
+        (cevap, geçerli_mi) tuple'ı; geçerli_mi yalnızca JSON istenen yapılandırılmış yanıt şemaya
+        uymadığında False olur (serbest metin şablonları JSON istemediğinden her zaman True)
+    """
+    # Yapılandırılmış veri modelleri için özel işleme
+    if is_structured_request(model_name, template_name):
+        context, _ = get_conversation_context(None, context, session)
+        return generate_structured_answer(question, context, model_name, llm_model=llm_model)
+
+    # LCEL sorgu zincirine yönlendir
+    prompt_template = load_prompt_template(template_name)
+
+    # Oturumdaki takip sorularında önek için saklanan context token'ları yeniden kullanılır
+    context, cache_options = get_conversation_context(prompt_template, context, session, llm_model)
+    llm = get_llm(llm_model).bind(**cache_options)
+    chain = prompt_template | llm | StrOutputParser()
+    raw_response = chain.invoke({"query": question, "context": context})
+
+    # Yanıt tek sefer üretilir; yanıt modeline uymazsa ham metin ayrıştırılır. Şablon JSON
+    # istemediği için ham metin geçersiz sayılmaz; yeterliliği örtüşme kontrolü belirler
+    try:
+        output_schema = load_model_schema(model_name)
+        return PydanticOutputParser(pydantic_object=output_schema).parse(raw_response), True
+    except Exception as e:
+        print(f"Not: Yapılandırılmış yanıt analizi başarısız, ham yanıt döndürülüyor. ({e})")
+        return parse_raw_response(raw_response), True
+
+
+def retrieve_session_documents(question, session=None, embedding_model=None, **retrieval_options):
+    """
+    Oturumda soruyla ilgili saklanan parçalar varsa onları, yoksa arama sonucunu döndürür.
+
+    Arama yapılırsa getirilen parçalar sonraki takip soruları için oturuma eklenir.
+
+    Args:
+        question: Kullanıcı sorusu
+        session: Konuşma oturumu (None ise her zaman arama yapılır)
+        embedding_model: Kullanılacak embedding modeli (None=varsayılan model)
+        **retrieval_options: retrieve_documents'a iletilecek seçenekler
+
+    Returns:
+        Belge listesi (ilgi sırasıyla)
+    """
+    if session is not None:
+        docs = session.get_cached_documents(question, embedding_model)
+        if docs is not None:
+            return docs
+
+    docs = retrieve_documents(question, embedding_model=embedding_model, **retrieval_options)
+    if session is not None:
+        session.remember_documents(docs, embedding_model)
+    return docs
+
+
+def build_context(docs):
+    """
+    Belgeleri birleştirerek LLM için bağlam metni oluşturur.
+    """
     context = ""
     for i, doc in enumerate(docs):
         source = doc.metadata.get("source", f"Belge {i + 1}")
@@ -397,65 +793,157 @@ def query(question, template_name="default", model_name="DocumentResponse", embe
     if not docs:
         context = "Hiç ilgili belge bulunamadı."
 
-    # Kaynak bilgilerini hazırla
+    return context
+
+
+def get_conversation_context(prompt_template, context, session, llm_model=None):
+    """
+    Oturumlu sorguda LLM'e verilecek bağlamı ve context önbelleği seçeneklerini belirler.
+
+    Token bütçesine göre kırpılmış konuşma geçmişi belgelerden sonra eklenir. Konuşmanın
+    aynı model ve bağlam için saklanan context token'ları varsa önceki turlar zaten bu
+    token'larda bulunduğundan geçmiş eklenmez ve yalnızca yeni soru gönderilir.
+
+    Args:
+        prompt_template: Prompt şablonu (None ise context önbelleği kullanılmaz)
+        context: build_context ile oluşturulan bağlam metni
+        session: Konuşma oturumu (None=oturumsuz, önbellek kullanılmaz)
+        llm_model: Kullanılacak Ollama modeli (None=LLM_MODEL)
+
+    Returns:
+        (bağlam, LLM'e bind edilecek seçenekler) tuple'ı
+    """
+    if session is None:
+        return context, {}
+
+    cache_prefix = get_prompt_prefix(prompt_template, context) if prompt_template is not None else None
+    if cache_prefix is None:
+        return context + session.format_history(), {}
+
+    cache_options = {"cache_prefix": cache_prefix, "conversation_id": session.session_id}
+    if has_prompt_context(llm_model or LLM_MODEL, cache_prefix, session.session_id):
+        return context, cache_options
+    return context + session.format_history(), cache_options
+
+
+def build_sources(docs):
+    """
+    Yanıtla birlikte döndürülecek kaynak bilgilerini hazırlar.
+    """
     sources = []
     for i, doc in enumerate(docs):
         source = doc.metadata.get("source", f"Belge {i + 1}")
         doc_source = f"{source}: {doc.page_content[:100]}..."
         sources.append(doc_source)
+    return sources
 
-    # Yapılandırılmış veri modelleri için özel işleme
-    if model_name in ["FilmInfo", "BookInfo", "PersonInfo"] or template_name in ["film_query", "book_query",
-                                                                                 "person_query", "structured_data"]:
-        return parse_structured_data(question, context, model_name, template_name, sources)
 
-    # LCEL sorgu zincirine yönlendir
-    prompt_template = load_prompt_template(template_name)
+def parse_raw_response(raw_response):
+    """
+    Ham LLM yanıtını basit ad-değer çifti ayrıştırıcı ile sözlüğe dönüştürür.
+    """
+    result = {}
+    current_key = None
+    current_value = []
+
+    for line in raw_response.split('\n'):
+        line = line.strip()
+        if not line:
+            continue
+
+        # Yeni bir başlık mı?
+        if line.upper() == line and len(line) > 3:
+            # Önceki değeri kaydet
+            if current_key:
+                result[current_key] = '\n'.join(current_value)
+            current_key = line.lower()
+            current_value = []
+        elif current_key:
+            current_value.append(line)
+
+    # Son değeri ekle
+    if current_key and current_value:
+        result[current_key] = '\n'.join(current_value)
+
+    # Hiç anahtar bulunamazsa, tüm metni "answer" anahtarına koy
+    if not result:
+        result = {"answer": raw_response}
+
+    return result
+
+
+def stream_query(question, template_name="default", model_name="DocumentResponse", embedding_model=None,
+                 compress=None, session=None, cascade=None, **retrieval_options):
+    """
+    Sorguyu akış modunda işler.
 
-    # LLM modelini hazırla
-    try:
-        # Yapılandırılmış yanıt modeline göre işle
-        output_schema = load_model_schema(model_name)
-        output_parser = PydanticOutputParser(pydantic_object=output_schema)
+    Önce kaynakları, ardından LLM'in ürettiği token'ları olay olarak üretir.
+    JSON biçimindeki yanıtlarda, ayrıştırılabilir hale gelen alanlar 'partial'
+    olayı ile bildirilir. Son olarak ayrıştırılmış yanıt 'result' olayı ile döner.
 
-        # LCEL zinciri
-        chain = prompt_template | get_llm() | output_parser
-        result = chain.invoke({"query": question, "context": context})
+    Args:
+        question: Kullanıcı sorusu
+        template_name: Kullanılacak prompt şablonu (default, academic, vb.)
+        model_name: Kullanılacak yanıt modeli (DocumentResponse, FilmInfo, vb.)
+        embedding_model: Kullanılacak embedding modeli (None=varsayılan model)
+        compress: Bağlam cümle düzeyinde sıkıştırılsın mı (None=config değeri)
+        session: Konuşma oturumu (app.sessions.Session, None=oturumsuz)
+        cascade: Akış modunda kullanılmaz; token'lar gönderildikten sonra model değiştirilemeyeceği
+            için yanıt her zaman LLM_MODEL ile üretilir
+        **retrieval_options: retrieve_documents'a iletilecek seçenekler (rerank, mmr, adaptive, ...)
+
+    Yields:
+        (olay_adı, veri) tuple'ları: 'sources', 'token', 'partial', 'result'
+    """
+    docs = retrieve_session_documents(question, session, embedding_model=embedding_model, **retrieval_options)
+    # Örtüşmeleri çıkar, isteğe bağlı olarak sıkıştır ve bağlamı token bütçesine sığdır
+    docs = prepare_documents(question, docs, compress=compress, embedding_model=embedding_model)
+    context = build_context(docs)
+    sources = build_sources(docs)
+
+    yield "sources", sources
+
+    structured = is_structured_request(model_name, template_name)
+    if structured:
+        print(f"INFO - Yapılandırılmış veri sorgusu algılandı: {model_name} modeli ile işleniyor...")
+        context, _ = get_conversation_context(None, context, session)
+        prompt = build_structured_prompt(question, context, model_name)
+        token_stream = get_llm().stream(prompt, format=get_response_format(model_name))
+    else:
+        prompt_template = load_prompt_template(template_name)
+        context, cache_options = get_conversation_context(prompt_template, context, session)
+        llm = get_llm().bind(**cache_options)
+        token_stream = (prompt_template | llm).stream({"query": question, "context": context})
 
-        return result, sources
-    except Exception as e:
-        print(f"Not: Yapılandırılmış yanıt analizi başarısız, ham yanıt döndürülüyor. ({e})")
+    raw_answer = ""
+    parser = StreamingJSONParser()
+    try:
+        for token in token_stream:
+            raw_answer += token
+            yield "token", token
+
+            # Alanlar tamamlandıkça bildirilir; her karakter yalnızca bir kez taranır
+            new_fields = parser.feed(token)
+            if new_fields:
+                yield "partial", new_fields
+
+            # Yapılandırılmış yanıtta nesne kapandıktan sonrasını üretmeye gerek yok
+            if structured and parser.done:
+                print("DEBUG - JSON nesnesi tamamlandı, üretim durduruldu")
+                break
+    finally:
+        token_stream.close()
+
+    if structured:
+        result = convert_structured_answer(raw_answer, question, model_name, parsed=parser.result())
+    else:
+        try:
+            output_schema = load_model_schema(model_name)
+            result = PydanticOutputParser(pydantic_object=output_schema).parse(raw_answer)
+        except Exception as e:
+            print(f"Not: Yapılandırılmış yanıt analizi başarısız, ham yanıt döndürülüyor. ({e})")
+            result = parse_raw_response(raw_answer)
 
-        # Ham LLM yanıtı al
-        chain = prompt_template | get_llm() | StrOutputParser()
-        raw_response = chain.invoke({"query": question, "context": context})
-
-        # Basit ad-değer çifti parser ile işle
-        result = {}
-        current_key = None
-        current_value = []
-
-        for line in raw_response.split('\n'):
-            line = line.strip()
-            if not line:
-                continue
-
-            # Yeni bir başlık mı?
-            if line.upper() == line and len(line) > 3:
-                # Önceki değeri kaydet
-                if current_key:
-                    result[current_key] = '\n'.join(current_value)
-                current_key = line.lower()
-                current_value = []
-            elif current_key:
-                current_value.append(line)
-
-        # Son değeri ekle
-        if current_key and current_value:
-            result[current_key] = '\n'.join(current_value)
-
-        # Hiç anahtar bulunamazsa, tüm metni "answer" anahtarına koy
-        if not result:
-            result = {"answer": raw_response}
-
-        return result, sources
\ No newline at end of file
+    if session is not None:
+        session.add_turn(question, result)
+    yield "result", result
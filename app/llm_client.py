@@ -0,0 +1,360 @@
+"""
+Ollama için paylaşılan, bağlantı havuzlu HTTP istemcisi.
+Tüm senkron LLM çağrıları tek bir requests.Session üzerinden yapılır; keep_alive
+ile model bellekte tutulur ve servis başlarken model önceden yüklenebilir.
+İstekler Ollama'ya gönderilmeden önce app.scheduler üzerinden sıraya alınır.
+
+Bir konuşma oturumunda aynı sabit önekle (talimatlar + bağlam) art arda gelen isteklerde
+Ollama'nın döndürdüğü context token'ları saklanır; takip sorularında yalnızca önekten
+sonraki kısım gönderilir ve bağlamın yeniden işlenmesi (prefill) atlanır. Token'lar
+önceki soru ve cevabı içerdiğinden oturumsuz isteklerde hiçbir zaman kullanılmaz.
+"""
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Iterator, List, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from langchain_core.language_models.llms import LLM
+from langchain_core.outputs import GenerationChunk
+
+from app.config import (LLM_MODEL, OLLAMA_BASE_URL, LLM_REQUEST_TIMEOUT, LLM_KEEP_ALIVE, LLM_POOL_SIZE,
+                        LLM_CONTEXT_REUSE, LLM_CONTEXT_REUSE_MAX_TURNS, LLM_CONTEXT_REUSE_TTL,
+                        LLM_CONTEXT_CACHE_SIZE)
+from app.metrics import record_generation, record_error, record_context_reuse
+from app.scheduler import get_scheduler
+
+_client = None
+_client_lock = threading.Lock()
+_context_cache = OrderedDict()
+_context_lock = threading.Lock()
+
+
+def get_context_key(conversation_id: str) -> str:
+    """Konuşma kimliğinden context önbelleği anahtarını üretir"""
+    return hashlib.sha1(conversation_id.encode("utf-8")).hexdigest()
+
+
+def get_prefix_hash(model: str, cache_prefix: str) -> str:
+    """Saklanan token'ların hangi model ve önekle üretildiğini belirten özet"""
+    return hashlib.sha1(f"{model}\0{cache_prefix}".encode("utf-8")).hexdigest()
+
+
+def get_reusable_entry(key: str, prefix_hash: str) -> Optional[dict]:
+    """
+    Anahtardaki kayıt aynı model ve önekle üretildiyse ve hâlâ geçerliyse döndürür.
+
+    Süresi dolan veya çok uzayan kayıt silinir; _context_lock altında çağrılmalıdır.
+    """
+    entry = _context_cache.get(key)
+    if entry is None:
+        return None
+    if entry["expires"] < time.monotonic() or entry["turns"] >= LLM_CONTEXT_REUSE_MAX_TURNS:
+        # Süresi dolan veya çok uzayan konuşma tam prompt ile yeniden başlatılır
+        del _context_cache[key]
+        return None
+    if entry["prefix"] != prefix_hash:
+        return None
+    return entry
+
+
+def has_prompt_context(model: Optional[str], cache_prefix: Optional[str], conversation_id: Optional[str]) -> bool:
+    """
+    Konuşmanın bu model ve önek için saklanmış context token'ları var mı?
+
+    Varsa önceki turlar token'larda bulunduğundan prompt'a geçmiş eklenmesine gerek yoktur.
+    """
+    if not LLM_CONTEXT_REUSE or not cache_prefix or not conversation_id:
+        return False
+    with _context_lock:
+        return get_reusable_entry(get_context_key(conversation_id),
+                                  get_prefix_hash(model or LLM_MODEL, cache_prefix)) is not None
+
+
+def resolve_prompt_context(prompt: str, model: Optional[str] = None, cache_prefix: Optional[str] = None,
+                           conversation_id: Optional[str] = None) -> tuple:
+    """
+    Konuşmanın aynı önek için context token'ları varsa prompt'u kısaltır.
+
+    Token'lar önceki soru ve cevabı içerdiğinden yalnızca aynı konuşmada (oturumda)
+    yeniden kullanılır; conversation_id verilmeyen istekler her zaman tam prompt ile gönderilir.
+
+    Args:
+        prompt: Gönderilecek tam prompt
+        model: Model adı (None=varsayılan model)
+        cache_prefix: Prompt'un sorudan önceki sabit kısmı (talimatlar + bağlam)
+        conversation_id: Konuşma (oturum) kimliği
+
+    Returns:
+        (gönderilecek_prompt, context_token'ları veya None, (anahtar, önek_özeti) veya None) tuple'ı
+    """
+    if not LLM_CONTEXT_REUSE or not cache_prefix or not conversation_id:
+        return prompt, None, None
+
+    key = (get_context_key(conversation_id), get_prefix_hash(model or LLM_MODEL, cache_prefix))
+    if not prompt.startswith(cache_prefix):
+        # Geçmişi içeren tam prompt; yanıtın token'ları sonraki turlar için saklanır
+        return prompt, None, key
+
+    with _context_lock:
+        entry = get_reusable_entry(*key)
+        if entry is None:
+            return prompt, None, key
+        _context_cache.move_to_end(key[0])
+        tokens = entry["tokens"]
+        turns = entry["turns"]
+
+    record_context_reuse()
+    print(f"INFO - Bağlam önbelleği kullanıldı: {len(tokens)} token yeniden kullanıldı "
+          f"({turns + 1}. takip sorusu)")
+    return prompt[len(cache_prefix):], tokens, key
+
+
+def store_prompt_context(key: Optional[tuple], data: dict, reused: bool):
+    """
+    Tamamlanan yanıttaki context token'larını konuşmanın sonraki soruları için saklar.
+
+    Args:
+        key: resolve_prompt_context'in döndürdüğü anahtar (None ise saklanmaz)
+        data: Ollama yanıtı veya akıştaki son (done=True) olay
+        reused: İstek önbellekteki context ile mi gönderildi
+    """
+    tokens = data.get("context")
+    if key is None or not tokens:
+        return
+    conversation_key, prefix_hash = key
+    with _context_lock:
+        previous = _context_cache.get(conversation_key)
+        turns = previous["turns"] + 1 if reused and previous is not None else 0
+        # Konuşma başına tek kayıt tutulur; farklı modelin veya önekin token'ları üzerine yazılır
+        _context_cache[conversation_key] = {
+            "tokens": tokens,
+            "prefix": prefix_hash,
+            "turns": turns,
+            "expires": time.monotonic() + LLM_CONTEXT_REUSE_TTL
+        }
+        _context_cache.move_to_end(conversation_key)
+        while len(_context_cache) > LLM_CONTEXT_CACHE_SIZE:
+            _context_cache.popitem(last=False)
+
+
+def drop_prompt_context(conversation_id: str):
+    """Konuşmanın saklanan context token'larını siler"""
+    with _context_lock:
+        _context_cache.pop(get_context_key(conversation_id), None)
+
+
+def clear_context_cache():
+    """Saklanan tüm context token'larını siler"""
+    with _context_lock:
+        _context_cache.clear()
+
+
+class OllamaClient:
+    """
+    Ollama /api/generate uç noktası için bağlantıları yeniden kullanan istemci.
+
+    Args:
+        base_url: Ollama sunucu adresi
+        keep_alive: Modelin istekten sonra bellekte kalma süresi ("30m", -1, ...)
+        timeout: İstek zaman aşımı (saniye)
+        pool_size: Havuzda tutulacak maksimum bağlantı sayısı
+    """
+
+    def __init__(self, base_url: str = OLLAMA_BASE_URL, keep_alive=LLM_KEEP_ALIVE,
+                 timeout: float = LLM_REQUEST_TIMEOUT, pool_size: int = LLM_POOL_SIZE):
+        self.base_url = base_url.rstrip("/")
+        self.keep_alive = keep_alive
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def build_payload(self, prompt: str, model: Optional[str] = None, stream: bool = False,
+                      options: Optional[dict] = None, **extra) -> dict:
+        """/api/generate istek gövdesini oluşturur"""
+        payload = {
+            "model": model or LLM_MODEL,
+            "prompt": prompt,
+            "stream": stream,
+            "keep_alive": self.keep_alive
+        }
+        if options:
+            payload["options"] = options
+        payload.update({key: value for key, value in extra.items() if value is not None})
+        return payload
+
+    def generate(self, prompt: str, model: Optional[str] = None, options: Optional[dict] = None,
+                 cache_prefix: Optional[str] = None, conversation_id: Optional[str] = None, **extra) -> dict:
+        """
+        Tam yanıtı tek istekte alır.
+
+        Args:
+            cache_prefix: conversation_id ile birlikte verilirse konuşmanın bu önek için
+                saklanan context token'ları yeniden kullanılır
+            conversation_id: Konuşma (oturum) kimliği
+
+        Returns:
+            Ollama yanıt gövdesi ('response' ve süre alanları)
+        """
+        prompt, context, key = resolve_prompt_context(prompt, model, cache_prefix, conversation_id)
+        payload = self.build_payload(prompt, model, stream=False, options=options, context=context, **extra)
+        with get_scheduler().slot():
+            try:
+                response = self.session.post(f"{self.base_url}/api/generate", json=payload, timeout=self.timeout)
+                response.raise_for_status()
+                data = response.json()
+            except Exception:
+                record_error()
+                raise
+        record_generation(data)
+        store_prompt_context(key, data, reused=context is not None)
+        return data
+
+    def stream(self, prompt: str, model: Optional[str] = None, options: Optional[dict] = None,
+               cache_prefix: Optional[str] = None, conversation_id: Optional[str] = None,
+               **extra) -> Iterator[dict]:
+        """
+        Yanıtı akış modunda alır.
+
+        Context token'ları yalnızca akış sonuna (done=True) kadar okunursa saklanır.
+
+        Args:
+            cache_prefix: conversation_id ile birlikte verilirse konuşmanın bu önek için
+                saklanan context token'ları yeniden kullanılır
+            conversation_id: Konuşma (oturum) kimliği
+
+        Yields:
+            Ollama'nın satır satır gönderdiği olaylar (son olay done=True ve süre alanlarını içerir)
+        """
+        prompt, context, key = resolve_prompt_context(prompt, model, cache_prefix, conversation_id)
+        payload = self.build_payload(prompt, model, stream=True, options=options, context=context, **extra)
+        # Çalışma hakkı akış boyunca (veya akış kapatılana kadar) tutulur
+        with get_scheduler().slot():
+            try:
+                with self.session.post(f"{self.base_url}/api/generate", json=payload, timeout=self.timeout,
+                                       stream=True) as response:
+                    response.raise_for_status()
+                    for line in response.iter_lines():
+                        if not line:
+                            continue
+                        event = json.loads(line)
+                        if event.get("error"):
+                            raise RuntimeError(event["error"])
+                        if event.get("done"):
+                            record_generation(event)
+                            store_prompt_context(key, event, reused=context is not None)
+                        yield event
+            except Exception:
+                record_error()
+                raise
+
+    def warmup(self, model: Optional[str] = None) -> float:
+        """
+        Boş bir prompt göndererek modeli belleğe yükler.
+
+        Returns:
+            Ollama'nın bildirdiği model yükleme süresi (saniye)
+        """
+        model = model or LLM_MODEL
+        start_time = time.perf_counter()
+        data = self.generate("", model=model)
+        load_seconds = data.get("load_duration", 0) / 1e9
+        print(f"INFO - LLM modeli belleğe yüklendi: {model} (yükleme {load_seconds:.2f} sn, "
+              f"toplam {time.perf_counter() - start_time:.2f} sn, keep_alive={self.keep_alive})")
+        return load_seconds
+
+    def close(self):
+        """Havuzdaki bağlantıları kapatır"""
+        self.session.close()
+
+
+def get_ollama_client() -> OllamaClient:
+    """Paylaşılan Ollama istemcisini döndür veya oluştur"""
+    global _client
+
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = OllamaClient()
+    return _client
+
+
+def reset_ollama_client():
+    """
+    Paylaşılan istemciyi bırakır; sonraki çağrıda yenisi oluşturulur.
+
+    Fork ile başlatılan işçide ana süreçten kopyalanan bağlantıların kullanılmaması için çağrılır.
+    """
+    global _client
+    _client = None
+
+
+def warmup_llm(model: Optional[str] = None) -> bool:
+    """
+    Modeli önceden belleğe yükler; hata durumunda servisi durdurmaz.
+
+    Returns:
+        Yükleme başarılıysa True
+    """
+    try:
+        get_ollama_client().warmup(model)
+        return True
+    except Exception as e:
+        print(f"⚠️ LLM ön yüklemesi başarısız, model ilk sorguda yüklenecek: {e}")
+        return False
+
+
+class PooledOllama(LLM):
+    """
+    Paylaşılan OllamaClient'ı kullanan LangChain LLM sarmalayıcısı.
+
+    langchain_community Ollama sınıfının yerine geçer; zincirlerde (prompt | llm)
+    aynı şekilde kullanılır ancak her çağrı için yeni bağlantı açmaz. Çağrıya
+    format=<JSON şeması> verilirse çıktı Ollama tarafından bu şemaya kısıtlanır;
+    cache_prefix=<önek> ve conversation_id=<oturum> verilirse konuşmanın aynı önek için
+    context token'ları yeniden kullanılır (zincirlerde llm.bind(...) ile).
+    """
+
+    model: str = LLM_MODEL
+    temperature: Optional[float] = None
+
+    @property
+    def _llm_type(self) -> str:
+        return "pooled-ollama"
+
+    @property
+    def _identifying_params(self) -> dict:
+        return {"model": self.model, "temperature": self.temperature}
+
+    def _options(self, stop: Optional[List[str]]) -> dict:
+        options = {}
+        if self.temperature is not None:
+            options["temperature"] = self.temperature
+        if stop:
+            options["stop"] = stop
+        return options
+
+    def _call(self, prompt: str, stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> str:
+        data = get_ollama_client().generate(prompt, model=self.model, options=self._options(stop),
+                                            cache_prefix=kwargs.get("cache_prefix"),
+                                            conversation_id=kwargs.get("conversation_id"), format=kwargs.get("format"))
+        return data.get("response", "")
+
+    def _stream(self, prompt: str, stop: Optional[List[str]] = None, run_manager=None,
+                **kwargs: Any) -> Iterator[GenerationChunk]:
+        for event in get_ollama_client().stream(prompt, model=self.model, options=self._options(stop),
+                                                cache_prefix=kwargs.get("cache_prefix"),
+                                                conversation_id=kwargs.get("conversation_id"),
+                                                format=kwargs.get("format")):
+            text = event.get("response", "")
+            if not text:
+                continue
+            chunk = GenerationChunk(text=text)
+            if run_manager:
+                run_manager.on_llm_new_token(text, chunk=chunk)
+            yield chunk
@@ -2,12 +2,11 @@
 """
 Geliştirilmiş LLM işlemleri ve JSON yanıt ayrıştırma
 """
-import re
-import json
 from typing import Dict, Any, List, Tuple, Optional, Union
-from pydantic import create_model, Field, ValidationError
 
-from langchain_community.llms import Ollama
+from app.llm_client import PooledOllama
+from app.json_stream import parse_json_object, collect_json
+from app.schema_types import compile_model_schemas
 from app.config import LLM_MODEL
 
 
@@ -15,110 +14,20 @@ def get_llm(temperature=0.2):
     """
     LLM modelini döndürür.
     """
-    return Ollama(model=LLM_MODEL, temperature=temperature)
-
-
-def extract_json_from_text(text: str) -> Optional[str]:
-    """
-    Metin içindeki JSON bloğunu ayıklar.
-    """
-    # JSON bloğunu kod bloğu içinden çıkartmaya çalış
-    code_block_pattern = r"```(?:json)?\s*([\s\S]*?)```"
-    matches = re.findall(code_block_pattern, text)
-
-    if matches:
-        return matches[0].strip()
-
-    # Kod bloğu yoksa { } arasındaki metni bul
-    json_pattern = r"\{[\s\S]*\}"
-    matches = re.findall(json_pattern, text)
-
-    if matches:
-        return matches[0].strip()
-
-    return None
-
-
-def clean_json_string(json_str: str) -> str:
-    """
-    JSON dizesindeki yaygın sorunları temizler.
-    """
-    # Başlangıç ve sondaki fazla karakterleri temizle
-    json_str = json_str.strip()
-
-    # Başlangıçtaki ve sondaki gereksiz açıklamaları kaldır
-    if json_str.startswith('```json'):
-        json_str = json_str[len('```json'):].strip()
-    if json_str.startswith('```'):
-        json_str = json_str[len('```'):].strip()
-    if json_str.endswith('```'):
-        json_str = json_str[:-len('```')].strip()
-
-    # Ek açıklamaları veya çıktıları temizle
-    if "}" in json_str:
-        json_str = json_str[:json_str.rindex("}") + 1]
-
-    # JSON anahtarlarının etrafındaki tırnak işaretlerini düzelt
-    # Örn: {key: "value"} -> {"key": "value"}
-    json_str = re.sub(r'([{,])\s*([a-zA-Z0-9_]+)\s*:', r'\1"\2":', json_str)
-
-    return json_str
+    return PooledOllama(model=LLM_MODEL, temperature=temperature)
 
 
 def parse_json_safely(json_str: str) -> Optional[Dict[str, Any]]:
     """
-    JSON dizesini güvenli bir şekilde ayrıştırır, çeşitli düzeltmeler dener.
+    JSON dizesini güvenli bir şekilde ayrıştırır.
+
+    Kod bloğu işaretleri, açıklamalar, tırnaksız anahtarlar ve sondaki virgüller
+    artımlı ayrıştırıcı (app.json_stream) tarafından tek geçişte tolere edilir.
     """
     if not json_str:
         return None
 
-    # İlk deneme: Orijinal metni ayrıştır
-    try:
-        return json.loads(json_str)
-    except json.JSONDecodeError:
-        pass
-
-    # İkinci deneme: Metni temizle ve tekrar dene
-    try:
-        cleaned_json = clean_json_string(json_str)
-        return json.loads(cleaned_json)
-    except json.JSONDecodeError:
-        pass
-
-    # Üçüncü deneme: Her satırı ayrı ayrı kontrol et, fazla satırları temizle
-    try:
-        lines = json_str.split('\n')
-        filtered_lines = []
-        json_started = False
-        brace_count = 0
-
-        for line in lines:
-            if '{' in line:
-                json_started = True
-                brace_count += line.count('{')
-
-            if json_started:
-                filtered_lines.append(line)
-                brace_count += line.count('{') - line.count('}')
-
-            if json_started and brace_count == 0:
-                break
-
-        cleaned_json = '\n'.join(filtered_lines)
-        return json.loads(cleaned_json)
-    except (json.JSONDecodeError, IndexError):
-        pass
-
-    # Son çare: Regex ile JSON nesnesi ayıkla
-    try:
-        pattern = r'\{(?:[^{}]|(?R))*\}'
-        matches = re.findall(pattern, json_str)
-        if matches:
-            return json.loads(matches[0])
-    except (json.JSONDecodeError, re.error):
-        pass
-
-    return None
+    return parse_json_object(json_str)
 
 
 def parse_llm_response(response: str, expected_schema: Dict[str, Any]) -> Dict[str, Any]:
@@ -126,8 +35,7 @@ def parse_llm_response(response: str, expected_schema: Dict[str, Any]) -> Dict[s
     LLM yanıtını ayrıştırır ve beklenen şemaya uygun bir sözlük döndürür.
     """
     # JSON'ı ayıkla ve ayrıştır
-    json_str = extract_json_from_text(response)
-    parsed_data = parse_json_safely(json_str)
+    parsed_data = parse_json_safely(response)
 
     if not parsed_data:
         # Ayrıştırma başarısız oldu, varsayılan değerlerle doldur
@@ -152,48 +60,105 @@ def parse_llm_response(response: str, expected_schema: Dict[str, Any]) -> Dict[s
     return result
 
 
+# Yapılandırılmış veri modelleri (app.schema_types tip dili). Modeller ilk kullanımda bir kez
+# derlenir; istek başına create_model çağrılmaz.
+ENHANCED_MODEL_SCHEMAS = {
+    "FilmInfo": {
+        "fields": {
+            "title": {"type": "str", "description": "Film başlığı"},
+            "director": {"type": "str", "description": "Film yönetmeni"},
+            "release_year": {"type": "str", "description": "Filmin yayın yılı"},
+            "plot_summary": {"type": "str", "description": "Film özeti"},
+            "cast": {"type": "list[str]", "description": "Oyuncular listesi"},
+            "genre": {"type": "list[str]", "description": "Film türleri"},
+            "imdb_rating": {"type": "str", "description": "IMDb puanı"}
+        }
+    },
+    "BookInfo": {
+        "fields": {
+            "title": {"type": "str", "description": "Kitap başlığı"},
+            "author": {"type": "str", "description": "Kitap yazarı"},
+            "publication_year": {"type": "str", "description": "Yayın yılı"},
+            "summary": {"type": "str", "description": "Kitap özeti"},
+            "genre": {"type": "list[str]", "description": "Kitap türleri"},
+            "page_count": {"type": "str", "description": "Sayfa sayısı"}
+        }
+    },
+    "PersonInfo": {
+        "fields": {
+            "name": {"type": "str", "description": "Kişinin adı"},
+            "birth_date": {"type": "str", "description": "Doğum tarihi"},
+            "death_date": {"type": "str", "description": "Ölüm tarihi (hayattaysa boş)"},
+            "nationality": {"type": "str", "description": "Milliyeti"},
+            "occupation": {"type": "list[str]", "description": "Meslek(ler)i"},
+            "achievements": {"type": "list[str]", "description": "Önemli başarıları"},
+            "biography": {"type": "str", "description": "Kısa biyografi"}
+        }
+    },
+    "GeneralInfo": {
+        "fields": {
+            "title": {"type": "str", "description": "Başlık"},
+            "summary": {"type": "str", "description": "Özet"},
+            "key_points": {"type": "list[str]", "description": "Anahtar noktalar"}
+        }
+    }
+}
+
+_models = None
+_response_formats = {}
+
+
+def get_model(model_name: str):
+    """
+    Derlenmiş Pydantic modelini döndürür; tüm modeller ilk çağrıda bir kez derlenir.
+
+    Args:
+        model_name: ENHANCED_MODEL_SCHEMAS içindeki model adı
+
+    Returns:
+        Pydantic model sınıfı
+    """
+    global _models
+    if _models is None:
+        _models = compile_model_schemas(ENHANCED_MODEL_SCHEMAS)["models"]
+    return _models[model_name]
+
+
+def get_response_format(model_name: str) -> Dict[str, Any]:
+    """Ollama'ya format olarak gönderilecek JSON şemasını döndürür (model başına bir kez üretilir)"""
+    if model_name not in _response_formats:
+        _response_formats[model_name] = get_model(model_name).model_json_schema()
+    return _response_formats[model_name]
+
+
+def get_expected_schema(model_name: str) -> Dict[str, str]:
+    """parse_llm_response için alan -> "list"/"str" eşlemesini model tanımından çıkarır"""
+    fields = ENHANCED_MODEL_SCHEMAS[model_name]["fields"]
+    return {
+        field: "list" if field_props["type"].split("[")[0].lower() == "list" else "str"
+        for field, field_props in fields.items()
+    }
+
+
 def create_film_info_model():
     """
-    Film bilgisi için Pydantic modeli oluşturur.
+    Film bilgisi için Pydantic modelini döndürür.
     """
-    return create_model("FilmInfo",
-                        title=(str, Field(description="Film başlığı")),
-                        director=(str, Field(description="Film yönetmeni")),
-                        release_year=(str, Field(description="Filmin yayın yılı")),
-                        plot_summary=(str, Field(description="Film özeti")),
-                        cast=(List[str], Field(description="Oyuncular listesi")),
-                        genre=(List[str], Field(description="Film türleri")),
-                        imdb_rating=(str, Field(description="IMDb puanı"))
-                        )
+    return get_model("FilmInfo")
 
 
 def create_book_info_model():
     """
-    Kitap bilgisi için Pydantic modeli oluşturur.
+    Kitap bilgisi için Pydantic modelini döndürür.
     """
-    return create_model("BookInfo",
-                        title=(str, Field(description="Kitap başlığı")),
-                        author=(str, Field(description="Kitap yazarı")),
-                        publication_year=(str, Field(description="Yayın yılı")),
-                        summary=(str, Field(description="Kitap özeti")),
-                        genre=(List[str], Field(description="Kitap türleri")),
-                        page_count=(str, Field(description="Sayfa sayısı"))
-                        )
+    return get_model("BookInfo")
 
 
 def create_person_info_model():
     """
-    Kişi bilgisi için Pydantic modeli oluşturur.
+    Kişi bilgisi için Pydantic modelini döndürür.
     """
-    return create_model("PersonInfo",
-                        name=(str, Field(description="Kişinin adı")),
-                        birth_date=(str, Field(description="Doğum tarihi")),
-                        death_date=(str, Field(description="Ölüm tarihi (hayattaysa boş)")),
-                        nationality=(str, Field(description="Milliyeti")),
-                        occupation=(List[str], Field(description="Meslek(ler)i")),
-                        achievements=(List[str], Field(description="Önemli başarıları")),
-                        biography=(str, Field(description="Kısa biyografi"))
-                        )
+    return get_model("PersonInfo")
 
 
 def get_model_for_category(category: str):
@@ -208,11 +173,7 @@ def get_model_for_category(category: str):
         return create_person_info_model()
     else:
         # Varsayılan genel model
-        return create_model("GeneralInfo",
-                            title=(str, Field(description="Başlık")),
-                            summary=(str, Field(description="Özet")),
-                            key_points=(List[str], Field(description="Anahtar noktalar"))
-                            )
+        return get_model("GeneralInfo")
 
 
 def get_prompt_for_model(model_name: str, query: str, context: str) -> str:
@@ -322,48 +283,17 @@ def process_structured_query(query: str, context: str, model_name: str) -> Dict[
     # Prompt oluştur
     prompt = get_prompt_for_model(model_name, query, context)
 
-    # LLM'i çağır
-    llm = get_llm()
-    raw_answer = llm(prompt)
+    if model_name not in ENHANCED_MODEL_SCHEMAS:
+        model_name = "GeneralInfo"
+
+    # Çıktıyı modelin JSON şemasına kısıtla; LLM akış modunda çağrılır ve
+    # JSON nesnesi kapandığında üretim durdurulur
+    raw_answer, _ = collect_json(get_llm().stream(prompt, format=get_response_format(model_name)))
 
     print(f"DEBUG - Yapılandırılmış veri LLM yanıtı: {raw_answer[:100]}...")
 
     # Model şemasını belirle
-    if model_name == "FilmInfo":
-        schema = {
-            "title": "str",
-            "director": "str",
-            "release_year": "str",
-            "plot_summary": "str",
-            "cast": "list",
-            "genre": "list",
-            "imdb_rating": "str"
-        }
-    elif model_name == "BookInfo":
-        schema = {
-            "title": "str",
-            "author": "str",
-            "publication_year": "str",
-            "summary": "str",
-            "genre": "list",
-            "page_count": "str"
-        }
-    elif model_name == "PersonInfo":
-        schema = {
-            "name": "str",
-            "birth_date": "str",
-            "death_date": "str",
-            "nationality": "str",
-            "occupation": "list",
-            "achievements": "list",
-            "biography": "str"
-        }
-    else:
-        schema = {
-            "title": "str",
-            "summary": "str",
-            "key_points": "list"
-        }
+    schema = get_expected_schema(model_name)
 
     try:
         # Yanıtı ayrıştır
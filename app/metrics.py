@@ -0,0 +1,175 @@
+"""
+LLM çağrıları için süre metrikleri.
+Ollama yanıtlarındaki model yükleme, prompt işleme ve üretim sürelerini toplar;
+böylece ilk sorgudaki yükleme maliyeti üretim süresinden ayrı izlenebilir.
+Zamanlayıcı kuyruğundaki bekleme süreleri öncelik bazında, veritabanı havuzundan
+bağlantı alırken beklenen süreler ise ayrıca tutulur.
+"""
+import threading
+
+NANOSECONDS = 1e9
+
+_lock = threading.Lock()
+_metrics = {
+    "requests": 0,
+    "errors": 0,
+    "cold_starts": 0,
+    "load_seconds": 0.0,
+    "prompt_eval_seconds": 0.0,
+    "eval_seconds": 0.0,
+    "total_seconds": 0.0,
+    "prompt_tokens": 0,
+    "generated_tokens": 0,
+    "context_reuses": 0,
+    "coalesced_requests": 0,
+    "cascade": {},
+    "queue": {},
+    "db_pool": {}
+}
+
+
+def record_generation(response: dict):
+    """
+    Ollama /api/generate yanıtındaki süre alanlarını metriklere ekler.
+
+    Args:
+        response: Tamamlanmış (done=True) yanıt veya akıştaki son olay
+    """
+    load_seconds = response.get("load_duration", 0) / NANOSECONDS
+    with _lock:
+        _metrics["requests"] += 1
+        # Model bellekteyken load_duration milisaniyeler mertebesindedir
+        if load_seconds >= 1.0:
+            _metrics["cold_starts"] += 1
+        _metrics["load_seconds"] += load_seconds
+        _metrics["prompt_eval_seconds"] += response.get("prompt_eval_duration", 0) / NANOSECONDS
+        _metrics["eval_seconds"] += response.get("eval_duration", 0) / NANOSECONDS
+        _metrics["total_seconds"] += response.get("total_duration", 0) / NANOSECONDS
+        _metrics["prompt_tokens"] += response.get("prompt_eval_count", 0)
+        _metrics["generated_tokens"] += response.get("eval_count", 0)
+
+
+def record_error():
+    """Başarısız LLM isteğini metriklere ekler"""
+    with _lock:
+        _metrics["errors"] += 1
+
+
+def record_context_reuse():
+    """Önbellekteki context token'larıyla gönderilen isteği metriklere ekler"""
+    with _lock:
+        _metrics["context_reuses"] += 1
+
+
+def record_coalesced():
+    """Devam eden aynı sorgunun sonucunu bekleyen isteği metriklere ekler"""
+    with _lock:
+        _metrics["coalesced_requests"] += 1
+
+
+def record_cascade(reason=None):
+    """
+    Kademeli yanıtlamanın sonucunu ekler.
+
+    Args:
+        reason: Büyük modele geçme nedeni (None ise küçük modelin yanıtı kullanıldı)
+    """
+    with _lock:
+        cascade = _metrics["cascade"]
+        cascade["requests"] = cascade.get("requests", 0) + 1
+        if reason is not None:
+            cascade["escalated"] = cascade.get("escalated", 0) + 1
+            reasons = cascade.setdefault("reasons", {})
+            reasons[reason] = reasons.get(reason, 0) + 1
+
+
+def get_queue_lane(lane: str) -> dict:
+    """Öncelik şeridinin kuyruk metriklerini döndürür (yoksa oluşturur); kilit altında çağrılmalıdır"""
+    return _metrics["queue"].setdefault(lane, {"started": 0, "rejected": 0, "wait_seconds": 0.0,
+                                               "max_wait_seconds": 0.0})
+
+
+def record_queue_wait(lane: str, wait_seconds: float):
+    """Zamanlayıcıda bekleyip başlatılan isteğin bekleme süresini ekler"""
+    with _lock:
+        queue = get_queue_lane(lane)
+        queue["started"] += 1
+        queue["wait_seconds"] += wait_seconds
+        queue["max_wait_seconds"] = max(queue["max_wait_seconds"], wait_seconds)
+
+
+def record_queue_rejection(lane: str):
+    """Son başlama zamanına yetişemediği için reddedilen isteği ekler"""
+    with _lock:
+        get_queue_lane(lane)["rejected"] += 1
+
+
+def get_db_pool_stats() -> dict:
+    """Veritabanı havuzu metriklerini döndürür (yoksa oluşturur); kilit altında çağrılmalıdır"""
+    db_pool = _metrics["db_pool"]
+    for key in ("acquired", "timeouts", "health_check_failures", "expired"):
+        db_pool.setdefault(key, 0)
+    for key in ("wait_seconds", "max_wait_seconds"):
+        db_pool.setdefault(key, 0.0)
+    return db_pool
+
+
+def record_db_pool_wait(wait_seconds: float):
+    """Havuzdan bağlantı alınana kadar geçen süreyi ekler"""
+    with _lock:
+        db_pool = get_db_pool_stats()
+        db_pool["acquired"] += 1
+        db_pool["wait_seconds"] += wait_seconds
+        db_pool["max_wait_seconds"] = max(db_pool["max_wait_seconds"], wait_seconds)
+
+
+def record_db_pool_event(event: str):
+    """
+    Havuz olayını sayar.
+
+    Args:
+        event: "timeouts", "health_check_failures" veya "expired"
+    """
+    with _lock:
+        get_db_pool_stats()[event] += 1
+
+
+def get_metrics() -> dict:
+    """
+    Toplanan metriklerin bir kopyasını türetilmiş değerlerle birlikte döndürür.
+
+    Returns:
+        Sayaçlar, toplam süreler (saniye), ortalama yükleme/üretim süresi, token/saniye,
+        öncelik bazında kuyruk bekleme metrikleri, veritabanı havuzu bekleme süreleri ve
+        kademeli yanıtlamada büyük modele geçme oranı
+    """
+    with _lock:
+        metrics = dict(_metrics)
+        metrics["queue"] = {lane: dict(queue) for lane, queue in _metrics["queue"].items()}
+        metrics["cascade"] = dict(_metrics["cascade"], reasons=dict(_metrics["cascade"].get("reasons", {})))
+        metrics["db_pool"] = dict(get_db_pool_stats())
+
+    for queue in metrics["queue"].values():
+        queue["avg_wait_seconds"] = queue["wait_seconds"] / queue["started"] if queue["started"] else 0.0
+
+    db_pool = metrics["db_pool"]
+    db_pool["avg_wait_seconds"] = db_pool["wait_seconds"] / db_pool["acquired"] if db_pool["acquired"] else 0.0
+
+    cascade = metrics["cascade"]
+    cascade.setdefault("requests", 0)
+    cascade.setdefault("escalated", 0)
+    cascade["escalation_rate"] = cascade["escalated"] / cascade["requests"] if cascade["requests"] else 0.0
+
+    requests = metrics["requests"]
+    metrics["avg_load_seconds"] = metrics["load_seconds"] / requests if requests else 0.0
+    metrics["avg_eval_seconds"] = metrics["eval_seconds"] / requests if requests else 0.0
+    metrics["tokens_per_second"] = (metrics["generated_tokens"] / metrics["eval_seconds"]
+                                    if metrics["eval_seconds"] else 0.0)
+    return metrics
+
+
+def reset_metrics():
+    """Tüm metrikleri sıfırlar"""
+    with _lock:
+        for key, value in _metrics.items():
+            _metrics[key] = type(value)()
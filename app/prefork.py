@@ -0,0 +1,296 @@
+"""
+Çok işçili (prefork) API sunucusu.
+Embedding modeli, tokenizer, şablonlar, şemalar ve kategori merkezleri ana süreçte
+bir kez yüklenir; işçiler fork ile başlatıldığından bu bellek sayfalarını
+copy-on-write olarak paylaşır ve model belleği işçi sayısıyla çoğalmaz.
+
+Her işçi kendi veritabanı havuzunu, Ollama bağlantılarını ve LLM zamanlayıcısını
+oluşturur. Ana süreç dinleme soketini açar, kapanan işçileri yeniden başlatır ve
+sinyalleri yönetir:
+    SIGTERM/SIGINT: İşçiler devam eden istekleri bitirip kapanır
+    SIGHUP: Değişen tanımlar (şablonlar, şemalar, kategori merkezleri) yeniden
+            yüklenir, yeni işçiler başlatılır, eski işçiler devam eden isteklerini
+            bitirip kapanır. Embedding modeli, tokenizer ve cross-encoder bellekteki
+            haliyle kalır; model değişiklikleri için sunucuyu yeniden başlatın.
+"""
+import gc
+import os
+import time
+import signal
+import socket
+import traceback
+
+import uvicorn
+
+from app.config import (EMBEDDING_MODEL, RERANK_ENABLED, LLM_WARMUP_ON_START, LLM_CASCADE_ENABLED, LLM_SMALL_MODEL,
+                        PROMPT_TEMPLATE_FILE, MODEL_SCHEMA_FILE, WORKER_GRACEFUL_TIMEOUT, WORKER_RESTART_DELAY)
+
+try:
+    import torch
+
+    has_torch = True
+except ImportError:
+    has_torch = False
+
+
+def preload_shared_resources():
+    """
+    Modelleri ve tanımları ana süreçte belleğe yükler.
+
+    Modeller burada çalıştırılmaz (encode yapılmaz); böylece fork öncesinde
+    iş parçacığı havuzları başlatılmamış olur.
+    """
+    from app.embedding import get_embedding_model
+    from app.context import get_tokenizer
+    from app.categorizer import get_document_matcher, get_query_matcher
+    from app.category_centroids import load_category_centroids
+    from app.registry import load_definitions
+    from app.llm import (load_prompt_template, get_response_format, DEFAULT_PROMPT_TEMPLATES, DEFAULT_MODEL_SCHEMAS,
+                         STRUCTURED_MODEL_SCHEMAS)
+
+    start_time = time.perf_counter()
+    get_embedding_model(EMBEDDING_MODEL)
+    get_tokenizer()
+    get_document_matcher()
+    get_query_matcher()
+    load_category_centroids()
+    if RERANK_ENABLED:
+        from app.reranker import get_cross_encoder
+        get_cross_encoder()
+
+    for template_name in load_definitions(PROMPT_TEMPLATE_FILE, DEFAULT_PROMPT_TEMPLATES):
+        load_prompt_template(template_name)
+    schema_names = list(load_definitions(MODEL_SCHEMA_FILE, DEFAULT_MODEL_SCHEMAS)) + list(STRUCTURED_MODEL_SCHEMAS)
+    for schema_name in schema_names:
+        try:
+            get_response_format(schema_name)
+        except ValueError as e:
+            print(f"UYARI - {e}")
+
+    print(f"INFO - Paylaşılan kaynaklar ana süreçte yüklendi ({time.perf_counter() - start_time:.2f} sn)")
+
+
+def close_parent_connections():
+    """Ana süreçteki Ollama ve veritabanı bağlantılarını fork öncesinde kapatır"""
+    from app.llm_client import get_ollama_client, reset_ollama_client
+    from app.db import close_db_pool
+
+    get_ollama_client().close()
+    reset_ollama_client()
+    close_db_pool()
+
+
+def warmup_in_parent():
+    """LLM modelini bir kez belleğe yükler ve ana süreçteki bağlantıları kapatır"""
+    from app.llm_client import warmup_llm
+
+    if LLM_WARMUP_ON_START:
+        warmup_llm()
+        if LLM_CASCADE_ENABLED:
+            warmup_llm(LLM_SMALL_MODEL)
+    close_parent_connections()
+
+
+def reset_process_state():
+    """Fork sonrası işçide ana süreçten kopyalanan bağlantıları ve süreç içi durumu sıfırlar"""
+    from app.llm_client import reset_ollama_client
+    from app.async_pipeline import reset_async_resources
+    from app.scheduler import reset_scheduler
+    from app.metrics import reset_metrics
+    from app.db import reset_db_pool
+
+    reset_ollama_client()
+    reset_db_pool()
+    reset_async_resources()
+    reset_scheduler()
+    reset_metrics()
+
+
+def limit_worker_threads(workers: int):
+    """İşçiler çekirdekleri paylaşsın diye her işçinin torch iş parçacığı sayısını sınırlar"""
+    if has_torch:
+        torch.set_num_threads(max(1, (os.cpu_count() or 1) // workers))
+
+
+def create_listen_socket(host: str, port: int) -> socket.socket:
+    """Tüm işçilerin paylaşacağı dinleme soketini açar"""
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+class PreforkServer:
+    """
+    Ana süreç: soketi açar, işçileri fork ile başlatır ve izler.
+
+    Args:
+        host: Dinlenecek adres
+        port: Dinlenecek port
+        workers: İşçi süreç sayısı
+    """
+
+    def __init__(self, host: str, port: int, workers: int):
+        self.host = host
+        self.port = port
+        self.worker_count = workers
+        self.workers = {}
+        self.generation = 0
+        self.sock = None
+        self.stop_requested = False
+        self.reload_requested = False
+
+    def spawn_worker(self):
+        """Yeni bir işçi başlatır"""
+        pid = os.fork()
+        if pid == 0:
+            exit_code = 0
+            try:
+                self.run_worker()
+            except BaseException:
+                traceback.print_exc()
+                exit_code = 1
+            finally:
+                os._exit(exit_code)
+        self.workers[pid] = self.generation
+
+    def run_worker(self):
+        """İşçi sürecinde uvicorn'u paylaşılan soket üzerinde çalıştırır"""
+        for sig in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP):
+            signal.signal(sig, signal.SIG_DFL)
+        reset_process_state()
+        limit_worker_threads(self.worker_count)
+
+        from app.api import create_app
+
+        # Oturumlar işçi belleğinde tutulur; istekler farklı işçilere düşeceği için kapatılır
+        config = uvicorn.Config(create_app(warmup=False, sessions=False),
+                                timeout_graceful_shutdown=WORKER_GRACEFUL_TIMEOUT)
+        uvicorn.Server(config).run(sockets=[self.sock])
+
+    def spawn_generation(self):
+        """Geçerli nesil için eksik işçileri başlatır"""
+        running = sum(1 for generation in self.workers.values() if generation == self.generation)
+        for _ in range(self.worker_count - running):
+            self.spawn_worker()
+
+    def signal_workers(self, sig: int, generation=None):
+        """İşçilere (verilirse yalnızca belirli bir nesle) sinyal gönderir"""
+        for pid, worker_generation in list(self.workers.items()):
+            if generation is None or worker_generation == generation:
+                try:
+                    os.kill(pid, sig)
+                except ProcessLookupError:
+                    self.workers.pop(pid, None)
+
+    def reap_workers(self) -> int:
+        """
+        Kapanmış işçileri toplar.
+
+        Returns:
+            Geçerli nesilden beklenmedik şekilde kapanan işçi sayısı
+        """
+        crashed = 0
+        while self.workers:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                self.workers.clear()
+                break
+            if pid == 0:
+                break
+            generation = self.workers.pop(pid, None)
+            if generation == self.generation and not self.stop_requested:
+                crashed += 1
+                print(f"⚠️ İşçi {pid} beklenmedik şekilde kapandı (durum {status}), yeniden başlatılıyor")
+        return crashed
+
+    def reload(self):
+        """
+        Değişen tanımları yeniden yükler, yeni nesli başlatır ve eski işçileri kapatır.
+
+        preload_shared_resources() modelleri önbellekten döndürür; yalnızca dosya zamanı
+        değişen tanımlar yeniden derlenir.
+        """
+        print("INFO - Yeniden yükleme: yeni işçiler başlatılıyor, eski işçiler istekleri bitirince kapanacak")
+        gc.unfreeze()
+        preload_shared_resources()
+        close_parent_connections()
+        gc.freeze()
+
+        previous_generation = self.generation
+        self.generation += 1
+        self.spawn_generation()
+        self.signal_workers(signal.SIGTERM, previous_generation)
+
+    def stop(self):
+        """İşçileri kapatır; süre içinde kapanmayanları sonlandırır"""
+        print(f"INFO - Kapatılıyor: {len(self.workers)} işçi devam eden istekleri bitiriyor")
+        self.signal_workers(signal.SIGTERM)
+        deadline = time.monotonic() + WORKER_GRACEFUL_TIMEOUT + 5
+        while self.workers and time.monotonic() < deadline:
+            self.reap_workers()
+            time.sleep(0.1)
+        if self.workers:
+            print(f"⚠️ {len(self.workers)} işçi zamanında kapanmadı, sonlandırılıyor")
+            self.signal_workers(signal.SIGKILL)
+            while self.workers:
+                self.reap_workers()
+                time.sleep(0.1)
+
+    def handle_stop(self, sig, frame):
+        self.stop_requested = True
+
+    def handle_reload(self, sig, frame):
+        self.reload_requested = True
+
+    def run(self):
+        """Kaynakları yükler, işçileri başlatır ve kapanana kadar izler"""
+        # Hızlı tokenizer'ın fork sonrası kilitlenmemesi için
+        os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+        preload_shared_resources()
+        warmup_in_parent()
+        # Yüklenen nesneler çöp toplayıcının taramasından çıkarılır; aksi halde
+        # işçilerde referans sayaçları/GC başlıkları yazılıp sayfalar kopyalanır
+        gc.freeze()
+
+        self.sock = create_listen_socket(self.host, self.port)
+        signal.signal(signal.SIGTERM, self.handle_stop)
+        signal.signal(signal.SIGINT, self.handle_stop)
+        signal.signal(signal.SIGHUP, self.handle_reload)
+
+        print(f"INFO - Ana süreç {os.getpid()}: {self.worker_count} işçi http://{self.host}:{self.port} "
+              f"adresinde başlatılıyor")
+        print("UYARI - Çok işçili modda konuşma oturumları kapalı: /sessions ve session_id istekleri 501 "
+              "döndürür (oturum kullanılacaksa servisi tek işçiyle başlatın)")
+        self.spawn_generation()
+        try:
+            while not self.stop_requested:
+                if self.reload_requested:
+                    self.reload_requested = False
+                    self.reload()
+                if self.reap_workers():
+                    time.sleep(WORKER_RESTART_DELAY)
+                    self.spawn_generation()
+                time.sleep(0.5)
+        finally:
+            self.stop()
+            self.sock.close()
+
+
+def run_prefork(host: str, port: int, workers: int):
+    """
+    API'yi ortak modelleri paylaşan birden fazla işçi süreçle çalıştırır.
+
+    fork desteklenmeyen platformlarda tek süreçle çalışır.
+    """
+    if not hasattr(os, "fork"):
+        print("UYARI - Bu platform fork desteklemiyor, API tek süreçle başlatılıyor")
+        from app.api import create_app
+        uvicorn.run(create_app(), host=host, port=port)
+        return
+
+    PreforkServer(host, port, workers).run()
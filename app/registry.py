@@ -0,0 +1,114 @@
+"""
+Şablon ve şema dosyaları için önbellekli kayıt.
+prompts.json ve models.json bir kez ayrıştırılır; derlenmiş ChatPromptTemplate nesneleri
+ve oluşturulan model sınıfları dosyanın değiştirilme zamanı değişene kadar yeniden kullanılır.
+Böylece 'cli.py edit-prompt' ile yapılan düzenlemeler yeniden başlatmadan uygulanır.
+"""
+import os
+import json
+import threading
+from typing import Callable, Optional
+
+_files = {}
+_lock = threading.RLock()
+
+
+def get_file_signature(path: str) -> tuple:
+    """Dosyanın değişip değişmediğini anlamak için (mtime_ns, boyut) döndürür"""
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def load_definitions(path: str, default: Optional[dict] = None) -> dict:
+    """
+    JSON tanım dosyasını yükler; dosya değişmediyse önbellekteki içeriği döndürür.
+
+    Dosya yoksa ve default verilmişse varsayılan içerikle oluşturulur.
+    Döndürülen sözlük paylaşılır, değiştirilmemelidir.
+
+    Args:
+        path: Tanım dosyasının yolu
+        default: Dosya yoksa yazılacak varsayılan içerik
+
+    Returns:
+        Ayrıştırılmış dosya içeriği
+    """
+    with _lock:
+        if not os.path.exists(path) and default is not None:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(default, f, indent=2, ensure_ascii=False)
+
+        signature = get_file_signature(path)
+        entry = _files.get(path)
+        if entry is not None and entry["signature"] == signature:
+            return entry["definitions"]
+
+        with open(path, 'r', encoding='utf-8') as f:
+            definitions = json.load(f)
+
+        if entry is not None:
+            print(f"INFO - Tanım dosyası değişmiş, yeniden yüklendi: {path}")
+        _files[path] = {
+            "signature": signature,
+            "definitions": definitions,
+            "compiled": {}
+        }
+        return definitions
+
+
+def get_compiled(path: str, name: str, compiler: Callable[[str, dict], object],
+                 default: Optional[dict] = None, kind: str = "Tanım"):
+    """
+    Dosyadaki bir tanımın derlenmiş halini döndürür; gerekirse derleyip önbelleğe alır.
+
+    Args:
+        path: Tanım dosyasının yolu
+        name: Tanımın adı (şablon veya şema adı)
+        compiler: (ad, tanım) alıp derlenmiş nesneyi döndüren fonksiyon
+        default: Dosya yoksa yazılacak varsayılan içerik
+        kind: Hata mesajında kullanılacak tanım türü
+
+    Returns:
+        Derlenmiş nesne
+    """
+    with _lock:
+        definitions = load_definitions(path, default)
+        if name not in definitions:
+            raise ValueError(f"{kind} '{name}' bulunamadı")
+
+        compiled = _files[path]["compiled"]
+        key = (compiler.__name__, name)
+        if key not in compiled:
+            compiled[key] = compiler(name, definitions[name])
+        return compiled[key]
+
+
+def get_compiled_file(path: str, compiler: Callable[[dict], object], default: Optional[dict] = None):
+    """
+    Dosyadaki tüm tanımları birlikte derler ve sonucu dosya değişene kadar önbellekte tutar.
+
+    Tanımlar birbirine başvurabildiğinde (ör. iç içe şemalar) ve hataların dosya
+    yüklenirken raporlanması gerektiğinde kullanılır.
+
+    Args:
+        path: Tanım dosyasının yolu
+        compiler: Dosya içeriğini alıp derlenmiş sonucu döndüren fonksiyon
+        default: Dosya yoksa yazılacak varsayılan içerik
+
+    Returns:
+        compiler'ın döndürdüğü nesne
+    """
+    with _lock:
+        definitions = load_definitions(path, default)
+        compiled = _files[path]["compiled"]
+        key = (compiler.__name__, None)
+        if key not in compiled:
+            compiled[key] = compiler(definitions)
+        return compiled[key]
+
+
+def clear_registry():
+    """Tüm önbelleğe alınmış tanımları temizler"""
+    with _lock:
+        _files.clear()
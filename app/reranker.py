@@ -0,0 +1,148 @@
+"""
+Cross-encoder ile belge yeniden sıralama işlemleri.
+Vektör aramasından gelen geniş aday kümesini (sorgu, parça) çiftleri üzerinden
+puanlar ve en ilgili belgeleri üste taşır.
+"""
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import List, Tuple, Optional
+
+from langchain_core.documents import Document
+
+from app.config import (RERANK_MODEL, RERANK_BATCH_SIZE, RERANK_TIME_BUDGET,
+                        RERANK_CACHE_SIZE)
+
+_cross_encoder = None
+_score_cache = OrderedDict()
+_score_cache_lock = threading.Lock()
+
+
+def get_cross_encoder(model_name: str = RERANK_MODEL):
+    """Yüklü cross-encoder modelini döndür veya CPU üzerinde yükle"""
+    global _cross_encoder
+
+    if model_name is None:
+        model_name = RERANK_MODEL
+
+    if _cross_encoder is not None and _cross_encoder.get("name") == model_name:
+        return _cross_encoder.get("model")
+
+    from sentence_transformers import CrossEncoder
+
+    print(f"INFO - Cross-encoder modeli yükleniyor: {model_name}")
+    model = CrossEncoder(model_name, device="cpu")
+    _cross_encoder = {
+        "name": model_name,
+        "model": model
+    }
+    return model
+
+
+def get_query_hash(query: str) -> str:
+    """Sorgu metni için önbellek anahtarında kullanılacak özet değeri döndürür"""
+    normalized = " ".join(query.lower().split())
+    return hashlib.sha1(normalized.encode("utf-8")).hexdigest()
+
+
+def get_chunk_id(doc: Document) -> str:
+    """
+    Belge parçası için kararlı bir kimlik döndürür.
+
+    Metadata içinde 'id' varsa onu, yoksa kaynak ve içerik özetini kullanır.
+    """
+    chunk_id = doc.metadata.get("id") if isinstance(doc.metadata, dict) else None
+    if chunk_id is not None:
+        return str(chunk_id)
+    source = doc.metadata.get("source", "") if isinstance(doc.metadata, dict) else ""
+    digest = hashlib.sha1(doc.page_content.encode("utf-8")).hexdigest()
+    return f"{source}:{digest}"
+
+
+def _cache_get(key):
+    with _score_cache_lock:
+        score = _score_cache.get(key)
+        if score is not None:
+            _score_cache.move_to_end(key)
+        return score
+
+
+def _cache_put(key, score: float):
+    with _score_cache_lock:
+        _score_cache[key] = score
+        _score_cache.move_to_end(key)
+        while len(_score_cache) > RERANK_CACHE_SIZE:
+            _score_cache.popitem(last=False)
+
+
+def clear_rerank_cache():
+    """Yeniden sıralama skor önbelleğini temizler"""
+    with _score_cache_lock:
+        _score_cache.clear()
+
+
+def rerank_documents(query: str,
+                     docs_with_scores: List[Tuple[Document, float]],
+                     top_k: int = 5,
+                     batch_size: int = RERANK_BATCH_SIZE,
+                     time_budget: float = RERANK_TIME_BUDGET,
+                     model_name: Optional[str] = None) -> List[Tuple[Document, float]]:
+    """
+    Belgeleri cross-encoder skorlarına göre yeniden sıralar.
+
+    Adaylar vektör benzerliği sırasıyla, batch'ler halinde puanlanır. Süre bütçesi
+    model yüklendikten sonra başlar; bütçe aşıldığında kalan adaylar puanlanmaz ve puanlanan belgelerin arkasına orijinal
+    sıralarıyla eklenir. Skorlar (sorgu özeti, parça kimliği) anahtarıyla önbelleğe alınır.
+
+    Args:
+        query: Kullanıcı sorgusu
+        docs_with_scores: (belge, benzerlik_skoru) tuple'larının listesi (yüksek->düşük sıralı)
+        top_k: Döndürülecek maksimum belge sayısı
+        batch_size: Tek seferde puanlanacak çift sayısı
+        time_budget: Saniye cinsinden süre bütçesi (None=sınırsız)
+        model_name: Kullanılacak cross-encoder modeli (None=varsayılan model)
+
+    Returns:
+        (belge, cross_encoder_skoru) tuple'ları (yüksek->düşük sıralı)
+    """
+    if not docs_with_scores:
+        return []
+
+    start_time = time.perf_counter()
+    query_hash = get_query_hash(query)
+    keys = [(query_hash, get_chunk_id(doc)) for doc, _ in docs_with_scores]
+    scores = [_cache_get(key) for key in keys]
+
+    pending = [i for i, score in enumerate(scores) if score is None]
+    cached_count = len(docs_with_scores) - len(pending)
+    budget_exceeded = False
+
+    if pending:
+        model = get_cross_encoder(model_name)
+        # Modelin ilk yüklenmesi süre bütçesinden sayılmaz
+        budget_start = time.perf_counter()
+        for batch_start in range(0, len(pending), batch_size):
+            if time_budget is not None and time.perf_counter() - budget_start >= time_budget:
+                budget_exceeded = True
+                break
+
+            batch = pending[batch_start:batch_start + batch_size]
+            pairs = [(query, docs_with_scores[i][0].page_content) for i in batch]
+            batch_scores = model.predict(pairs, batch_size=batch_size, show_progress_bar=False)
+
+            for i, score in zip(batch, batch_scores):
+                scores[i] = float(score)
+                _cache_put(keys[i], scores[i])
+
+    scored = [(docs_with_scores[i][0], scores[i]) for i in range(len(scores)) if scores[i] is not None]
+    unscored = [docs_with_scores[i] for i in range(len(scores)) if scores[i] is None]
+    scored.sort(key=lambda x: x[1], reverse=True)
+
+    elapsed = time.perf_counter() - start_time
+    print(f"INFO - Yeniden sıralama: {len(scored)}/{len(docs_with_scores)} aday puanlandı "
+          f"({cached_count} önbellekten, {elapsed * 1000:.0f} ms)")
+    if budget_exceeded:
+        print(f"⚠️ Yeniden sıralama süre bütçesi aşıldı, {len(unscored)} aday orijinal sırasıyla eklendi")
+
+    return (scored + unscored)[:top_k]
@@ -0,0 +1,270 @@
+"""
+document_chunks tablosu üzerinde doğrudan vektör araması işlemleri.
+İndeksleme (save_chunks_to_db) ile yazılan parçaları, saklanan embedding
+vektörleriyle birlikte getirmek için kullanılır.
+"""
+import numpy as np
+from typing import List, Tuple, Optional, Sequence
+from langchain_core.documents import Document
+
+from app.db import get_db_connection
+from app.config import COLLECTION_NAME, EMBEDDING_MODEL
+
+# Normalize skor (1/(1+d)), eşik ve min-docs geri dönüşü tek sorguda hesaplanır.
+# Yer tutucular sürücüye göre doldurulur (psycopg2: %(ad)s, asyncpg: $n).
+FILTERED_SEARCH_SQL = """
+WITH candidates AS (
+    SELECT e.document, e.cmetadata, e.embedding <=> {query}::text::vector AS distance
+    FROM langchain_pg_embedding e
+    JOIN langchain_pg_collection c ON e.collection_id = c.uuid
+    WHERE c.name = {collection}
+    ORDER BY e.embedding <=> {query}::text::vector
+    LIMIT {k}
+), ranked AS (
+    SELECT document, cmetadata, 1.0 / (1.0 + distance) AS similarity,
+           ROW_NUMBER() OVER (ORDER BY distance) AS rank,
+           COUNT(*) FILTER (WHERE 1.0 / (1.0 + distance) >= {threshold}::float8) OVER () AS above_threshold
+    FROM candidates
+)
+SELECT document, cmetadata, similarity
+FROM ranked
+WHERE CASE WHEN above_threshold >= {min_docs}::int
+           THEN similarity >= {threshold}::float8
+           ELSE rank <= {min_docs}::int END
+  AND ({max_docs}::int IS NULL OR rank <= {max_docs}::int)
+ORDER BY rank
+"""
+
+# Birleştirilmiş pencerelerdeki tüm parçalar tek sorguda getirilir; (document_id, chunk_index)
+# üzerindeki idx_doc_chunk indeksi kullanılır. Yer tutucular sürücüye göre doldurulur.
+WINDOW_CHUNKS_SQL = """
+SELECT DISTINCT ON (w.window_id, c.chunk_index)
+       w.window_id, c.id, c.document_id, c.title, c.content, c.chunk_index, c.total_chunks, c.category
+FROM unnest({document_ids}::text[], {start_indexes}::int[], {end_indexes}::int[], {window_ids}::int[])
+     AS w(document_id, start_index, end_index, window_id)
+JOIN document_chunks c
+  ON c.document_id = w.document_id
+ AND c.chunk_index BETWEEN w.start_index AND w.end_index
+ORDER BY w.window_id, c.chunk_index, c.id DESC
+"""
+
+
+def to_vector_literal(vector: Sequence[float]) -> str:
+    """Vektörü pgvector'ün kabul ettiği metin biçimine dönüştürür"""
+    return '[' + ','.join(map(str, vector)) + ']'
+
+
+def row_to_document(row_id, document_id, title, content, chunk_index, total_chunks, category=None) -> Document:
+    """document_chunks satırını LangChain belgesine dönüştürür"""
+    metadata = {
+        "id": row_id,
+        "document_id": document_id,
+        "source": document_id,
+        "title": title,
+        "chunk_index": chunk_index,
+        "total_chunks": total_chunks
+    }
+    if category:
+        metadata["category"] = category
+    return Document(page_content=content, metadata=metadata)
+
+
+def search_chunks(query_embedding: Sequence[float], k: int = 5, with_embeddings: bool = False,
+                  embedding_model: Optional[str] = None) -> Tuple[List[Tuple[Document, float]], Optional[np.ndarray]]:
+    """
+    document_chunks tablosunda kosinüs uzaklığına göre en yakın parçaları getirir.
+
+    Koleksiyon araması (FILTERED_SEARCH_SQL, PGVector) ile aynı <=> operatörü kullanılır;
+    böylece skorlar diğer arama yollarıyla aynı şekilde normalize edilebilir. Yalnızca
+    sorguyla aynı embedding modeliyle indekslenmiş parçalar (ve modeli kaydedilmemiş
+    eski parçalar) aday olur.
+
+    Args:
+        query_embedding: Sorgu vektörü
+        k: Getirilecek parça sayısı
+        with_embeddings: Saklanan embedding vektörleri de getirilsin mi
+        embedding_model: Sorgu vektörünü üreten embedding modeli (None=varsayılan model)
+
+    Returns:
+        ((belge, kosinüs_uzaklığı) listesi, embedding matrisi veya None) tuple'ı.
+        Liste uzaklığa göre artan sıradadır, matrisin satırları listeyle aynı sıradadır.
+    """
+    if embedding_model is None:
+        embedding_model = EMBEDDING_MODEL
+    vector_str = to_vector_literal(query_embedding)
+    embedding_column = ", embedding::real[]" if with_embeddings else ""
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute(f"""
+        SELECT id, document_id, title, content, chunk_index, total_chunks, category,
+               embedding <=> (%s)::vector AS distance{embedding_column}
+        FROM document_chunks
+        WHERE embedding_model = %s OR embedding_model IS NULL
+        ORDER BY embedding <=> (%s)::vector
+        LIMIT %s
+        """, (vector_str, embedding_model, vector_str, k))
+        rows = cursor.fetchall()
+    finally:
+        cursor.close()
+        conn.close()
+
+    results = [(row_to_document(*row[:7]), float(row[7])) for row in rows]
+
+    embeddings = None
+    if with_embeddings:
+        embeddings = np.asarray([row[8] for row in rows], dtype=np.float32)
+
+    return results, embeddings
+
+
+def search_collection_filtered(query_embedding: Sequence[float], k: int, threshold: float, min_docs: int = 3,
+                               max_docs: Optional[int] = None) -> List[Tuple[Document, float]]:
+    """
+    LangChain koleksiyonunda arama yapar; normalizasyon ve eşiklemeyi SQL içinde uygular.
+
+    En yakın k aday 1/(1+uzaklık) ile normalize edilir. Eşiği geçen en az min_docs aday
+    varsa yalnızca onlar, yoksa en iyi min_docs aday döndürülür (filter_by_threshold ile
+    aynı kural). Böylece yalnızca kullanılacak satırlar veritabanından aktarılır.
+
+    Args:
+        query_embedding: Sorgu vektörü
+        k: Değerlendirilecek aday sayısı
+        threshold: Minimum normalize benzerlik skoru
+        min_docs: Eşiği geçen belge azsa döndürülecek belge sayısı
+        max_docs: Döndürülecek maksimum belge sayısı (None=sınırsız)
+
+    Returns:
+        (belge, normalize_skor) tuple'larının listesi (yüksek->düşük sıralı)
+    """
+    params = ("query", "collection", "k", "threshold", "min_docs", "max_docs")
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute(FILTERED_SEARCH_SQL.format(**{name: f"%({name})s" for name in params}), {
+            "query": to_vector_literal(query_embedding),
+            "collection": COLLECTION_NAME,
+            "k": k,
+            "threshold": threshold,
+            "min_docs": min_docs,
+            "max_docs": max_docs
+        })
+        rows = cursor.fetchall()
+    finally:
+        cursor.close()
+        conn.close()
+
+    return [(Document(page_content=document, metadata=metadata or {}), float(similarity))
+            for document, metadata, similarity in rows]
+
+
+def merge_chunk_windows(docs: List[Document], window: int) -> Tuple[List[dict], List[Optional[int]]]:
+    """
+    Her isabetin ±window komşuluğunu hesaplar ve aynı belgedeki örtüşen/bitişik pencereleri birleştirir.
+
+    Args:
+        docs: İlgi sırasındaki isabet belgeleri
+        window: Her yönde eklenecek komşu parça sayısı
+
+    Returns:
+        (pencereler, belge_başına_pencere_indeksi) tuple'ı. Pencereler ilk isabetlerinin
+        ilgi sırasındadır; document_id/chunk_index bilgisi olmayan belgeler için indeks None olur.
+    """
+    ranges = {}
+    for rank, doc in enumerate(docs):
+        metadata = doc.metadata if isinstance(doc.metadata, dict) else {}
+        document_id, chunk_index = metadata.get("document_id"), metadata.get("chunk_index")
+        if document_id is None or chunk_index is None:
+            continue
+        chunk_index = int(chunk_index)
+        ranges.setdefault(str(document_id), []).append((max(0, chunk_index - window), chunk_index + window, rank))
+
+    windows = []
+    doc_windows = [None] * len(docs)
+    for document_id, doc_ranges in ranges.items():
+        doc_ranges.sort()
+        current = None
+        for start, end, rank in doc_ranges:
+            if current is not None and start <= current["end"] + 1:
+                current["end"] = max(current["end"], end)
+                current["ranks"].append(rank)
+            else:
+                current = {"document_id": document_id, "start": start, "end": end, "ranks": [rank]}
+                windows.append(current)
+
+    windows.sort(key=lambda w: min(w["ranks"]))
+    for window_id, w in enumerate(windows):
+        for rank in w["ranks"]:
+            doc_windows[rank] = window_id
+    return windows, doc_windows
+
+
+def assemble_chunk_windows(docs: List[Document], windows: List[dict], doc_windows: List[Optional[int]],
+                           rows) -> List[Document]:
+    """
+    Pencere sorgusunun satırlarını ilgi sırasında belge listesine dönüştürür.
+
+    Her pencere, ilk isabetinin bulunduğu konuma parçaları chunk_index sırasıyla yerleşir.
+    Veritabanında karşılığı olmayan belgeler olduğu gibi korunur.
+    """
+    window_docs = {}
+    for window_id, *row in rows:
+        doc = row_to_document(*row)
+        doc.metadata["window_id"] = window_id
+        window_docs.setdefault(window_id, []).append(doc)
+
+    expanded = []
+    emitted = set()
+    for doc, window_id in zip(docs, doc_windows):
+        if window_id is None or window_id not in window_docs:
+            expanded.append(doc)
+        elif window_id not in emitted:
+            emitted.add(window_id)
+            hit_indexes = {int(docs[rank].metadata["chunk_index"]) for rank in windows[window_id]["ranks"]}
+            for chunk in window_docs[window_id]:
+                chunk.metadata["window_hit"] = chunk.metadata["chunk_index"] in hit_indexes
+                expanded.append(chunk)
+    return expanded
+
+
+def expand_chunk_windows(docs: List[Document], window: int = 1) -> List[Document]:
+    """
+    İsabet eden parçaları aynı belgedeki ±window komşu parçalarla genişletir.
+
+    Örtüşen pencereler birleştirilir ve tüm komşular tek bir toplu sorguyla getirilir.
+
+    Args:
+        docs: İlgi sırasındaki isabet belgeleri (metadata: document_id, chunk_index)
+        window: Her yönde eklenecek komşu parça sayısı
+
+    Returns:
+        Genişletilmiş belge listesi (pencereler ilgi sırasında, parçalar belge sırasında)
+    """
+    if window <= 0 or not docs:
+        return docs
+
+    windows, doc_windows = merge_chunk_windows(docs, window)
+    if not windows:
+        return docs
+
+    params = ("document_ids", "start_indexes", "end_indexes", "window_ids")
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute(WINDOW_CHUNKS_SQL.format(**{name: f"%({name})s" for name in params}), {
+            "document_ids": [w["document_id"] for w in windows],
+            "start_indexes": [w["start"] for w in windows],
+            "end_indexes": [w["end"] for w in windows],
+            "window_ids": list(range(len(windows)))
+        })
+        rows = cursor.fetchall()
+    finally:
+        cursor.close()
+        conn.close()
+
+    expanded = assemble_chunk_windows(docs, windows, doc_windows, rows)
+    print(f"INFO - Pencere genişletme (±{window}): {len(docs)} isabet -> {len(windows)} pencere, "
+          f"{len(expanded)} parça")
+    return expanded
@@ -0,0 +1,281 @@
+"""
+LLM istekleri için eşzamanlılık sınırlı, öncelikli zamanlayıcı.
+Ollama'ya aynı anda gönderilecek istek sayısını sınırlar; bekleyen istekler
+öncelik sırasına (etkileşimli sorgular toplu işlerden önce) ve geliş sırasına
+göre başlatılır. Son başlama zamanına (deadline) yetişemeyecek istekler hemen reddedilir.
+Asenkron istekler olay döngüsünde bekler; beklerken iş parçacığı havuzunu meşgul etmez.
+"""
+import time
+import heapq
+import asyncio
+import itertools
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Optional
+
+from app.config import LLM_MAX_CONCURRENCY, LLM_QUEUE_TIMEOUT, LLM_BATCH_QUEUE_TIMEOUT
+from app.metrics import record_queue_wait, record_queue_rejection, get_metrics
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 1
+PRIORITY_NAMES = {PRIORITY_INTERACTIVE: "interactive", PRIORITY_BATCH: "batch"}
+
+# İsteği başlatan kodun belirlediği (öncelik, son_başlama_zamanı); yoksa toplu iş sayılır
+_request_options = contextvars.ContextVar("llm_request_options", default=None)
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+class LLMQueueTimeout(TimeoutError):
+    """LLM isteği son başlama zamanından önce başlatılamadığında fırlatılır"""
+
+
+def get_request_deadline(timeout: Optional[float]) -> Optional[float]:
+    """Bekleme süresini time.monotonic() cinsinden son başlama zamanına çevirir"""
+    return time.monotonic() + timeout if timeout is not None else None
+
+
+def set_request_options(priority: int = PRIORITY_INTERACTIVE, timeout: Optional[float] = LLM_QUEUE_TIMEOUT):
+    """
+    Geçerli bağlamdaki LLM çağrılarının önceliğini ve son başlama zamanını belirler.
+
+    Returns:
+        contextvars token'ı (geri almak için _request_options.reset ile kullanılır)
+    """
+    return _request_options.set((priority, get_request_deadline(timeout)))
+
+
+@contextmanager
+def llm_request_context(priority: int = PRIORITY_INTERACTIVE, timeout: Optional[float] = LLM_QUEUE_TIMEOUT):
+    """
+    Blok içindeki LLM çağrılarını verilen öncelik ve bekleme süresiyle zamanlar.
+
+    Args:
+        priority: PRIORITY_INTERACTIVE veya PRIORITY_BATCH
+        timeout: İsteğin başlaması için beklenebilecek maksimum süre (saniye, None=sınırsız)
+    """
+    token = set_request_options(priority, timeout)
+    try:
+        yield
+    finally:
+        _request_options.reset(token)
+
+
+def get_request_options() -> tuple:
+    """Geçerli bağlamın (öncelik, son_başlama_zamanı) değerini döndürür"""
+    options = _request_options.get()
+    if options is None:
+        return PRIORITY_BATCH, get_request_deadline(LLM_BATCH_QUEUE_TIMEOUT)
+    return options
+
+
+class LLMScheduler:
+    """
+    Öncelik kuyruklu eşzamanlılık sınırlayıcı.
+
+    Senkron ve asenkron bekleyenler aynı kuyrukta sıralanır. Senkron bekleyenler
+    koşul değişkeninde, asenkron bekleyenler kendi olay döngülerindeki bir future
+    üzerinde bekler; böylece bekleyen asenkron istekler iş parçacığı tutmaz.
+
+    Args:
+        max_concurrency: Aynı anda çalışabilecek LLM isteği sayısı
+    """
+
+    def __init__(self, max_concurrency: int = LLM_MAX_CONCURRENCY):
+        self.max_concurrency = max(1, max_concurrency)
+        self.active = 0
+        self.waiting = []
+        self.async_waiters = {}  # bilet -> (olay döngüsü, future)
+        self.sequence = itertools.count()
+        self.condition = threading.Condition()
+
+    def estimate_wait(self, ahead: int) -> float:
+        """Önündeki istek sayısına ve ortalama istek süresine göre bekleme süresini tahmin eder"""
+        metrics = get_metrics()
+        if not metrics["requests"]:
+            return 0.0
+        average_seconds = metrics["total_seconds"] / metrics["requests"]
+        return (ahead // self.max_concurrency) * average_seconds
+
+    def resolve_options(self, priority: Optional[int], deadline: Optional[float]) -> tuple:
+        """Verilmeyen öncelik ve son başlama zamanını bağlamdan alır; (öncelik, son_zaman, şerit) döndürür"""
+        if priority is None:
+            priority, context_deadline = get_request_options()
+            deadline = deadline if deadline is not None else context_deadline
+        return priority, deadline, PRIORITY_NAMES.get(priority, str(priority))
+
+    def enqueue(self, priority: int, deadline: Optional[float], lane: str, start_time: float) -> tuple:
+        """
+        İsteği kuyruğa ekler ve biletini döndürür; self.condition altında çağrılmalıdır.
+
+        Raises:
+            LLMQueueTimeout: Tahmini bekleme süresi son başlama zamanını aşıyorsa
+        """
+        ticket = (priority, next(self.sequence))
+        ahead = self.active + sum(1 for waiting in self.waiting if waiting < ticket)
+        if deadline is not None and ahead >= self.max_concurrency:
+            # Tahmini bekleme süresi son başlama zamanını aşıyorsa kuyruğa girmeden reddet
+            if start_time + self.estimate_wait(ahead) > deadline:
+                record_queue_rejection(lane)
+                raise LLMQueueTimeout(f"LLM kuyruğu dolu: önünde {ahead} istek var")
+        heapq.heappush(self.waiting, ticket)
+        return ticket
+
+    def dequeue(self, ticket: tuple):
+        """Başlatılmadan vazgeçilen bileti kuyruktan çıkarır; self.condition altında çağrılmalıdır"""
+        self.waiting.remove(ticket)
+        heapq.heapify(self.waiting)
+        self.dispatch()
+
+    def dispatch(self):
+        """
+        Boş kapasiteyi sıradaki asenkron bekleyenlere verir ve senkron bekleyenleri uyandırır.
+
+        self.condition altında çağrılmalıdır. Sıranın başında senkron bekleyen varsa o
+        hakkı kendisi alır; sıra atlanmaması için dağıtım orada durur.
+        """
+        while self.active < self.max_concurrency and self.waiting:
+            waiter = self.async_waiters.pop(self.waiting[0], None)
+            if waiter is None:
+                break
+            heapq.heappop(self.waiting)
+            self.active += 1
+            loop, future = waiter
+            try:
+                loop.call_soon_threadsafe(self.deliver, future)
+            except RuntimeError:
+                # Olay döngüsü kapanmış; hak kullanılmayacağı için geri alınır
+                self.active -= 1
+        self.condition.notify_all()
+
+    @staticmethod
+    def deliver(future: asyncio.Future):
+        """Asenkron bekleyene çalışma hakkının verildiğini bildirir (bekleyenin olay döngüsünde çalışır)"""
+        if not future.done():
+            future.set_result(None)
+
+    def acquire(self, priority: Optional[int] = None, deadline: Optional[float] = None):
+        """
+        Bir çalışma hakkı alır; gerekirse öncelik sırasıyla bekler.
+
+        Args:
+            priority: İstek önceliği (None=bağlamdaki değer)
+            deadline: time.monotonic() cinsinden son başlama zamanı (None=bağlamdaki değer)
+
+        Raises:
+            LLMQueueTimeout: İstek son başlama zamanından önce başlatılamazsa
+        """
+        priority, deadline, lane = self.resolve_options(priority, deadline)
+
+        start_time = time.monotonic()
+        with self.condition:
+            ticket = self.enqueue(priority, deadline, lane, start_time)
+            try:
+                while self.active >= self.max_concurrency or self.waiting[0] != ticket:
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        record_queue_rejection(lane)
+                        raise LLMQueueTimeout(
+                            f"LLM isteği {time.monotonic() - start_time:.1f} sn içinde başlatılamadı")
+                    self.condition.wait(remaining)
+            except BaseException:
+                self.dequeue(ticket)
+                raise
+
+            heapq.heappop(self.waiting)
+            self.active += 1
+            # Kapasite varsa sıradaki bekleyen de başlayabilir
+            self.dispatch()
+
+        record_queue_wait(lane, time.monotonic() - start_time)
+
+    def release(self):
+        """Çalışma hakkını bırakır ve bekleyenleri uyandırır"""
+        with self.condition:
+            self.active -= 1
+            self.dispatch()
+
+    @contextmanager
+    def slot(self, priority: Optional[int] = None, deadline: Optional[float] = None):
+        """acquire/release çiftini with bloğu olarak sağlar"""
+        self.acquire(priority, deadline)
+        try:
+            yield
+        finally:
+            self.release()
+
+    async def aacquire(self, priority: Optional[int] = None, deadline: Optional[float] = None):
+        """
+        acquire'ın asenkron karşılığı; bekleme olay döngüsünde bir future üzerinden yapılır.
+
+        Görev iptal edilirse kuyruktan çıkarılır; hak iptalle aynı anda verildiyse geri bırakılır.
+
+        Raises:
+            LLMQueueTimeout: İstek son başlama zamanından önce başlatılamazsa
+        """
+        priority, deadline, lane = self.resolve_options(priority, deadline)
+
+        start_time = time.monotonic()
+        future = asyncio.get_running_loop().create_future()
+        with self.condition:
+            ticket = self.enqueue(priority, deadline, lane, start_time)
+            self.async_waiters[ticket] = (asyncio.get_running_loop(), future)
+            self.dispatch()
+
+        timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+        try:
+            # future shield ile korunur; hak verildikten sonra iptal edilse bile sonucu kaybolmaz
+            await asyncio.wait_for(asyncio.shield(future), timeout)
+        except (asyncio.CancelledError, TimeoutError) as e:
+            with self.condition:
+                granted = self.async_waiters.pop(ticket, None) is None
+                if not granted:
+                    self.dequeue(ticket)
+
+            if isinstance(e, asyncio.CancelledError):
+                if granted:
+                    future.add_done_callback(lambda _: self.release())
+                raise
+            if not granted:
+                record_queue_rejection(lane)
+                raise LLMQueueTimeout(
+                    f"LLM isteği {time.monotonic() - start_time:.1f} sn içinde başlatılamadı") from None
+            # Hak zaman aşımıyla aynı anda verildi; bildirim gelince kullanılır
+            try:
+                await asyncio.shield(future)
+            except asyncio.CancelledError:
+                future.add_done_callback(lambda _: self.release())
+                raise
+
+        record_queue_wait(lane, time.monotonic() - start_time)
+
+    def snapshot(self) -> dict:
+        """Anlık durum: çalışan ve öncelik bazında bekleyen istek sayıları"""
+        with self.condition:
+            waiting = {}
+            for priority, _ in self.waiting:
+                lane = PRIORITY_NAMES.get(priority, str(priority))
+                waiting[lane] = waiting.get(lane, 0) + 1
+            return {
+                "max_concurrency": self.max_concurrency,
+                "active": self.active,
+                "waiting": waiting
+            }
+
+
+def reset_scheduler():
+    """Zamanlayıcıyı sıfırlar (fork ile başlatılan işçide, ana sürecin durumu devralınmasın diye)"""
+    global _scheduler
+    _scheduler = None
+
+
+def get_scheduler() -> LLMScheduler:
+    """Paylaşılan LLM zamanlayıcısını döndür veya oluştur"""
+    global _scheduler
+
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = LLMScheduler()
+    return _scheduler
@@ -0,0 +1,197 @@
+"""
+models.json şema tip dili için ayrıştırıcı ve model derleyici.
+Alan tipleri eval yerine küçük bir dilbilgisiyle ayrıştırılır:
+
+    tip := AD [ '[' tip (',' tip)* ']' ]
+
+Desteklenen adlar: str, int, float, bool, Any, list/List, dict/Dict, Optional
+ve aynı dosyada tanımlı diğer şemalar (iç içe modeller).
+"""
+import re
+from typing import Any, Dict, List, Optional
+
+from pydantic import create_model, Field
+
+SCALAR_TYPES = {
+    "str": str,
+    "int": int,
+    "float": float,
+    "bool": bool,
+    "Any": Any
+}
+
+# Genel tipler: ad -> (parametre sayısı, tip oluşturucu); list ve dict parametresiz de kullanılabilir
+GENERIC_TYPES = {
+    "list": (1, lambda args: List[args[0]]),
+    "List": (1, lambda args: List[args[0]]),
+    "dict": (2, lambda args: Dict[args[0], args[1]]),
+    "Dict": (2, lambda args: Dict[args[0], args[1]]),
+    "Optional": (1, lambda args: Optional[args[0]])
+}
+
+TOKEN_PATTERN = re.compile(r"\s*(?:([A-Za-z_][A-Za-z0-9_]*)|(\S))")
+
+
+class SchemaTypeError(ValueError):
+    """Şema tip ifadesi veya şema tanımı geçersiz olduğunda fırlatılır"""
+
+
+def tokenize(expression: str) -> List[str]:
+    """Tip ifadesini adlara ve '[', ']', ',' işaretlerine böler"""
+    tokens = []
+    for match in TOKEN_PATTERN.finditer(expression):
+        name, symbol = match.groups()
+        if symbol is not None and symbol not in "[],":
+            raise SchemaTypeError(f"Beklenmeyen karakter '{symbol}': {expression}")
+        tokens.append(name or symbol)
+    return tokens
+
+
+def parse_type_expression(expression: str) -> tuple:
+    """
+    Tip ifadesini (ad, [parametreler]) biçiminde bir ağaca ayrıştırır.
+
+    Args:
+        expression: Tip ifadesi (ör. "list[str]", "Optional[Person]")
+
+    Returns:
+        (ad, parametre_ağaçları) tuple'ı
+    """
+    tokens = tokenize(expression)
+    position = 0
+
+    def parse_node():
+        nonlocal position
+        if position >= len(tokens) or tokens[position] in "[],":
+            raise SchemaTypeError(f"Tip adı bekleniyordu: {expression}")
+        name = tokens[position]
+        position += 1
+
+        args = []
+        if position < len(tokens) and tokens[position] == "[":
+            position += 1
+            args.append(parse_node())
+            while position < len(tokens) and tokens[position] == ",":
+                position += 1
+                args.append(parse_node())
+            if position >= len(tokens) or tokens[position] != "]":
+                raise SchemaTypeError(f"']' bekleniyordu: {expression}")
+            position += 1
+        return name, args
+
+    if not tokens:
+        raise SchemaTypeError("Boş tip ifadesi")
+    tree = parse_node()
+    if position != len(tokens):
+        raise SchemaTypeError(f"İfadenin sonunda fazla karakter var: {expression}")
+    return tree
+
+
+def get_referenced_names(tree: tuple) -> set:
+    """Ağaçta geçen ve yerleşik olmayan adları (iç içe şema adlarını) döndürür"""
+    name, args = tree
+    names = set() if name in SCALAR_TYPES or name in GENERIC_TYPES else {name}
+    for arg in args:
+        names |= get_referenced_names(arg)
+    return names
+
+
+def build_type(tree: tuple, models: Dict[str, type]):
+    """
+    Ayrıştırılmış tip ağacından Python tipini oluşturur.
+
+    Args:
+        tree: parse_type_expression çıktısı
+        models: Derlenmiş iç içe modeller (ad -> sınıf)
+
+    Returns:
+        Pydantic alan tipi
+    """
+    name, args = tree
+    if not args and name in ("list", "List", "dict", "Dict"):
+        return list if name.lower() == "list" else dict
+    if name in GENERIC_TYPES:
+        arity, constructor = GENERIC_TYPES[name]
+        if len(args) != arity:
+            raise SchemaTypeError(f"'{name}' {arity} tip parametresi alır, {len(args)} verildi")
+        return constructor([build_type(arg, models) for arg in args])
+
+    if args:
+        raise SchemaTypeError(f"'{name}' tip parametresi almaz")
+    if name in SCALAR_TYPES:
+        return SCALAR_TYPES[name]
+    if name in models:
+        return models[name]
+    raise SchemaTypeError(f"Bilinmeyen tip: '{name}'")
+
+
+def parse_type(expression: str, models: Optional[Dict[str, type]] = None):
+    """Tip ifadesini doğrudan Python tipine dönüştürür"""
+    return build_type(parse_type_expression(expression), models or {})
+
+
+def compile_model_schemas(definitions: dict) -> Dict[str, Any]:
+    """
+    Dosyadaki tüm şemaları bağımlılık sırasıyla Pydantic modellerine derler.
+
+    Hatalı şemalar (geçersiz tip, eksik alan tanımı, döngüsel başvuru) derleme
+    sırasında raporlanır ve atlanır; diğer şemalar kullanılmaya devam eder.
+
+    Args:
+        definitions: models.json içeriği (şema adı -> {"fields": {...}})
+
+    Returns:
+        {"models": {ad: sınıf}, "errors": {ad: hata_mesajı}} sözlüğü
+    """
+    parsed = {}
+    errors = {}
+
+    for schema_name, schema_def in definitions.items():
+        try:
+            fields = schema_def["fields"]
+            parsed[schema_name] = {
+                field_name: (parse_type_expression(field_props["type"]), field_props.get("description", ""))
+                for field_name, field_props in fields.items()
+            }
+        except SchemaTypeError as e:
+            errors[schema_name] = str(e)
+        except (KeyError, TypeError, AttributeError) as e:
+            errors[schema_name] = f"Geçersiz şema tanımı: {e}"
+
+    models = {}
+    visiting = set()
+
+    def compile_schema(schema_name: str):
+        if schema_name in models:
+            return models[schema_name]
+        if schema_name in errors:
+            raise SchemaTypeError(f"'{schema_name}' şeması geçersiz")
+        if schema_name in visiting:
+            raise SchemaTypeError(f"Döngüsel şema başvurusu: '{schema_name}'")
+
+        visiting.add(schema_name)
+        try:
+            fields = {}
+            for field_name, (tree, description) in parsed[schema_name].items():
+                for referenced in get_referenced_names(tree):
+                    if referenced in parsed:
+                        compile_schema(referenced)
+                field_type = build_type(tree, models)
+                # Optional alanlar boş bırakılabilir
+                default = None if tree[0] == "Optional" else ...
+                fields[field_name] = (field_type, Field(default, description=description))
+            models[schema_name] = create_model(schema_name, **fields)
+        finally:
+            visiting.discard(schema_name)
+        return models[schema_name]
+
+    for schema_name in parsed:
+        try:
+            compile_schema(schema_name)
+        except SchemaTypeError as e:
+            errors[schema_name] = str(e)
+
+    for schema_name, message in errors.items():
+        print(f"HATA: '{schema_name}' şeması derlenemedi: {message}")
+
+    return {"models": models, "errors": errors}
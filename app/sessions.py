@@ -0,0 +1,194 @@
+"""
+Sunucu tarafında tutulan konuşma oturumları.
+Oturum, soru/cevap geçmişini ve daha önce getirilen belge parçalarını saklar.
+Takip soruları saklanan parçalarla yanıtlanabiliyorsa veritabanında yeniden
+arama yapılmaz; geçmiş ise token bütçesine sığacak şekilde eskiden yeniye kırpılır.
+"""
+import json
+import time
+import uuid
+import threading
+from collections import OrderedDict
+from typing import List, Optional
+
+import numpy as np
+from langchain_core.documents import Document
+
+from app.config import (EMBEDDING_MODEL, MAX_DOCUMENTS, SESSION_TTL, SESSION_MAX_COUNT,
+                        SESSION_HISTORY_TOKEN_BUDGET, SESSION_MAX_DOCUMENTS, SESSION_REUSE_THRESHOLD)
+from app.context import count_tokens, truncate_to_tokens
+from app.llm_client import drop_prompt_context
+
+_sessions = OrderedDict()
+_sessions_lock = threading.Lock()
+
+
+def answer_to_text(answer) -> str:
+    """Sorgu yanıtını geçmişe eklenecek düz metne dönüştürür"""
+    if hasattr(answer, "model_dump"):
+        answer = answer.model_dump()
+    if isinstance(answer, dict):
+        if list(answer) == ["answer"]:
+            return str(answer["answer"])
+        return json.dumps(answer, ensure_ascii=False)
+    return str(answer)
+
+
+def encode_normalized(texts: List[str], model_name: str) -> np.ndarray:
+    """Metinleri tek encode çağrısıyla vektörleştirir ve birim uzunluğa getirir"""
+    from app.embedding import get_embedding_model
+
+    vectors = np.asarray(get_embedding_model(model_name).encode(texts), dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1)
+    norms[norms == 0] = 1.0
+    return vectors / norms[:, None]
+
+
+class Session:
+    """
+    Tek bir konuşmanın geçmişi ve getirilmiş belge parçaları.
+
+    Args:
+        session_id: Oturum kimliği
+    """
+
+    def __init__(self, session_id: str):
+        self.session_id = session_id
+        self.turns = []
+        self.history_tokens = 0
+        self.documents = []
+        self.vectors = None
+        self.embedding_model = None
+        self.last_used = time.monotonic()
+        self.lock = threading.Lock()
+
+    def get_cached_documents(self, question: str, embedding_model: Optional[str] = None) -> Optional[List[Document]]:
+        """
+        Soru saklanan parçalarla yanıtlanabiliyorsa onları benzerlik sırasıyla döndürür.
+
+        Args:
+            question: Takip sorusu
+            embedding_model: Kullanılacak embedding modeli (None=varsayılan model)
+
+        Returns:
+            Belge listesi veya yeni arama gerekiyorsa None
+        """
+        embedding_model = embedding_model or EMBEDDING_MODEL
+        with self.lock:
+            if not self.documents or self.embedding_model != embedding_model:
+                return None
+            documents = list(self.documents)
+            vectors = self.vectors
+
+        scores = vectors @ encode_normalized([question], embedding_model)[0]
+        best_score = float(scores.max())
+        if best_score < SESSION_REUSE_THRESHOLD:
+            print(f"DEBUG - Oturum parçaları soruyla yeterince ilgili değil ({best_score:.2f}), arama yapılacak")
+            return None
+
+        order = np.argsort(-scores, kind="stable")[:MAX_DOCUMENTS]
+        print(f"INFO - Oturumda saklanan {len(order)} parça yeniden kullanıldı (en yüksek benzerlik {best_score:.2f})")
+        return [documents[i] for i in order]
+
+    def remember_documents(self, docs: List[Document], embedding_model: Optional[str] = None):
+        """
+        Yeni getirilen parçaları oturuma ekler; sınır aşılırsa en eski parçalar çıkarılır.
+        """
+        embedding_model = embedding_model or EMBEDDING_MODEL
+        with self.lock:
+            if self.embedding_model != embedding_model:
+                self.documents, self.vectors, self.embedding_model = [], None, embedding_model
+            known = {doc.page_content for doc in self.documents}
+
+        new_docs = []
+        for doc in docs:
+            if doc.page_content not in known:
+                known.add(doc.page_content)
+                new_docs.append(doc)
+        if not new_docs:
+            return
+
+        new_vectors = encode_normalized([doc.page_content for doc in new_docs], embedding_model)
+        with self.lock:
+            self.documents.extend(new_docs)
+            self.vectors = new_vectors if self.vectors is None else np.vstack([self.vectors, new_vectors])
+            if len(self.documents) > SESSION_MAX_DOCUMENTS:
+                self.documents = self.documents[-SESSION_MAX_DOCUMENTS:]
+                self.vectors = self.vectors[-SESSION_MAX_DOCUMENTS:]
+
+    def add_turn(self, question: str, answer):
+        """
+        Soru/cevap çiftini geçmişe ekler ve geçmişi token bütçesine göre kırpar.
+
+        En yeni tur her zaman korunur; tek başına bütçeyi aşıyorsa cevabı kısaltılır.
+        """
+        text = f"Kullanıcı: {question}\nAsistan: {answer_to_text(answer)}\n"
+        tokens = count_tokens(text)
+        if tokens > SESSION_HISTORY_TOKEN_BUDGET:
+            text = truncate_to_tokens(text, SESSION_HISTORY_TOKEN_BUDGET) + "\n"
+            tokens = count_tokens(text)
+
+        with self.lock:
+            self.turns.append({"question": question, "text": text, "tokens": tokens})
+            self.history_tokens += tokens
+            while len(self.turns) > 1 and self.history_tokens > SESSION_HISTORY_TOKEN_BUDGET:
+                self.history_tokens -= self.turns.pop(0)["tokens"]
+
+    def format_history(self) -> str:
+        """Geçmişi bağlamın sonuna eklenecek metin olarak döndürür (geçmiş yoksa boş)"""
+        with self.lock:
+            if not self.turns:
+                return ""
+            return "Önceki konuşma:\n" + "\n".join(turn["text"] for turn in self.turns) + "\n"
+
+    def to_dict(self) -> dict:
+        """Oturumun özet bilgilerini döndürür"""
+        with self.lock:
+            return {
+                "session_id": self.session_id,
+                "turns": [turn["question"] for turn in self.turns],
+                "history_tokens": self.history_tokens,
+                "documents": len(self.documents)
+            }
+
+
+def remove_expired_sessions():
+    """Süresi dolan oturumları siler; _sessions_lock altında çağrılmalıdır"""
+    expired_before = time.monotonic() - SESSION_TTL
+    while _sessions:
+        session_id, session = next(iter(_sessions.items()))
+        if session.last_used >= expired_before and len(_sessions) <= SESSION_MAX_COUNT:
+            break
+        del _sessions[session_id]
+
+
+def create_session() -> Session:
+    """Yeni bir oturum oluşturur ve kaydeder"""
+    session = Session(uuid.uuid4().hex)
+    with _sessions_lock:
+        _sessions[session.session_id] = session
+        remove_expired_sessions()
+    return session
+
+
+def get_session(session_id: str) -> Optional[Session]:
+    """
+    Oturumu döndürür ve son kullanım zamanını günceller.
+
+    Returns:
+        Session nesnesi veya oturum yoksa/süresi dolduysa None
+    """
+    with _sessions_lock:
+        remove_expired_sessions()
+        session = _sessions.get(session_id)
+        if session is not None:
+            session.last_used = time.monotonic()
+            _sessions.move_to_end(session_id)
+        return session
+
+
+def delete_session(session_id: str) -> bool:
+    """Oturumu ve saklanan context token'larını siler; oturum varsa True döndürür"""
+    drop_prompt_context(session_id)
+    with _sessions_lock:
+        return _sessions.pop(session_id, None) is not None
@@ -14,12 +14,15 @@ def normalize_similarity_score(score: float, score_type: str = "l2") -> float:
 
     Args:
         score (float): Ham benzerlik skoru/uzaklık değeri
-        score_type (str): Skor tipi: 'cosine', 'l2', 'dot'
+        score_type (str): Skor tipi: 'cosine', 'l2', 'dot', 'similarity' (zaten normalize)
 
     Returns:
         float: 0-1 arasında normalize edilmiş benzerlik skoru
     """
-    if score_type == "cosine":
+    if score_type == "similarity":
+        # Skor veritabanında normalize edilmiş
+        return score
+    elif score_type == "cosine":
         # Kosinüs benzerliği zaten [0, 1] aralığında, 1 = en benzer
         return max(0.0, min(score, 1.0))  # Sınırlama ekledik
     elif score_type == "l2":
@@ -40,6 +43,102 @@ def normalize_similarity_score(score: float, score_type: str = "l2") -> float:
             return score
 
 
+def normalize_similarity_scores(scores: np.ndarray, score_type: str = "l2") -> np.ndarray:
+    """
+    normalize_similarity_score'un vektörel karşılığı: tüm skorları tek işlemde dönüştürür.
+
+    Args:
+        scores: Ham benzerlik skorları/uzaklık değerleri
+        score_type: Skor tipi: 'cosine', 'l2', 'dot', 'similarity' (zaten normalize)
+
+    Returns:
+        0-1 arasında normalize edilmiş benzerlik skorları
+    """
+    scores = np.asarray(scores, dtype=np.float64)
+
+    if score_type == "similarity":
+        return scores
+    elif score_type == "cosine":
+        return np.clip(scores, 0.0, 1.0)
+    elif score_type == "l2":
+        return 1.0 / (1.0 + scores)
+    elif score_type == "dot" or score_type == "inner":
+        return np.where(scores > 0, np.minimum(scores / (1.0 + np.abs(scores)), 1.0), 0.0)
+    else:
+        return np.where(scores > 1.0, 1.0 / np.maximum(scores, 1.0), scores)
+
+
+class ScoredResults:
+    """
+    Arama sonuçlarını paralel numpy dizileri olarak tutan sonuç kümesi.
+
+    Belgeler bir kez listede saklanır; sıralama, eşikleme ve kırpma işlemleri
+    yalnızca belge indeksleri (ids) ve skor dizileri üzerinde yapılır.
+    """
+
+    def __init__(self, documents: List[Document], scores, ids=None):
+        self.documents = documents
+        self.scores = np.asarray(scores, dtype=np.float64)
+        self.ids = np.arange(len(documents)) if ids is None else np.asarray(ids, dtype=np.int64)
+
+    @classmethod
+    def from_pairs(cls, docs_with_scores) -> "ScoredResults":
+        """(belge, skor) tuple'larından veya mevcut bir ScoredResults'tan oluşturur"""
+        if isinstance(docs_with_scores, ScoredResults):
+            return docs_with_scores
+        docs_with_scores = list(docs_with_scores or [])
+        return cls([doc for doc, _ in docs_with_scores], [score for _, score in docs_with_scores])
+
+    def __len__(self):
+        return len(self.ids)
+
+    def take(self, positions) -> "ScoredResults":
+        """Verilen konumlardaki sonuçlardan yeni bir küme döndürür"""
+        return ScoredResults(self.documents, self.scores[positions], self.ids[positions])
+
+    def to_pairs(self) -> List[Tuple[Document, float]]:
+        """(belge, skor) tuple'larının listesine dönüştürür"""
+        return [(self.documents[i], score) for i, score in zip(self.ids.tolist(), self.scores.tolist())]
+
+    def sorted(self) -> "ScoredResults":
+        """Skorlara göre yüksek->düşük sıralar (eşit skorlarda mevcut sıra korunur)"""
+        return self.take(np.argsort(-self.scores, kind="stable"))
+
+    def normalized(self, score_type: str = "l2") -> "ScoredResults":
+        """Skorları normalize eder ve yüksek->düşük sıralar"""
+        return ScoredResults(self.documents, normalize_similarity_scores(self.scores, score_type), self.ids).sorted()
+
+    def head(self, k: int) -> "ScoredResults":
+        """Mevcut sıradaki ilk k sonucu döndürür"""
+        return self.take(slice(0, max(k, 0)))
+
+    def top_k(self, k: int) -> "ScoredResults":
+        """
+        En yüksek skorlu k sonucu yüksek->düşük sırayla döndürür.
+
+        Tüm diziyi sıralamak yerine k. en büyük skor np.partition ile bulunur,
+        yalnızca seçilen k sonuç sıralanır. Eşit skorlarda mevcut sıra korunur.
+        """
+        n = len(self.scores)
+        if k <= 0 or n == 0:
+            return self.head(0)
+        if k >= n:
+            return self.sorted()
+
+        kth = np.partition(self.scores, n - k)[n - k]
+        above = np.flatnonzero(self.scores > kth)
+        ties = np.flatnonzero(self.scores == kth)[:k - len(above)]
+        positions = np.concatenate([above, ties])
+        return self.take(positions[np.argsort(-self.scores[positions], kind="stable")])
+
+    def filter_by_threshold(self, threshold: float = 0.3, min_docs: int = 3) -> "ScoredResults":
+        """Eşik üzerindeki sonuçları döndürür; yetersizse en iyi min_docs sonuca düşer"""
+        mask = self.scores >= threshold
+        if np.count_nonzero(mask) < min_docs:
+            return self.top_k(min_docs)
+        return self.take(mask)
+
+
 def correct_similarity_scores(docs_with_scores: List[Tuple[Document, float]],
                               score_type: str = "l2") -> List[Tuple[Document, float]]:
     """
@@ -47,7 +146,7 @@ def correct_similarity_scores(docs_with_scores: List[Tuple[Document, float]],
     benzerlik skorlarına dönüştürür.
 
     Args:
-        docs_with_scores: (belge, skor) tuple'larının listesi
+        docs_with_scores: (belge, skor) tuple'larının listesi veya ScoredResults
         score_type: Benzerlik hesaplama türü ('cosine', 'l2', 'dot')
 
     Returns:
@@ -56,14 +155,7 @@ def correct_similarity_scores(docs_with_scores: List[Tuple[Document, float]],
     if not docs_with_scores:
         return []
 
-    # Skorları normalize et
-    normalized = []
-    for doc, score in docs_with_scores:
-        normalized_score = normalize_similarity_score(score, score_type)
-        normalized.append((doc, normalized_score))
-
-    # Normalize edilmiş skorlara göre sırala (yüksek->düşük)
-    return sorted(normalized, key=lambda x: x[1], reverse=True)
+    return ScoredResults.from_pairs(docs_with_scores).normalized(score_type).to_pairs()
 
 
 def filter_by_threshold(docs_with_scores: List[Tuple[Document, float]],
@@ -73,7 +165,7 @@ def filter_by_threshold(docs_with_scores: List[Tuple[Document, float]],
     Belgeleri minimum benzerlik eşiğine göre filtreler.
 
     Args:
-        docs_with_scores: (belge, skor) tuple'larının listesi
+        docs_with_scores: (belge, skor) tuple'larının listesi veya ScoredResults
         threshold: Minimum benzerlik eşiği (0-1 arası)
         min_docs: Minimum döndürülecek belge sayısı
 
@@ -83,18 +175,7 @@ def filter_by_threshold(docs_with_scores: List[Tuple[Document, float]],
     if not docs_with_scores:
         return []
 
-    # Eşik üstündeki belgeleri filtrele
-    filtered = [(doc, score) for doc, score in docs_with_scores if score >= threshold]
-
-    # Eğer yeterli belge yoksa, eşiği adapte et
-    if len(filtered) < min_docs and docs_with_scores:
-        # Belgeleri skorlarına göre sırala
-        sorted_docs = sorted(docs_with_scores, key=lambda x: x[1], reverse=True)
-
-        # Minimum sayıda belge döndür
-        return sorted_docs[:min_docs]
-
-    return filtered
+    return ScoredResults.from_pairs(docs_with_scores).filter_by_threshold(threshold, min_docs).to_pairs()
 
 
 def filter_by_category(docs_with_scores: List[Tuple[Document, float]],
@@ -114,7 +195,7 @@ def filter_by_category(docs_with_scores: List[Tuple[Document, float]],
     if not docs_with_scores or query_category == "general":
         return docs_with_scores
 
-    from app.categorizer import detect_document_category
+    from app.categorizer import get_document_category
 
     # Kategori eşleşmelerine göre ayır
     matching_category = []
@@ -123,7 +204,7 @@ def filter_by_category(docs_with_scores: List[Tuple[Document, float]],
     print(f"🔍 Belge kategori analizi (aranan kategori: {query_category}):")
     for doc, score in docs_with_scores:
         try:
-            doc_category = detect_document_category(doc.page_content)
+            doc_category = get_document_category(doc)
             doc_source = doc.metadata.get('source', 'bilinmiyor')
 
             print(f"  - {doc_source}: {doc_category} (skor: {score:.4f})")
@@ -163,7 +244,7 @@ def filter_irrelevant_documents(docs_with_scores: List[Tuple[Document, float]],
     Hibrit filtreleme uygular: Önce benzerlik eşiği, sonra kategori filtresi.
 
     Args:
-        docs_with_scores: (belge, skor) tuple'larının listesi
+        docs_with_scores: (belge, skor) tuple'larının listesi veya ScoredResults
         category: Aranan kategori
         threshold: Minimum benzerlik eşiği
         max_docs: Maksimum döndürülecek belge sayısı
@@ -174,32 +255,215 @@ def filter_irrelevant_documents(docs_with_scores: List[Tuple[Document, float]],
     if not docs_with_scores:
         return []
 
+    results = ScoredResults.from_pairs(docs_with_scores)
+
     # 1. Benzerlik eşiğine göre filtrele
-    threshold_filtered = filter_by_threshold(
-        docs_with_scores,
-        threshold=threshold,
-        min_docs=3
-    )
+    threshold_filtered = results.filter_by_threshold(threshold=threshold, min_docs=3)
 
     if not threshold_filtered:
         print("⚠️ Benzerlik eşiğine göre hiç belge kalmadı")
         # En yüksek benzerliği olan belgeleri döndür
-        return sorted(docs_with_scores, key=lambda x: x[1], reverse=True)[:max_docs]
+        return results.top_k(max_docs).to_pairs()
 
-    # 2. Kategori filtrelemesi uygula
+    # 2. Kategori filtrelemesi uygula (yalnızca eşikten geçen az sayıda belge üzerinde)
     if category is not None and category != "general":
         category_filtered = filter_by_category(
-            threshold_filtered,
+            threshold_filtered.to_pairs(),
             query_category=category,
             min_category_docs=2
         )
 
         # Kategori filtresi sonrası sırala
-        category_filtered.sort(key=lambda x: x[1], reverse=True)
-        return category_filtered[:max_docs]
+        return ScoredResults.from_pairs(category_filtered).top_k(max_docs).to_pairs()
 
     # Sadece benzerlik eşiği ile filtrelenmiş sonuçları döndür
-    return threshold_filtered[:max_docs]
+    return threshold_filtered.head(max_docs).to_pairs()
+
+
+def maximal_marginal_relevance(query_embedding, embeddings, lambda_mult: float = 0.5,
+                               k: int = 5) -> List[int]:
+    """
+    Maksimum marjinal ilgi (MMR) ile çeşitlendirilmiş aday indekslerini seçer.
+
+    Tüm sorgu-aday ve aday-aday kosinüs benzerlikleri tek seferde matris çarpımıyla
+    hesaplanır; her seçim adımında yalnızca en yüksek benzerlik vektörü güncellenir.
+
+    Args:
+        query_embedding: Sorgu vektörü
+        embeddings: Aday vektörlerinin matrisi (n x boyut)
+        lambda_mult: İlgi/çeşitlilik dengesi (1.0 = yalnızca ilgi, 0.0 = yalnızca çeşitlilik)
+        k: Seçilecek aday sayısı
+
+    Returns:
+        Seçilen adayların indeksleri (seçim sırasıyla)
+    """
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    if embeddings.ndim != 2 or embeddings.shape[0] == 0 or k <= 0:
+        return []
+
+    query_vector = np.asarray(query_embedding, dtype=np.float32).reshape(-1)
+    embeddings = embeddings / np.clip(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12, None)
+    query_vector = query_vector / max(float(np.linalg.norm(query_vector)), 1e-12)
+
+    relevance = embeddings @ query_vector
+    pairwise = embeddings @ embeddings.T
+
+    k = min(k, embeddings.shape[0])
+    selected = [int(np.argmax(relevance))]
+    available = np.ones(embeddings.shape[0], dtype=bool)
+    available[selected[0]] = False
+    redundancy = pairwise[selected[0]].copy()
+
+    while len(selected) < k:
+        mmr_scores = lambda_mult * relevance - (1.0 - lambda_mult) * redundancy
+        mmr_scores[~available] = -np.inf
+        idx = int(np.argmax(mmr_scores))
+        selected.append(idx)
+        available[idx] = False
+        np.maximum(redundancy, pairwise[idx], out=redundancy)
+
+    return selected
+
+
+def detect_score_knee(scores: List[float], sensitivity: float = 0.3) -> Optional[int]:
+    """
+    Azalan skor eğrisindeki dirsek (knee) noktasını bulur.
+
+    Skorlar [0, 1] aralığına ölçeklenir ve ilk ile son skoru birleştiren doğrudan
+    en uzak nokta seçilir (Kneedle yaklaşımı).
+
+    Args:
+        scores: Yüksek->düşük sıralı benzerlik skorları
+        sensitivity: Dirseğin belirgin sayılması için doğrudan minimum sapma
+
+    Returns:
+        Dirsek noktasına kadar tutulacak belge sayısı veya belirgin dirsek yoksa None
+    """
+    values = np.asarray(scores, dtype=np.float64)
+    if values.size < 3:
+        return None
+
+    value_range = values[0] - values[-1]
+    if value_range <= 0:
+        return None
+
+    normalized = (values - values[-1]) / value_range
+    line = 1.0 - np.linspace(0.0, 1.0, values.size)
+    deviation = line - normalized
+
+    knee = int(np.argmax(deviation))
+    if deviation[knee] < sensitivity:
+        return None
+
+    return knee + 1
+
+
+def find_score_cutoff(scores: List[float], min_gap: float = 0.05, min_docs: int = 1,
+                      knee_sensitivity: float = 0.3) -> int:
+    """
+    Skor listesinde bağlamın kesileceği noktayı bulur.
+
+    İlk büyük skor düşüşünde (min_gap) ya da belirgin bir dirsek noktasında
+    hangisi önce gelirse orada keser.
+
+    Args:
+        scores: Yüksek->düşük sıralı benzerlik skorları
+        min_gap: Kesme için ardışık iki skor arasındaki minimum düşüş
+        min_docs: Her durumda tutulacak minimum belge sayısı
+        knee_sensitivity: Dirsek tespiti hassasiyeti
+
+    Returns:
+        Tutulacak belge sayısı
+    """
+    values = np.asarray(scores, dtype=np.float64)
+    min_docs = max(1, min_docs)
+    if values.size <= min_docs:
+        return int(values.size)
+
+    cutoff = int(values.size)
+
+    # gaps[i] = i. ve i+1. skor arasındaki düşüş; ilk min_docs belge her zaman tutulur
+    gaps = values[:-1] - values[1:]
+    large_gaps = np.flatnonzero(gaps[min_docs - 1:] >= min_gap)
+    if large_gaps.size:
+        cutoff = int(large_gaps[0]) + min_docs
+
+    knee = detect_score_knee(values, sensitivity=knee_sensitivity)
+    if knee is not None:
+        cutoff = min(cutoff, max(knee, min_docs))
+
+    return cutoff
+
+
+def adaptive_similarity_search(search_fn, initial_k: int = 2, max_k: int = 10,
+                               threshold: float = 0.3, min_gap: float = 0.05,
+                               score_type: str = "l2",
+                               knee_sensitivity: float = 0.3) -> List[Tuple[Document, float]]:
+    """
+    Küçük bir k ile başlayıp yalnızca gerektiğinde genişleyen benzerlik araması.
+
+    Her adımda skor dağılımına bakılır; büyük bir düşüş veya dirsek varsa ya da
+    kuyruktaki skor eşiğin altına inmişse arama durur. Aksi halde k iki katına çıkar.
+    Sonuç ilk büyük skor düşüşünde kesilir.
+
+    Args:
+        search_fn: k alıp (belge, ham_skor) listesi döndüren arama fonksiyonu
+        initial_k: İlk aramada getirilecek belge sayısı
+        max_k: Genişletme üst sınırı
+        threshold: Kuyruğun ilgili sayılması için minimum normalize skor
+        min_gap: Kesme için ardışık skorlar arasındaki minimum düşüş
+        score_type: Ham skor tipi ('cosine', 'l2', 'dot')
+        knee_sensitivity: Dirsek tespiti hassasiyeti
+
+    Returns:
+        Ham skorlarıyla birlikte (belge, skor) tuple'ları (en benzer üstte)
+    """
+    k = max(1, min(initial_k, max_k))
+
+    while True:
+        raw_results = search_fn(k)
+        next_k, kept = adaptive_search_step(raw_results, k, max_k=max_k, threshold=threshold,
+                                            min_gap=min_gap, score_type=score_type,
+                                            knee_sensitivity=knee_sensitivity)
+        if next_k is None:
+            return kept
+        k = next_k
+
+
+def adaptive_search_step(raw_results: List[Tuple[Document, float]], k: int, max_k: int = 10,
+                         threshold: float = 0.3, min_gap: float = 0.05, score_type: str = "l2",
+                         knee_sensitivity: float = 0.3) -> Tuple[Optional[int], List[Tuple[Document, float]]]:
+    """
+    Uyarlanabilir aramanın tek adımını değerlendirir.
+
+    Args:
+        raw_results: k ile yapılan aramanın (belge, ham_skor) sonuçları
+        k: Bu adımda istenen belge sayısı
+        max_k: Genişletme üst sınırı
+        threshold: Kuyruğun ilgili sayılması için minimum normalize skor
+        min_gap: Kesme için ardışık skorlar arasındaki minimum düşüş
+        score_type: Ham skor tipi ('cosine', 'l2', 'dot')
+        knee_sensitivity: Dirsek tespiti hassasiyeti
+
+    Returns:
+        (sonraki_k, tutulan_sonuçlar) tuple'ı. Arama bittiyse sonraki_k None olur.
+    """
+    if not raw_results:
+        return None, []
+
+    normalized = normalize_similarity_scores([score for _, score in raw_results], score_type)
+    order = np.argsort(-normalized, kind="stable")
+    sorted_scores = normalized[order]
+
+    cutoff = find_score_cutoff(sorted_scores, min_gap=min_gap, knee_sensitivity=knee_sensitivity)
+    exhausted = len(raw_results) < k
+    tail_relevant = sorted_scores[-1] >= threshold
+
+    if cutoff < len(raw_results) or exhausted or not tail_relevant or k >= max_k:
+        print(f"INFO - Uyarlanabilir k: {k} belge arandı, {cutoff} belge tutuldu")
+        return None, [raw_results[i] for i in order[:cutoff]]
+
+    return min(k * 2, max_k), []
 
 
 def analyze_similarity_results(query: str, docs_with_scores: List[Tuple[Document, float]],
@@ -212,7 +476,7 @@ def analyze_similarity_results(query: str, docs_with_scores: List[Tuple[Document
         docs_with_scores: Düzeltilmiş (belge, skor) tuple'larının listesi
         original_docs_with_scores: Orijinal (belge, skor) tuple'larının listesi
     """
-    from app.categorizer import detect_query_category, detect_document_category
+    from app.categorizer import detect_query_category, get_document_category
 
     print("\n" + "=" * 80)
     print(f"📊 BENZERLİK ANALİZİ: '{query}'")
@@ -229,7 +493,7 @@ def analyze_similarity_results(query: str, docs_with_scores: List[Tuple[Document
     # Belge kategori analizi
     doc_categories = {}
     for doc, score in docs_with_scores:
-        doc_categories[doc] = detect_document_category(doc.page_content)
+        doc_categories[doc] = get_document_category(doc)
 
     # Kategori bazlı doğruluk
     matching_categories = sum(1 for doc, _ in docs_with_scores if doc_categories[doc] == query_category)
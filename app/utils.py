@@ -18,21 +18,21 @@ def ensure_template_files_exist():
                 "messages": [
                     {"role": "system",
                      "content": "Sen bir uzman asistansın. Kullanıcının sorgusunu, verilen bağlamı kullanarak yanıtla."},
-                    {"role": "user", "content": "Soru: {query}\nBağlam: {context}\nCevap:"}
+                    {"role": "user", "content": "Bağlam:\n{context}\n\nSoru: {query}\nCevap:"}
                 ]
             },
             "academic": {
                 "messages": [
                     {"role": "system",
                      "content": "Sen bir akademik araştırma asistanısın. Kullanıcının sorgusunu bilimsel yaklaşımla, verilen bağlamı kullanarak yanıtla. Cevabında referanslara atıf yap."},
-                    {"role": "user", "content": "Soru: {query}\nBağlam: {context}\nAkademik yanıt:"}
+                    {"role": "user", "content": "Bağlam:\n{context}\n\nSoru: {query}\nAkademik yanıt:"}
                 ]
             },
             "summary": {
                 "messages": [
                     {"role": "system",
                      "content": "Sen bir metin özetleme uzmanısın. Verilen bağlamı kullanarak kullanıcının sorusuna kısa ve öz bir cevap ver."},
-                    {"role": "user", "content": "Soru: {query}\nBağlam: {context}\nÖzet:"}
+                    {"role": "user", "content": "Bağlam:\n{context}\n\nSoru: {query}\nÖzet:"}
                 ]
             }
         }
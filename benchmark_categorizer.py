@@ -0,0 +1,304 @@
+#!/usr/bin/env python
+"""
+Kategori algılama için mikro benchmark.
+app.categorizer'daki tek geçişli anahtar kelime eşleştiricisini, her çağrıda
+anahtar kelime listelerini yeniden kurup ayrı ayrı alt dize taraması yapan
+eski uygulamayla karşılaştırır ve sonuçların aynı olduğunu doğrular.
+"""
+import time
+import random
+import argparse
+
+import app.categorizer as categorizer
+from app.categorizer import detect_document_category, detect_query_category
+
+SAMPLE_DOCUMENTS = [
+    "Inception (film)\nInception, Christopher Nolan'ın yönettiği 2010 yapımı bir bilim kurgu filmidir. "
+    "Başrolde Leonardo DiCaprio, Cobb karakterini canlandırır. Film gişede büyük başarı elde etti ve Oscar kazandı.",
+    "Marie Curie\nMarie Curie, Polonya doğumlu Fransız fizikçi ve kimyagerdir. Polonium ve radium elementlerini "
+    "keşfetti, iki kez Nobel ödülü aldı. Hayatı ve kariyeri bilim insanlarına ilham vermiştir.",
+    "Yüzüklerin Efendisi\nJ.R.R. Tolkien tarafından yazılan fantastik roman üç cilt halinde yayımlandı. "
+    "Kitap ilk basımından bu yana pek çok yayınevi tarafından yeniden basıldı.",
+    "İskandinavya\nİskandinavya, Kuzey Avrupa'da Danimarka, Norveç ve İsveç'ten oluşan bölgedir. "
+    "Bölgenin tarihi Viking çağına kadar uzanır ve yaşam kalitesi yüksektir.",
+    "Yapay zeka ve makine öğrenmesi üzerine notlar. Bu bölümde modellerin eğitimi, veri hazırlama "
+    "ve değerlendirme yöntemleri anlatılmaktadır. Okuma listesi sayfa sonunda verilmiştir.",
+]
+
+FILLER_TEXT = (
+    "Bu metin farklı kaynaklardan derlenen genel bilgiler içermektedir. Konu, tarihsel gelişimi ve "
+    "günümüzdeki etkileriyle birlikte ele alınmıştır. Çeşitli araştırmalar bu alandaki değişimlerin "
+    "toplum üzerinde kalıcı izler bıraktığını göstermektedir. Ayrıntılı açıklamalar aşağıdaki "
+    "paragraflarda sunulmuştur. Elde edilen sonuçlar önceki çalışmalarla karşılaştırılarak "
+    "değerlendirilmiştir. Kullanılan yöntemler ve veri kaynakları ekte listelenmiştir"
+)
+
+SAMPLE_QUERIES = [
+    "Marie Curie kimdir?",
+    "Inception filmi hakkında bilgi ver",
+    "Yüzüklerin Efendisi kitabı nedir?",
+    "Bu romanın yazarı kimdir?",
+    "Hangi yönetmen bu filmi çekti?",
+    "İskandinavya'nın tarihi hakkında bilgi ver",
+    "Kuantum bilgisayarlar nasıl çalışır?",
+]
+
+
+# Karşılaştırma için eski uygulama (değiştirilmeden korunmuştur)
+def legacy_detect_document_category(content: str) -> str:
+    """
+    İçerik metnine göre belgenin kategorisini tespit eder.
+
+    Args:
+        content (str): Belge içeriği
+
+    Returns:
+        str: Tespit edilen kategori ('film', 'book', 'person', 'other')
+    """
+    if not content:
+        return "unknown"
+
+    content_lower = content.lower()
+
+    # Özel durumları önce kontrol et
+    if "inception" in content_lower and ("cobb" in content_lower or "dicaprio" in content_lower):
+        return "film"
+    if "marie curie" in content_lower or "marıe curıe" in content_lower:
+        return "person"
+    if ("yüzüklerin efendisi" in content_lower or "lord of the rings" in content_lower) and "tolkien" in content_lower:
+        return "book"
+
+    # Film/dizi kategorisi anahtar kelimeleri
+    film_keywords = [
+        "film", "movie", "sinema", "cinema", "yönetmen", "director",
+        "oyuncu", "actor", "imdb", "cast", "inception", "leonardo dicaprio",
+        "vizyon", "box office", "gişe", "hollywood", "senaryo", "screenplay",
+        "başrol", "yardımcı rol", "oscar", "ödül"
+    ]
+
+    # Kitap kategorisi anahtar kelimeleri
+    book_keywords = [
+        "kitap", "book", "yazar", "author", "sayfa", "page", "cilt",
+        "roman", "novel", "yüzük", "lord of rings", "tolkien", "fantasy",
+        "fantastik", "edition", "basım", "baskı", "yayınevi", "publisher",
+        "chapter", "bölüm", "okuma", "reading"
+    ]
+
+    # Kişi/biyografi kategorisi anahtar kelimeleri
+    person_keywords = [
+        "doğum", "birth", "ölüm", "death", "hayat", "life", "curie", "marie",
+        "biyografi", "biography", "bilim insanı", "scientist", "fizikçi", "physicist",
+        "kimyager", "chemist", "polonium", "radium", "nobel", "ödül", "prize",
+        "yaşam", "career", "kariyeri", "başarıları", "achievements"
+    ]
+
+    # Her kategoriden kaç anahtar kelime var?
+    film_score = sum(1 for word in film_keywords if word in content_lower)
+    book_score = sum(1 for word in book_keywords if word in content_lower)
+    person_score = sum(1 for word in person_keywords if word in content_lower)
+
+    # Marie Curie ile ilgili ek kontroller
+    if "curie" in content_lower or "marie" in content_lower:
+        person_score += 5
+    # Inception filmi ile ilgili ek kontroller
+    if "inception" in content_lower or "cobb" in content_lower:
+        film_score += 5
+    # Yüzüklerin Efendisi ile ilgili ek kontroller
+    if "yüzük" in content_lower or "tolkien" in content_lower:
+        book_score += 5
+
+    # Başlık analizi
+    first_line = content_lower.split("\n")[0] if "\n" in content_lower else content_lower[:100]
+    if "marie" in first_line or "curie" in first_line:
+        person_score += 10
+    if "inception" in first_line or "film" in first_line:
+        film_score += 10
+    if "yüzük" in first_line or "lord" in first_line:
+        book_score += 10
+
+    # En yüksek skora sahip kategoriyi döndür
+    max_score = max(film_score, book_score, person_score)
+
+    if max_score == 0:
+        return "other"  # Hiçbir kategoriye uymuyorsa
+
+    if film_score == max_score:
+        return "film"
+    elif book_score == max_score:
+        return "book"
+    elif person_score == max_score:
+        return "person"
+    else:
+        return "other"
+
+
+def legacy_detect_query_category(query: str) -> str:
+    """
+    Sorgu metnine göre hangi kategoriyle ilgili olduğunu tespit eder.
+
+    Args:
+        query (str): Sorgu metni
+
+    Returns:
+        str: Tespit edilen kategori ('film', 'book', 'person', 'general')
+    """
+    if not query:
+        return "general"
+
+    query_lower = query.lower()
+
+    # Özel durumları önce kontrol et
+    if "marie curie" in query_lower or "curie" in query_lower:
+        return "person"
+    if "inception" in query_lower or (("film" in query_lower or "movie" in query_lower) and "hakkında" in query_lower):
+        return "film"
+    if "yüzüklerin efendisi" in query_lower or "lord of the rings" in query_lower or "tolkien" in query_lower:
+        return "book"
+
+    # Film ile ilgili anahtar kelimeler
+    film_keywords = [
+        'film', 'movie', 'sinema', 'izle', 'yönetmen', 'vizyon',
+        'director', 'oyuncu', 'actor', 'actress', 'cast', 'senaryo',
+        'imdb', 'oscar', 'box office', 'gişe', 'başrol', 'screenplay',
+        'fragman', 'trailer', 'cinema'
+    ]
+
+    # Kitap ile ilgili anahtar kelimeler
+    book_keywords = [
+        'kitap', 'book', 'roman', 'novel', 'yazar', 'author', 'eser',
+        'oku', 'read', 'sayfa', 'page', 'bölüm', 'chapter',
+        'yayınevi', 'publisher', 'basım', 'edition', 'cilt', 'volume'
+    ]
+
+    # Kişi ile ilgili anahtar kelimeler
+    person_keywords = [
+        'kimdir', 'who is', 'doğum', 'birth', 'ölüm', 'death',
+        'hayatı', 'life', 'biyografi', 'biography', 'kişi', 'person',
+        'yaşamı', 'kariyeri', 'career', 'başarı', 'achievement', 'ne yapmıştır',
+        'bilim insanı', 'scientist', 'tarih', 'history', 'bilim', 'science'
+    ]
+
+    # Her kategorideki eşleşme sayısını hesapla - tam kelime eşleşmesi
+    query_words = set(query_lower.split())
+    film_matches = sum(1 for keyword in film_keywords if keyword in query_words)
+    book_matches = sum(1 for keyword in book_keywords if keyword in query_words)
+    person_matches = sum(1 for keyword in person_keywords if keyword in query_words)
+
+    # Her kategorideki kısmi eşleşme sayısını hesapla
+    film_partial = sum(1 for keyword in film_keywords if keyword in query_lower)
+    book_partial = sum(1 for keyword in book_keywords if keyword in query_lower)
+    person_partial = sum(1 for keyword in person_keywords if keyword in query_lower)
+
+    # Kombine eşleşme skoru
+    film_score = film_matches * 2 + film_partial
+    book_score = book_matches * 2 + book_partial
+    person_score = person_matches * 2 + person_partial
+
+    # En çok eşleşme olan kategoriyi belirle
+    max_score = max(film_score, book_score, person_score)
+
+    if max_score == 0:
+        return "general"  # Hiçbir kategoriye uymuyorsa
+
+    if film_score == max_score:
+        return "film"
+    elif book_score == max_score:
+        return "book"
+    elif person_score == max_score:
+        return "person"
+
+    # Belirli anahtar kelimeleri kontrol et (son çare)
+    if any(word in query_lower for word in ['film', 'movie', 'sinema', 'izle']):
+        return "film"
+    elif any(word in query_lower for word in ['kitap', 'book', 'novel', 'roman']):
+        return "book"
+    elif any(word in query_lower for word in ['kimdir', 'who is', 'biyografi']):
+        return "person"
+
+    # Varsayılan kategori
+    return "general"
+
+
+def build_corpus(size: int, chunk_chars: int, seed: int = 42):
+    """Örnek belgelerden ve dolgu cümlelerinden rastgele parçalar üretir"""
+    rng = random.Random(seed)
+    filler = FILLER_TEXT.split(". ")
+    corpus = []
+    for _ in range(size):
+        parts = [rng.choice(SAMPLE_DOCUMENTS)]
+        while sum(len(p) for p in parts) < chunk_chars:
+            parts.append(rng.choice(filler) + ".")
+        corpus.append(" ".join(parts)[:chunk_chars])
+    return corpus
+
+
+def time_function(func, inputs, repeat: int) -> float:
+    """Fonksiyonun girdi başına ortalama çalışma süresini mikrosaniye olarak döndürür"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for text in inputs:
+            func(text)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best / len(inputs) * 1e6
+
+
+def check_consistency(corpus):
+    """Yeni ve eski uygulamaların aynı kategorileri döndürdüğünü doğrular"""
+    mismatches = 0
+    for text in corpus + SAMPLE_DOCUMENTS:
+        if detect_document_category(text) != legacy_detect_document_category(text):
+            mismatches += 1
+    for text in SAMPLE_QUERIES + corpus[:50]:
+        if detect_query_category(text) != legacy_detect_query_category(text):
+            mismatches += 1
+    return mismatches
+
+
+def run_benchmark(size: int, chunk_chars: int, repeat: int):
+    corpus = build_corpus(size, chunk_chars)
+    backends = [("aho-corasick" if categorizer.has_ahocorasick else "regex", categorizer.has_ahocorasick)]
+    if categorizer.has_ahocorasick:
+        backends.append(("regex", False))
+
+    print(f"📊 {size} parça x {chunk_chars} karakter, {len(SAMPLE_QUERIES)} sorgu, en iyi {repeat} tekrar")
+    legacy_doc = time_function(legacy_detect_document_category, corpus, repeat)
+    legacy_query = time_function(legacy_detect_query_category, SAMPLE_QUERIES * 100, repeat)
+    print(f"  eski uygulama      belge: {legacy_doc:8.2f} µs   sorgu: {legacy_query:6.2f} µs")
+
+    original_flag = categorizer.has_ahocorasick
+    try:
+        for name, use_automaton in backends:
+            # Eşleştiricileri seçilen arka uçla yeniden kur
+            categorizer.has_ahocorasick = use_automaton
+            categorizer._document_matcher = None
+            categorizer._query_matcher = None
+
+            mismatches = check_consistency(corpus)
+            doc_time = time_function(detect_document_category, corpus, repeat)
+            query_time = time_function(detect_query_category, SAMPLE_QUERIES * 100, repeat)
+            print(f"  {name:<18} belge: {doc_time:8.2f} µs   sorgu: {query_time:6.2f} µs   "
+                  f"(x{legacy_doc / doc_time:.1f} / x{legacy_query / query_time:.1f})")
+            if mismatches:
+                print(f"⚠️ {name}: {mismatches} girdide eski uygulamadan farklı kategori")
+            else:
+                print(f"✅ {name}: tüm girdilerde eski uygulamayla aynı kategori")
+    finally:
+        categorizer.has_ahocorasick = original_flag
+        categorizer._document_matcher = None
+        categorizer._query_matcher = None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Kategori algılama mikro benchmark'ı")
+    parser.add_argument("--size", type=int, default=1000, help="Üretilecek parça sayısı")
+    parser.add_argument("--chunk-chars", type=int, default=1000, help="Parça başına karakter sayısı")
+    parser.add_argument("--repeat", type=int, default=5, help="Tekrar sayısı (en iyisi raporlanır)")
+    args = parser.parse_args()
+
+    run_benchmark(args.size, args.chunk_chars, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
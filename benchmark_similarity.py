@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+"""
+Skor normalizasyonu ve filtreleme için mikro benchmark.
+app.similarity'deki ScoredResults tabanlı vektörel uygulamayı, (belge, skor)
+tuple'ları üzerinde döngü ve tekrarlı sıralama yapan eski uygulamayla büyük
+aday havuzlarında (yeniden sıralama için k = 1000) karşılaştırır.
+"""
+import time
+import argparse
+
+import numpy as np
+from langchain_core.documents import Document
+
+from app.similarity import (ScoredResults, normalize_similarity_score, correct_similarity_scores,
+                            filter_by_threshold, filter_irrelevant_documents)
+
+
+# Karşılaştırma için eski uygulama (değiştirilmeden korunmuştur)
+def legacy_correct_similarity_scores(docs_with_scores, score_type="l2"):
+    if not docs_with_scores:
+        return []
+
+    normalized = []
+    for doc, score in docs_with_scores:
+        normalized_score = normalize_similarity_score(score, score_type)
+        normalized.append((doc, normalized_score))
+
+    return sorted(normalized, key=lambda x: x[1], reverse=True)
+
+
+def legacy_filter_by_threshold(docs_with_scores, threshold=0.3, min_docs=3):
+    if not docs_with_scores:
+        return []
+
+    filtered = [(doc, score) for doc, score in docs_with_scores if score >= threshold]
+
+    if len(filtered) < min_docs and docs_with_scores:
+        sorted_docs = sorted(docs_with_scores, key=lambda x: x[1], reverse=True)
+        return sorted_docs[:min_docs]
+
+    return filtered
+
+
+def legacy_filter_irrelevant_documents(docs_with_scores, threshold=0.3, max_docs=5):
+    if not docs_with_scores:
+        return []
+
+    threshold_filtered = legacy_filter_by_threshold(docs_with_scores, threshold=threshold, min_docs=3)
+
+    if not threshold_filtered:
+        return sorted(docs_with_scores, key=lambda x: x[1], reverse=True)[:max_docs]
+
+    return threshold_filtered[:max_docs]
+
+
+def legacy_pipeline(raw_results, threshold, max_docs):
+    corrected = legacy_correct_similarity_scores(raw_results, score_type="l2")
+    return legacy_filter_irrelevant_documents(corrected, threshold=threshold, max_docs=max_docs)
+
+
+def vectorized_pipeline(raw_results, threshold, max_docs):
+    corrected = ScoredResults.from_pairs(raw_results).normalized(score_type="l2")
+    return filter_irrelevant_documents(corrected, threshold=threshold, max_docs=max_docs)
+
+
+def build_results(k: int, seed: int = 42):
+    """Rastgele L2 uzaklıklarıyla k adet (belge, uzaklık) üretir"""
+    rng = np.random.default_rng(seed)
+    distances = np.round(rng.uniform(0.2, 2.5, size=k), 3)  # Yuvarlama eşit skorlar da üretir
+    return [(Document(page_content=f"parça {i}", metadata={"id": i}), float(d)) for i, d in enumerate(distances)]
+
+
+def time_function(func, repeat: int, *args) -> float:
+    """Fonksiyonun ortalama çalışma süresini mikrosaniye olarak döndürür"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(10):
+            func(*args)
+        elapsed = (time.perf_counter() - start) / 10
+        best = elapsed if best is None else min(best, elapsed)
+    return best * 1e6
+
+
+def same_results(left, right) -> bool:
+    """İki sonuç listesinin aynı belgeleri aynı sırada ve skorla içerdiğini kontrol eder"""
+    return (len(left) == len(right)
+            and all(a[0] is b[0] and abs(a[1] - b[1]) < 1e-12 for a, b in zip(left, right)))
+
+
+def run_benchmark(sizes, threshold: float, max_docs: int, repeat: int):
+    print(f"📊 Eşik: {threshold}, max_docs: {max_docs}, en iyi {repeat} tekrar")
+    print(f"{'k':>6} | {'adım':<26} | {'eski (µs)':>10} | {'vektörel (µs)':>13} | {'hızlanma':>8}")
+    print("-" * 76)
+
+    for k in sizes:
+        raw_results = build_results(k)
+        corrected = legacy_correct_similarity_scores(raw_results)
+        cases = [
+            ("normalizasyon + sıralama", legacy_correct_similarity_scores, correct_similarity_scores, (raw_results,)),
+            ("eşik + min_docs", legacy_filter_by_threshold, filter_by_threshold, (corrected, 0.9, 3)),
+            ("tam hat (normalize+filtre)", legacy_pipeline, vectorized_pipeline, (raw_results, threshold, max_docs)),
+        ]
+
+        for name, legacy_func, new_func, args in cases:
+            if not same_results(legacy_func(*args), new_func(*args)):
+                print(f"⚠️ k={k} {name}: sonuçlar eski uygulamadan farklı")
+            legacy_time = time_function(legacy_func, repeat, *args)
+            new_time = time_function(new_func, repeat, *args)
+            print(f"{k:>6} | {name:<26} | {legacy_time:>10.1f} | {new_time:>13.1f} | x{legacy_time / new_time:>7.1f}")
+
+        # Tuple listesi dönüşümü olmadan yalnızca dizi işlemleri
+        results = ScoredResults.from_pairs(raw_results)
+        array_time = time_function(lambda: results.normalized("l2").filter_by_threshold(threshold, 3).head(max_docs),
+                                   repeat)
+        print(f"{k:>6} | {'yalnızca dizi işlemleri':<26} | {'':>10} | {array_time:>13.1f} |")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Skor normalizasyonu ve filtreleme mikro benchmark'ı")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000], help="Aday havuzu büyüklükleri")
+    parser.add_argument("--threshold", type=float, default=0.3, help="Benzerlik eşiği")
+    parser.add_argument("--max-docs", type=int, default=5, help="Döndürülecek maksimum belge sayısı")
+    parser.add_argument("--repeat", type=int, default=5, help="Tekrar sayısı (en iyisi raporlanır)")
+    args = parser.parse_args()
+
+    run_benchmark(args.sizes, args.threshold, args.max_docs, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
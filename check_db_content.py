@@ -53,28 +53,17 @@ def check_document_chunks():
         for doc in doc_stats:
             print(f"{doc['document_id'][:30]:<30} | {doc['chunk_count']:<12} | {(doc['title'] or 'Başlık yok')[:30]}")
 
-        # İçerik türlerine göre analiz
+        # İçerik türlerine göre analiz (indekslemede saklanan kategoriler)
         print("\nİçerik türleri:")
-        content_types = {
-            "film": 0,
-            "book": 0,
-            "person": 0,
-            "other": 0
-        }
-
-        for doc in doc_stats:
-            doc_id = doc['document_id']
-            if "inception" in doc_id.lower() or "matrix" in doc_id.lower():
-                content_types["film"] += 1
-            elif "lord_of_rings" in doc_id.lower() or "yuzuk" in doc_id.lower():
-                content_types["book"] += 1
-            elif "marie_curie" in doc_id.lower() or "curie" in doc_id.lower():
-                content_types["person"] += 1
-            else:
-                content_types["other"] += 1
-
-        for content_type, count in content_types.items():
-            print(f"- {content_type.capitalize()}: {count} belge")
+        cursor.execute("""
+        SELECT COALESCE(category, 'kategorisiz') AS category,
+               COUNT(DISTINCT document_id) AS doc_count, COUNT(*) AS chunk_count
+        FROM document_chunks
+        GROUP BY 1
+        ORDER BY chunk_count DESC
+        """)
+        for row in cursor.fetchall():
+            print(f"- {row['category'].capitalize()}: {row['doc_count']} belge ({row['chunk_count']} parça)")
 
         # En son eklenen belgeleri kontrol et
         cursor.execute("""
@@ -9,6 +9,7 @@ from app.config import DB_CONNECTION
 from app.embedding import get_embeddings
 from langchain_core.documents import Document
 from app.db import get_vectorstore
+from app.categorizer import detect_document_category
 import uuid
 
 logging.basicConfig(level=logging.INFO)
@@ -58,7 +59,7 @@ def clear_and_rebuild():
 
         # 4) document_chunks tablosundan verileri çek
         cursor.execute("""
-        SELECT document_id, title, content, embedding, chunk_index
+        SELECT document_id, title, content, embedding, chunk_index, category
         FROM document_chunks
         ORDER BY document_id, chunk_index
         """)
@@ -70,14 +71,15 @@ def clear_and_rebuild():
 
         # 5) Her satırdan Document ve custom_id oluştur
         for row_data in rows:
-            doc_id, title, content, embedding, chunk_idx = row_data
+            doc_id, title, content, embedding, chunk_idx, category = row_data
 
             doc = Document(
                 page_content=content,
                 metadata={
                     "document_id": doc_id,
                     "chunk_index": chunk_idx,
-                    "title": title
+                    "title": title,
+                    "category": category or detect_document_category(content)
                 }
             )
             documents.append(doc)
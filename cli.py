@@ -56,55 +56,114 @@ def index(path, model):
         click.echo("❌ Indekslenecek belge bulunamadı veya işlem sırasında hata oluştu")
 
 
+def print_answer(answer):
+    """Sorgu yanıtını alan alan yazdır"""
+    # Cevap bir model örneği ise yapılandırılmış şekilde yazdır
+    if hasattr(answer, "__dict__"):
+        items = [(key, value) for key, value in answer.__dict__.items()
+                 if key not in ["__pydantic_private__", "model_fields", "model_config"]]
+    else:
+        # Sözlük veya başka bir yanıt tipi
+        items = list(answer.items())
+
+    for key, value in items:
+        click.echo(f"\n📌 {key.upper()}:")
+        if isinstance(value, list):
+            for i, item in enumerate(value, 1):
+                click.echo(f"  {i}. {item}")
+        else:
+            click.echo(f"  {value}")
+
+
+def print_sources(sources):
+    """Kaynak listesini yazdır"""
+    if sources:
+        click.echo("\n📚 KAYNAKLAR:")
+        click.echo("=" * 80)
+        for i, source in enumerate(sources, 1):
+            click.echo(f"{i}. {source}")
+
+
 @cli.command(help="Sorgu yap ve cevap al")
-@click.argument("question", type=str)
+@click.argument("question", type=str, required=False)
 @click.option("--template", "-t", default="default", help="Kullanılacak prompt şablonu")
 @click.option("--model", "-m", default="DocumentResponse", help="Kullanılacak yanıt modeli")
 @click.option("--embedding", "-e", default=None, help="Kullanılacak embedding modeli")
-def ask(question, template, model, embedding):
+@click.option("--rerank/--no-rerank", default=None, help="Cross-encoder ile yeniden sıralama yap")
+@click.option("--mmr/--no-mmr", default=None, help="MMR ile benzer parçaları çeşitlendir")
+@click.option("--mmr-lambda", type=float, default=None, help="MMR ilgi/çeşitlilik dengesi (0-1)")
+@click.option("--mmr-fetch-k", type=int, default=None, help="MMR aday havuzu büyüklüğü")
+@click.option("--adaptive/--no-adaptive", default=None, help="Skor dağılımına göre uyarlanabilir k kullan")
+@click.option("--sql-filter/--no-sql-filter", default=None, help="Skor normalizasyonu ve eşiği SQL içinde uygula")
+@click.option("--window", "-w", type=int, default=None, help="İsabetlere eklenecek ±komşu parça sayısı (0=kapalı)")
+@click.option("--compress/--no-compress", default=None, help="Bağlamı sorguyla ilgili cümlelere sıkıştır")
+@click.option("--cascade/--no-cascade", default=None,
+              help="Önce küçük modelle yanıtla, güven kontrolü başarısızsa büyük modele geç")
+@click.option("--stream/--no-stream", default=False, help="Yanıtı üretildikçe token token yazdır")
+@click.option("--interactive", "-i", is_flag=True, default=False,
+              help="Takip sorularına izin veren etkileşimli oturum başlat")
+def ask(question, template, model, embedding, rerank, mmr, mmr_lambda, mmr_fetch_k, adaptive, sql_filter, window,
+        compress, cascade, stream, interactive):
     """Vektör veritabanına sorgu yap ve cevap al"""
-    click.echo(f"🔍 Sorgulanıyor: '{question}'")
-    click.echo(f"   Şablon: {template}, Model: {model}")
+    if not question and not interactive:
+        raise click.UsageError("Soru belirtin veya --interactive ile etkileşimli oturum başlatın")
 
     # Default embedding değerini config'den al
     if embedding is None:
         from app.config import EMBEDDING_MODEL
         embedding = EMBEDDING_MODEL
 
+    retrieval_options = dict(rerank=rerank, mmr=mmr, mmr_lambda=mmr_lambda, mmr_fetch_k=mmr_fetch_k,
+                             adaptive=adaptive, sql_filter=sql_filter, window=window, compress=compress,
+                             cascade=cascade)
+
+    if not interactive:
+        run_question(question, template, model, embedding, stream, retrieval_options)
+        return
+
+    # Oturum, önceki soruları ve getirilen parçaları takip soruları için saklar
+    from app.sessions import create_session
+    retrieval_options["session"] = create_session()
+    click.echo("💬 Etkileşimli oturum başladı. Çıkmak için boş satır veya 'çık' yazın.")
+    while True:
+        if not question:
+            question = click.prompt("\n❓ Soru", default="", show_default=False).strip()
+        if not question or question.lower() in ("çık", "exit", "quit"):
+            click.echo("👋 Oturum sonlandırıldı")
+            return
+        run_question(question, template, model, embedding, stream, retrieval_options)
+        question = None
+
+
+def run_question(question, template, model, embedding, stream, retrieval_options):
+    """Tek bir soruyu sorgulayıp cevabı ve kaynakları yazdırır"""
+    click.echo(f"🔍 Sorgulanıyor: '{question}'")
+    click.echo(f"   Şablon: {template}, Model: {model}")
+
     try:
+        if stream:
+            # Kaynakları hemen, cevabı üretildikçe göster
+            from app.llm import stream_query
+            for event, data in stream_query(question, template, model, embedding, **retrieval_options):
+                if event == "sources":
+                    print_sources(data)
+                    click.echo("\n📝 CEVAP:")
+                    click.echo("=" * 80)
+                elif event == "token":
+                    click.echo(data, nl=False)
+            click.echo()
+            return
+
         # Sorguyu yap
-        answer, sources = query(question, template, model, embedding)
+        answer, sources = query(question, template, model, embedding, **retrieval_options)
 
         # Cevabı göster
         click.echo("\n📝 CEVAP:")
         click.echo("=" * 80)
-
-        # Cevap bir model örneği ise yapılandırılmış şekilde yazdır
-        if hasattr(answer, "__dict__"):
-            for key, value in answer.__dict__.items():
-                if key not in ["__pydantic_private__", "model_fields", "model_config"]:
-                    click.echo(f"\n📌 {key.upper()}:")
-                    if isinstance(value, list):
-                        for i, item in enumerate(value, 1):
-                            click.echo(f"  {i}. {item}")
-                    else:
-                        click.echo(f"  {value}")
-        else:
-            # Sözlük veya başka bir yanıt tipi
-            for key, value in answer.items():
-                click.echo(f"\n📌 {key.upper()}:")
-                if isinstance(value, list):
-                    for i, item in enumerate(value, 1):
-                        click.echo(f"  {i}. {item}")
-                else:
-                    click.echo(f"  {value}")
+        print_answer(answer)
 
         # Kaynakları göster
-        if sources:
-            click.echo("\n📚 KAYNAKLAR:")
-            click.echo("=" * 80)
-            for i, source in enumerate(sources, 1):
-                click.echo(f"{i}. {source}")
+        print_sources(sources)
 
     except Exception as e:
         click.echo(f"❌ Sorgu işlenirken hata oluştu: {e}")
@@ -174,6 +233,20 @@ def edit_model(editor):
     if editor:
         # Harici editör ile düzenleme
         click.edit(filename=MODEL_SCHEMA_FILE)
+
+        # Şemaları hemen derleyerek hataları sorgu anında değil düzenleme sonrasında bildir
+        try:
+            from app.schema_types import compile_model_schemas
+            with open(MODEL_SCHEMA_FILE, 'r', encoding='utf-8') as f:
+                compiled = compile_model_schemas(json.load(f))
+        except Exception as e:
+            click.echo(f"❌ Model şablonları okunamadı: {e}")
+            return
+
+        if compiled["errors"]:
+            click.echo(f"⚠️ {len(compiled['errors'])} şema geçersiz, düzeltilene kadar kullanılamaz:")
+            for name, message in compiled["errors"].items():
+                click.echo(f"   • {name}: {message}")
         click.echo(f"✅ Model şablonları güncellendi: {MODEL_SCHEMA_FILE}")
     else:
         # Mevcut modelleri göster
@@ -187,6 +260,49 @@ def edit_model(editor):
             click.echo(f"❌ Modeller yüklenirken hata oluştu: {e}")
 
 
+@cli.command(name="backfill-categories", help="Mevcut belge parçalarının kategorilerini hesapla ve kaydet")
+@click.option('--all', 'recompute', is_flag=True, default=False, help="Saklanan kategorileri de yeniden hesapla")
+def backfill_categories(recompute):
+    """Kategorisi saklanmamış parçaların kategorisini bir kez hesaplayıp veritabanına yaz"""
+    from app.db import backfill_document_categories
+
+    click.echo("🏷️  Belge kategorileri hesaplanıyor...")
+    try:
+        updated = backfill_document_categories(recompute=recompute)
+    except Exception as e:
+        click.echo(f"❌ Kategoriler güncellenemedi: {e}")
+        return
+
+    for table, count in updated.items():
+        click.echo(f"✅ {table}: {count} kayıt güncellendi")
+
+
+@cli.command(name="build-centroids", help="Embedding tabanlı kategori merkezlerini oluştur")
+@click.option('--labels', '-l', type=click.Path(exists=True), default=None,
+              help="Kategori -> örnek metin listesi içeren JSON dosyası (verilmezse saklanan parçalar kullanılır)")
+@click.option('--model', '-m', default=None, help="Kullanılacak embedding modeli")
+def build_centroids(labels, model):
+    """Her kategori için bir merkez vektörü hesapla ve kaydet"""
+    from app.category_centroids import build_category_centroids, save_category_centroids
+
+    source = labels or "document_chunks"
+    click.echo(f"🧭 Kategori merkezleri oluşturuluyor (kaynak: {source})...")
+    try:
+        data = build_category_centroids(model_name=model, labels_file=labels)
+    except Exception as e:
+        click.echo(f"❌ Kategori merkezleri oluşturulamadı: {e}")
+        return
+
+    if not data["categories"]:
+        click.echo("⚠️ Kategori bulunamadı. Önce 'backfill-categories' komutunu çalıştırın veya --labels verin.")
+        return
+
+    path = save_category_centroids(data)
+    for category, info in data["categories"].items():
+        click.echo(f"   - {category}: {info['count']} örnek")
+    click.echo(f"✅ {len(data['categories'])} kategori merkezi kaydedildi: {path}")
+
+
 @cli.command(help="Sistem durumunu kontrol et")
 def status():
     """Sistem bileşenlerinin durumunu kontrol et"""
@@ -248,13 +364,17 @@ def status():
 @cli.command(help="API servisi olarak başlat")
 @click.option('--port', '-p', default=8000, help="API servis portu")
 @click.option('--host', '-h', default="0.0.0.0", help="API servis host adresi")
-def serve(port, host):
+@click.option('--workers', '-w', type=int, default=None,
+              help="İşçi süreç sayısı (>1 ise modeller bir kez yüklenip işçiler fork ile başlatılır)")
+def serve(port, host, workers):
     """FastAPI tabanlı API servisi olarak başlat"""
     try:
         from app.api import start_api
-        click.echo(f"🚀 API servisi başlatılıyor: http://{host}:{port}")
-        click.echo("   API belgeleri: http://localhost:{port}/docs")
-        start_api(port, host)
+        from app.config import API_WORKERS
+        workers = workers or API_WORKERS
+        click.echo(f"🚀 API servisi başlatılıyor: http://{host}:{port} ({workers} işçi)")
+        click.echo(f"   API belgeleri: http://localhost:{port}/docs")
+        start_api(port, host, workers)
     except Exception as e:
         click.echo(f"❌ API servisi başlatılamadı: {e}")
         click.echo("   'pip install fastapi uvicorn' komutunu çalıştırın.")
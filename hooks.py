@@ -20,18 +20,10 @@ def after_document_load(document_count, source=None):
 
     # Tutarlılık kontrolü yap
     try:
-        # Temel kontrol kodunu doğrudan buraya ekleyelim
-        # (Bağımlılıkları azaltmak için)
-        import psycopg2
-        from app.config import DB_HOST, DB_PORT, DB_NAME, DB_USER, DB_PASS
-
-        conn = psycopg2.connect(
-            host=DB_HOST,
-            port=DB_PORT,
-            database=DB_NAME,
-            user=DB_USER,
-            password=DB_PASS
-        )
+        # Bağlantı paylaşılan havuzdan alınır
+        from app.db import get_db_connection
+
+        conn = get_db_connection()
         cursor = conn.cursor()
 
         cursor.execute("SELECT COUNT(*) FROM document_chunks;")
@@ -6,6 +6,7 @@ import argparse
 import os
 from app.embedding import get_embeddings
 from app.db import get_vectorstore
+from app.categorizer import detect_document_category
 from langchain_core.documents import Document
 
 
@@ -39,7 +40,8 @@ def load_test_documents(folder_path="test_data/scandinavia", force=False):
                     metadata={
                         "source": filename,
                         "title": title,
-                        "document_id": f"test_{file_count}"
+                        "document_id": f"test_{file_count}",
+                        "category": detect_document_category(content)
                     }
                 )
                 documents.append(doc)
@@ -11,6 +11,7 @@ from langchain_core.documents import Document
 from app.config import DB_CONNECTION, COLLECTION_NAME, EMBEDDING_MODEL
 from app.embedding import get_embeddings
 from app.db import get_vectorstore
+from app.categorizer import detect_document_category
 
 
 def reindex_documents(verbose=False):
@@ -45,7 +46,7 @@ def reindex_documents(verbose=False):
 
         # Belgeleri al
         cursor.execute("""
-        SELECT document_id, title, content 
+        SELECT document_id, title, content, category, chunk_index
         FROM document_chunks 
         ORDER BY document_id, chunk_index
         """)
@@ -56,13 +57,15 @@ def reindex_documents(verbose=False):
         docs = []
         doc_count = 0
 
-        for doc_id, title, content in rows:
+        for doc_id, title, content, category, chunk_index in rows:
             doc = Document(
                 page_content=content,
                 metadata={
                     "source": doc_id,
                     "title": title,
-                    "document_id": doc_id
+                    "document_id": doc_id,
+                    "chunk_index": chunk_index,
+                    "category": category or detect_document_category(content)
                 }
             )
             docs.append(doc)
@@ -30,15 +30,15 @@ def setup_langchain_tables():
         # LangChain embedding tablosunu oluştur (chunk_index sütunu eklenmiştir)
         cursor.execute("""
         CREATE TABLE IF NOT EXISTS langchain_pg_embedding (
-    uuid UUID PRIMARY KEY,
-    collection_id UUID REFERENCES langchain_pg_collection(uuid),
-    document TEXT,
-    embedding vector(384),
-    cmetadata JSON,
-    custom_id VARCHAR(255),
-    chunk_index INTEGER -- EKLENEN SÜTUN
-)
-
+            uuid UUID PRIMARY KEY,
+            collection_id UUID REFERENCES langchain_pg_collection(uuid),
+            document TEXT,
+            embedding vector(384),
+            cmetadata JSON,
+            custom_id VARCHAR(255),
+            chunk_index INTEGER -- EKLENEN SÜTUN
+        )
+        """)
 
         conn.commit()
         print("✅ LangChain tabloları başarıyla oluşturuldu")
@@ -65,13 +65,13 @@ def get_document_categories(conn):
         from app.categorizer import detect_document_category
 
         cursor = conn.cursor()
-        cursor.execute("SELECT document_id, content FROM document_chunks")
+        cursor.execute("SELECT document_id, category, content FROM document_chunks")
         documents = cursor.fetchall()
 
+        # İndekslemede saklanan kategori kullanılır, yalnızca eski kayıtlar için tespit yapılır
         categories = {}
-        for doc_id, content in documents:
-            category = detect_document_category(content)
-            categories[doc_id] = category
+        for doc_id, category, content in documents:
+            categories[doc_id] = category or detect_document_category(content)
 
         return categories
     except Exception as e:
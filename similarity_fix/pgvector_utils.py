@@ -9,6 +9,14 @@ import numpy as np
 from typing import List, Dict, Any, Tuple, Optional, Union
 from dataclasses import dataclass
 
+try:
+    # ragcli içinden çalıştırıldığında bağlantılar paylaşılan havuzdan alınır
+    from app.db import get_db_connection
+
+    has_db_pool = True
+except ImportError:
+    has_db_pool = False
+
 
 @dataclass
 class Document:
@@ -21,25 +29,39 @@ class Document:
 
 
 class PGVectorClient:
-    """PGVector veritabanı ile etkileşim kurmak için istemci."""
+    """
+    PGVector veritabanı ile etkileşim kurmak için istemci.
+
+    Bağlantı parametrelerinden hiçbiri verilmezse ve app.db içe aktarılabiliyorsa
+    bağlantı paylaşılan havuzdan ödünç alınır; disconnect() bağlantıyı havuza geri
+    bırakır. connection_string veya host/kullanıcı gibi parametreler verilirse o
+    veritabanına doğrudan bağlanılır.
+    """
 
     def __init__(self, connection_string: Optional[str] = None,
-                 host: str = "localhost", port: str = "5432",
-                 dbname: str = "ragdb", user: str = "raguser",
-                 password: str = "ragpassword"):
+                 host: Optional[str] = None, port: Optional[str] = None,
+                 dbname: Optional[str] = None, user: Optional[str] = None,
+                 password: Optional[str] = None, use_pool: bool = True):
         """Veritabanı bağlantısını başlatır."""
+        explicit = connection_string is not None or any(
+            value is not None for value in (host, port, dbname, user, password))
         if connection_string:
             self.connection_string = connection_string
         else:
-            self.connection_string = f"postgresql://{user}:{password}@{host}:{port}/{dbname}"
+            self.connection_string = (f"postgresql://{user or 'raguser'}:{password or 'ragpassword'}"
+                                      f"@{host or 'localhost'}:{port or '5432'}/{dbname or 'ragdb'}")
 
+        self.use_pool = use_pool and has_db_pool and not explicit
         self.conn = None
         self.is_connected = False
 
     def connect(self) -> bool:
         """Veritabanına bağlanır."""
         try:
-            self.conn = psycopg2.connect(self.connection_string)
+            if self.use_pool:
+                self.conn = get_db_connection()
+            else:
+                self.conn = psycopg2.connect(self.connection_string)
             self.is_connected = True
             return True
         except Exception as e:
@@ -50,6 +72,7 @@ class PGVectorClient:
         """Veritabanı bağlantısını kapatır."""
         if self.conn:
             self.conn.close()
+            self.conn = None
             self.is_connected = False
 
     def check_table_exists(self, table_name: str) -> bool:
@@ -0,0 +1,215 @@
+"""
+SingleFlight (app.coalesce) testleri.
+"""
+import time
+import asyncio
+import threading
+
+import pytest
+
+from app import coalesce
+from app.coalesce import SingleFlight, bump_corpus_version, get_query_key
+from app.metrics import get_metrics, reset_metrics
+
+
+@pytest.fixture(autouse=True)
+def coalesce_enabled(monkeypatch):
+    monkeypatch.setattr(coalesce, "COALESCE_ENABLED", True)
+    reset_metrics()
+    yield
+    reset_metrics()
+
+
+def run_concurrently(count, target):
+    """target'ı count iş parçacığında çalıştırır; (sonuçlar, hatalar) döndürür"""
+    results, errors = [], []
+
+    def worker():
+        try:
+            results.append(target())
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads, results, errors
+
+
+def wait_for_coalesced(count, timeout=5):
+    """count bekleyen çağrı birleştirilene kadar bekler"""
+    deadline = time.monotonic() + timeout
+    while get_metrics()["coalesced_requests"] < count and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def test_do_runs_concurrent_duplicates_once():
+    flight = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return "cevap"
+
+    leader, results, errors = run_concurrently(1, lambda: flight.do("k", compute))
+    assert started.wait(5)
+    followers, follower_results, _ = run_concurrently(4, lambda: flight.do("k", compute))
+    wait_for_coalesced(4)
+    release.set()
+    for thread in leader + followers:
+        thread.join(5)
+
+    assert calls == [1]
+    assert results + follower_results == ["cevap"] * 5
+    assert errors == []
+    assert flight.calls == {}
+
+
+def test_do_propagates_errors_to_waiters():
+    flight = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+
+    def compute():
+        started.set()
+        release.wait(5)
+        raise RuntimeError("LLM hatası")
+
+    leader, _, leader_errors = run_concurrently(1, lambda: flight.do("k", compute))
+    assert started.wait(5)
+    followers, _, follower_errors = run_concurrently(2, lambda: flight.do("k", compute))
+    wait_for_coalesced(2)
+    release.set()
+    for thread in leader + followers:
+        thread.join(5)
+
+    assert [str(e) for e in leader_errors + follower_errors] == ["LLM hatası"] * 3
+    # Hatadan sonra anahtar serbest kalır; yeni çağrı yeniden hesaplanır
+    assert flight.do("k", lambda: "yeni") == "yeni"
+
+
+def test_do_does_not_share_finished_results():
+    flight = SingleFlight()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return len(calls)
+
+    assert flight.do("k", compute) == 1
+    assert flight.do("k", compute) == 2
+    assert get_metrics()["coalesced_requests"] == 0
+
+
+def test_do_runs_every_call_when_disabled(monkeypatch):
+    monkeypatch.setattr(coalesce, "COALESCE_ENABLED", False)
+    flight = SingleFlight()
+
+    assert flight.do("k", lambda: 1) == 1
+    assert flight.calls == {}
+
+
+def test_ado_runs_concurrent_duplicates_once():
+    async def scenario():
+        flight = SingleFlight()
+        calls = []
+
+        async def compute():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return "cevap"
+
+        results = await asyncio.gather(*(flight.ado("k", compute) for _ in range(5)))
+        return calls, results, flight.tasks
+
+    calls, results, tasks = asyncio.run(scenario())
+
+    assert calls == [1]
+    assert results == ["cevap"] * 5
+    assert tasks == {}
+    assert get_metrics()["coalesced_requests"] == 4
+
+
+def test_ado_propagates_errors_to_waiters():
+    async def scenario():
+        flight = SingleFlight()
+
+        async def compute():
+            await asyncio.sleep(0.01)
+            raise RuntimeError("LLM hatası")
+
+        return await asyncio.gather(*(flight.ado("k", compute) for _ in range(3)), return_exceptions=True)
+
+    results = asyncio.run(scenario())
+
+    assert [str(e) for e in results] == ["LLM hatası"] * 3
+    assert all(isinstance(e, RuntimeError) for e in results)
+
+
+def test_ado_cancelling_leader_does_not_fail_followers():
+    async def scenario():
+        flight = SingleFlight()
+        release = asyncio.Event()
+
+        async def compute():
+            await release.wait()
+            return "cevap"
+
+        leader = asyncio.ensure_future(flight.ado("k", compute))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(flight.ado("k", compute))
+        await asyncio.sleep(0)
+
+        leader.cancel()
+        await asyncio.sleep(0)
+        release.set()
+        return leader, await follower
+
+    leader, follower_result = asyncio.run(scenario())
+
+    assert leader.cancelled()
+    assert follower_result == "cevap"
+
+
+def test_query_key_changes_after_corpus_version_bump():
+    before = get_query_key("Film kimin?", "default", "DocumentResponse", rerank=True)
+    same = get_query_key("  FILM   kimin ", "default", "DocumentResponse", rerank=True)
+    bump_corpus_version()
+    after = get_query_key("Film kimin?", "default", "DocumentResponse", rerank=True)
+
+    assert same == before
+    assert before != after
+    assert before[:4] == after[:4]
+    assert after[4] == before[4] + 1
+    assert get_query_key("Film kimin?", "default", "DocumentResponse", rerank=False) != after
+
+
+def test_new_corpus_version_does_not_join_running_call():
+    flight = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def compute(label):
+        calls.append(label)
+        if label == "eski":
+            started.set()
+            release.wait(5)
+        return label
+
+    old_key = get_query_key("soru", "default", "DocumentResponse")
+    leader, results, _ = run_concurrently(1, lambda: flight.do(old_key, compute, "eski"))
+    assert started.wait(5)
+
+    bump_corpus_version()
+    new_key = get_query_key("soru", "default", "DocumentResponse")
+    assert flight.do(new_key, compute, "yeni") == "yeni"
+
+    release.set()
+    leader[0].join(5)
+    assert calls == ["eski", "yeni"]
+    assert results == ["eski"]
@@ -0,0 +1,286 @@
+"""
+ConnectionPool testleri; psycopg2.connect sahte bir bağlantıyla değiştirilir.
+"""
+import time
+import sqlite3
+import threading
+import importlib.util
+from pathlib import Path
+
+import psycopg2
+import pytest
+import sqlalchemy
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE, TRANSACTION_STATUS_INTRANS
+from psycopg2.pool import PoolError
+
+from app import db
+from app.db import BorrowingPool, ConnectionPool
+from app.metrics import get_metrics, reset_metrics
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def execute(self, query, params=None):
+        if self.conn.broken:
+            raise psycopg2.OperationalError("sunucu bağlantıyı kapattı")
+        self.conn.queries.append(query)
+        self.conn.status = TRANSACTION_STATUS_INTRANS
+
+    def fetchone(self):
+        return (1,)
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = 0
+        self.autocommit = False
+        self.broken = False
+        self.status = TRANSACTION_STATUS_IDLE
+        self.queries = []
+        self.rollbacks = 0
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.status = TRANSACTION_STATUS_IDLE
+
+    def rollback(self):
+        if self.broken:
+            raise psycopg2.OperationalError("sunucu bağlantıyı kapattı")
+        self.rollbacks += 1
+        self.status = TRANSACTION_STATUS_IDLE
+
+    def get_transaction_status(self):
+        return self.status
+
+    def close(self):
+        self.closed = 1
+
+
+@pytest.fixture
+def opened(monkeypatch):
+    """Açılan sahte bağlantıların listesi"""
+    connections = []
+
+    def connect(dsn):
+        conn = FakeConnection()
+        connections.append(conn)
+        return conn
+
+    monkeypatch.setattr(db.psycopg2, "connect", connect)
+    reset_metrics()
+    yield connections
+    reset_metrics()
+
+
+def make_pool(**options):
+    settings = dict(dsn="postgresql://test", min_size=0, max_size=2, timeout=0.2, health_check_idle=60,
+                    max_lifetime=600)
+    settings.update(options)
+    return ConnectionPool(**settings)
+
+
+def test_min_size_connections_opened_up_front(opened):
+    pool = make_pool(min_size=2, max_size=3)
+    assert len(opened) == 2
+    assert pool.snapshot() == {"size": 2, "idle": 2, "max_size": 3}
+
+
+def test_connections_are_reused(opened):
+    pool = make_pool()
+    for _ in range(5):
+        conn = pool.acquire()
+        conn.cursor().execute("SELECT 1")
+        conn.close()
+
+    assert len(opened) == 1
+    assert get_metrics()["db_pool"]["acquired"] == 5
+
+
+def test_acquire_times_out_when_exhausted(opened):
+    pool = make_pool(max_size=2, timeout=0.1)
+    first, second = pool.acquire(), pool.acquire()
+
+    start_time = time.monotonic()
+    with pytest.raises(PoolError):
+        pool.acquire()
+    assert time.monotonic() - start_time >= 0.1
+    assert get_metrics()["db_pool"]["timeouts"] == 1
+    assert len(opened) == 2
+
+    first.close()
+    second.close()
+
+
+def test_waiter_gets_released_connection(opened):
+    pool = make_pool(max_size=1, timeout=2)
+    conn = pool.acquire()
+    threading.Timer(0.1, conn.close).start()
+
+    waited = pool.acquire()
+    assert waited._conn is opened[0]
+    assert get_metrics()["db_pool"]["max_wait_seconds"] >= 0.05
+    waited.close()
+
+
+def test_release_rolls_back_open_transaction(opened):
+    pool = make_pool()
+    conn = pool.acquire()
+    conn.autocommit = True
+    conn.cursor().execute("UPDATE document_chunks SET category = NULL")
+    conn.close()
+
+    raw = opened[0]
+    assert raw.rollbacks == 1
+    assert raw.status == TRANSACTION_STATUS_IDLE
+    assert raw.autocommit is False
+    assert pool.snapshot()["idle"] == 1
+
+
+def test_close_twice_releases_once(opened):
+    pool = make_pool()
+    conn = pool.acquire()
+    conn.close()
+    conn.close()
+
+    assert conn.closed
+    assert pool.snapshot() == {"size": 1, "idle": 1, "max_size": 2}
+    with pytest.raises(psycopg2.InterfaceError):
+        conn.cursor()
+
+
+def test_broken_connection_is_not_returned(opened):
+    pool = make_pool()
+    conn = pool.acquire()
+    opened[0].broken = True
+    opened[0].status = TRANSACTION_STATUS_INTRANS
+    conn.close()
+
+    assert opened[0].closed
+    assert pool.snapshot()["size"] == 0
+
+
+def test_expired_connection_is_replaced(opened):
+    pool = make_pool(max_lifetime=0.05)
+    pool.acquire().close()
+    time.sleep(0.06)
+
+    conn = pool.acquire()
+    assert conn._conn is opened[1]
+    assert opened[0].closed
+    assert get_metrics()["db_pool"]["expired"] == 1
+    conn.close()
+
+
+def test_failed_health_check_replaces_idle_connection(opened):
+    pool = make_pool(health_check_idle=0.01)
+    pool.acquire().close()
+    time.sleep(0.02)
+    opened[0].broken = True
+
+    conn = pool.acquire()
+    assert conn._conn is opened[1]
+    assert opened[0].closed
+    assert get_metrics()["db_pool"]["health_check_failures"] == 1
+    conn.close()
+
+
+def test_healthy_idle_connection_is_checked_and_reused(opened):
+    pool = make_pool(health_check_idle=0.01)
+    pool.acquire().close()
+    time.sleep(0.02)
+
+    conn = pool.acquire()
+    assert conn._conn is opened[0]
+    assert opened[0].queries == ["SELECT 1"]
+    conn.close()
+
+
+def test_closed_pool_rejects_and_closes_returned(opened):
+    pool = make_pool()
+    conn = pool.acquire()
+    pool.close()
+
+    with pytest.raises(PoolError):
+        pool.acquire()
+    conn.close()
+    assert opened[0].closed
+    assert pool.snapshot()["size"] == 0
+
+
+def test_pgvector_client_uses_pool_only_without_explicit_parameters():
+    path = Path(__file__).resolve().parent.parent / "similarity_fix" / "pgvector_utils.py"
+    spec = importlib.util.spec_from_file_location("pgvector_utils_test", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+
+    assert module.PGVectorClient().use_pool is True
+    assert module.PGVectorClient(connection_string="postgresql://a:b@db:5432/other").use_pool is False
+    assert module.PGVectorClient(host="db").use_pool is False
+    assert module.PGVectorClient(use_pool=False).use_pool is False
+
+
+class SqliteConnection(sqlite3.Connection):
+    """Havuzun kullandığı psycopg2 özniteliklerini taklit eden sqlite bağlantısı"""
+    closed = 0
+    autocommit = False
+
+    def get_transaction_status(self):
+        return TRANSACTION_STATUS_INTRANS if self.in_transaction else TRANSACTION_STATUS_IDLE
+
+    def close(self):
+        self.closed = 1
+        super().close()
+
+
+def test_vectorstore_engine_borrows_from_pool(monkeypatch):
+    connections = []
+
+    def connect(dsn):
+        conn = sqlite3.connect(":memory:", factory=SqliteConnection, check_same_thread=False)
+        connections.append(conn)
+        return conn
+
+    monkeypatch.setattr(db.psycopg2, "connect", connect)
+    pool = make_pool()
+    monkeypatch.setattr(db, "_pool", pool)
+    engine = sqlalchemy.create_engine("sqlite://", poolclass=BorrowingPool)
+
+    for _ in range(3):
+        with engine.connect() as conn:
+            assert pool.snapshot()["idle"] == 0
+            assert conn.execute(sqlalchemy.text("SELECT 1")).scalar() == 1
+
+    assert len(connections) == 1
+    assert not connections[0].closed
+    assert pool.snapshot() == {"size": 1, "idle": 1, "max_size": 2}
+    engine.dispose()
+    pool.close()
+
+
+def test_vectorstore_is_created_once_per_embedding_model(monkeypatch):
+    created = []
+
+    class FakePGVector:
+        def __init__(self, **kwargs):
+            created.append(kwargs)
+
+    class FakeEmbeddings:
+        def __init__(self, model_name):
+            self.model_name = model_name
+
+    monkeypatch.setattr(db, "PGVector", FakePGVector)
+    monkeypatch.setattr(db, "_vectorstores", {})
+
+    first = db.get_vectorstore(FakeEmbeddings("model-a"))
+    assert db.get_vectorstore(FakeEmbeddings("model-a")) is first
+    assert db.get_vectorstore(FakeEmbeddings("model-b")) is not first
+    assert len(created) == 2
+    assert created[0]["engine_args"] == {"poolclass": BorrowingPool}
+    assert created[0]["connection_string"] == "postgresql+psycopg2://"
@@ -0,0 +1,132 @@
+"""
+StreamingJSONParser ve collect_json testleri.
+"""
+import pytest
+
+from app.json_stream import UNPARSED, StreamingJSONParser, collect_json, parse_json_object, parse_value
+
+
+def feed_tokens(tokens):
+    parser = StreamingJSONParser()
+    for token in tokens:
+        parser.feed(token)
+    return parser
+
+
+class ClosingStream:
+    """close() çağrısını ve tüketilen token sayısını kaydeden token akışı"""
+
+    def __init__(self, tokens):
+        self.tokens = iter(tokens)
+        self.consumed = 0
+        self.closed = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        token = next(self.tokens)
+        self.consumed += 1
+        return token
+
+    def close(self):
+        self.closed = True
+
+
+def test_tokens_split_across_keys_and_values():
+    text = '{"title": "Yapay Zeka", "year": 2024, "tags": ["a", "b"]}'
+    parser = feed_tokens(text[i:i + 3] for i in range(0, len(text), 3))
+
+    assert parser.done
+    assert parser.fields == {"title": "Yapay Zeka", "year": 2024, "tags": ["a", "b"]}
+
+
+def test_single_character_tokens_complete_fields_incrementally():
+    parser = StreamingJSONParser()
+    completed = [parser.feed(ch) for ch in '{"a": 1, "b": "x"}']
+
+    assert {"a": 1} in completed
+    assert {"b": "x"} in completed
+    assert parser.fields == {"a": 1, "b": "x"}
+
+
+def test_escaped_quotes_and_delimiters_inside_strings():
+    text = r'{"quote": "Dedi ki: \"merhaba, {dünya}\"", "single": ' + r"'it\'s'" + '}'
+    parser = feed_tokens([text[:15], text[15:30], text[30:]])
+
+    assert parser.done
+    assert parser.fields == {"quote": 'Dedi ki: "merhaba, {dünya}"', "single": "it's"}
+
+
+def test_nested_objects_are_returned_as_values():
+    text = '{"a": {"b": {"c": [1, {"d": 2}]}}, "e": [[1], [2]]}'
+    parser = feed_tokens(text[i:i + 4] for i in range(0, len(text), 4))
+
+    assert parser.done
+    assert parser.fields == {"a": {"b": {"c": [1, {"d": 2}]}}, "e": [[1], [2]]}
+
+
+def test_preamble_and_trailing_text_are_ignored():
+    result = parse_json_object('Cevap:\n```json\n{"a": 1}\n```\nBaşka bir {"b": 2}')
+
+    assert result == {"a": 1}
+
+
+def test_truncated_output_keeps_completed_fields():
+    parser = feed_tokens(['{"a": 1, "b": {"x": ', '[1, 2', '], "c": "yarım'])
+
+    assert not parser.done
+    assert parser.fields == {"a": 1}
+    assert parser.result() == {"a": 1}
+
+
+def test_truncated_output_without_fields_returns_none():
+    assert parse_json_object('{"a": "bitmemiş') is None
+    assert parse_json_object("JSON yok") is None
+
+
+def test_malformed_nested_value_is_unparsed():
+    result = parse_json_object('{"a": 1, "b": {"x": [1,}], "c": [1, 2}]}')
+
+    assert result == {"a": 1}
+
+
+def test_parse_value_rejects_broken_containers():
+    assert parse_value('{"x": [1,}]') is UNPARSED
+    assert parse_value("[1, 2}") is UNPARSED
+    assert parse_value("{[1]: 2}") is UNPARSED
+    assert parse_value("") is UNPARSED
+    assert parse_value("[1, 2,]") == [1, 2]
+    assert parse_value("None") is None
+    assert parse_value("tırnaksız metin") == "tırnaksız metin"
+
+
+def test_collect_json_stops_early_and_closes_stream():
+    stream = ClosingStream(['Tamam: {"a": ', '1}', ' açıklama', ' daha fazla'])
+    raw, parser = collect_json(stream)
+
+    assert raw == 'Tamam: {"a": 1}'
+    assert parser.fields == {"a": 1}
+    assert stream.consumed == 2
+    assert stream.closed
+
+
+def test_collect_json_closes_stream_on_truncated_output():
+    stream = ClosingStream(['{"a": 1, ', '"b": '])
+    raw, parser = collect_json(stream)
+
+    assert raw == '{"a": 1, "b": '
+    assert not parser.done
+    assert parser.result() == {"a": 1}
+    assert stream.closed
+
+
+def test_collect_json_closes_stream_on_error():
+    class FailingStream(ClosingStream):
+        def __next__(self):
+            raise RuntimeError("bağlantı koptu")
+
+    stream = FailingStream([])
+    with pytest.raises(RuntimeError):
+        collect_json(stream)
+    assert stream.closed
@@ -0,0 +1,132 @@
+"""
+OllamaClient testleri; /api/generate için yerel bir http.server taklidi kullanılır.
+"""
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from app import llm_client
+from app.llm_client import OllamaClient, warmup_llm
+from app.metrics import get_metrics, reset_metrics
+
+
+class OllamaStubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.server.requests.append({"payload": body, "client": self.client_address})
+
+        if self.server.status != 200:
+            data = b'{"error": "model yok"}'
+            self.send_response(self.server.status)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+            return
+
+        done = dict(self.server.timings, done=True)
+        if body["stream"]:
+            events = [{"response": token, "done": False} for token in ("Mer", "haba")]
+            events.append(dict(done, response=""))
+            data = ("\n".join(json.dumps(event) for event in events) + "\n").encode()
+        else:
+            data = json.dumps(dict(done, response="Merhaba")).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson" if body["stream"] else "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+@pytest.fixture
+def ollama_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), OllamaStubHandler)
+    server.requests = []
+    server.status = 200
+    server.timings = {"load_duration": 5_000_000, "eval_duration": 400_000_000, "eval_count": 20,
+                      "prompt_eval_duration": 100_000_000, "prompt_eval_count": 50,
+                      "total_duration": 600_000_000}
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def client(ollama_server):
+    reset_metrics()
+    client = OllamaClient(base_url=f"http://127.0.0.1:{ollama_server.server_port}", keep_alive="15m", timeout=5)
+    yield client
+    client.close()
+    reset_metrics()
+
+
+def test_generate_reuses_connection(client, ollama_server):
+    for _ in range(3):
+        assert client.generate("Merhaba?")["response"] == "Merhaba"
+
+    clients = {request["client"] for request in ollama_server.requests}
+    assert len(ollama_server.requests) == 3
+    assert len(clients) == 1
+
+
+def test_stream_reuses_connection(client, ollama_server):
+    for _ in range(2):
+        tokens = [event.get("response", "") for event in client.stream("Merhaba?")]
+        assert "".join(tokens) == "Merhaba"
+    client.generate("Merhaba?")
+
+    assert len({request["client"] for request in ollama_server.requests}) == 1
+
+
+def test_payload_contains_keep_alive(client, ollama_server):
+    client.generate("Soru", model="test-model", options={"temperature": 0})
+    list(client.stream("Soru"))
+
+    generate_payload, stream_payload = (request["payload"] for request in ollama_server.requests)
+    assert generate_payload["keep_alive"] == "15m"
+    assert generate_payload["model"] == "test-model"
+    assert generate_payload["options"] == {"temperature": 0}
+    assert generate_payload["stream"] is False
+    assert stream_payload["keep_alive"] == "15m"
+    assert stream_payload["stream"] is True
+
+
+def test_warmup_failure_does_not_raise(client, ollama_server, monkeypatch):
+    ollama_server.status = 500
+    monkeypatch.setattr(llm_client, "_client", client)
+
+    assert warmup_llm() is False
+    assert get_metrics()["errors"] == 1
+    assert get_metrics()["requests"] == 0
+
+
+def test_warmup_success(client, ollama_server, monkeypatch):
+    monkeypatch.setattr(llm_client, "_client", client)
+
+    assert warmup_llm("test-model") is True
+    assert ollama_server.requests[0]["payload"]["prompt"] == ""
+    assert ollama_server.requests[0]["payload"]["model"] == "test-model"
+
+
+def test_metrics_split_cold_start_and_eval(client, ollama_server):
+    ollama_server.timings["load_duration"] = 3_000_000_000
+    client.generate("İlk soru")
+    ollama_server.timings["load_duration"] = 5_000_000
+    list(client.stream("İkinci soru"))
+
+    metrics = get_metrics()
+    assert metrics["requests"] == 2
+    assert metrics["cold_starts"] == 1
+    assert metrics["load_seconds"] == pytest.approx(3.005)
+    assert metrics["eval_seconds"] == pytest.approx(0.8)
+    assert metrics["avg_eval_seconds"] == pytest.approx(0.4)
+    assert metrics["generated_tokens"] == 40
+    assert metrics["tokens_per_second"] == pytest.approx(50.0)
@@ -0,0 +1,53 @@
+"""
+search_chunks testleri; get_db_connection sorguyu kaydeden sahte bir bağlantıyla değiştirilir.
+"""
+import pytest
+
+from app import retrieval
+from app.retrieval import search_chunks
+
+
+class RecordingConnection:
+    def __init__(self, rows):
+        self.rows = rows
+        self.executed = []
+
+    def cursor(self):
+        return self
+
+    def execute(self, query, params=None):
+        self.executed.append((query, params))
+
+    def fetchall(self):
+        return self.rows
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def connection(monkeypatch):
+    conn = RecordingConnection([(1, "doc", "Başlık", "İçerik", 0, 2, "genel", 0.25, [1.0, 0.0])])
+    monkeypatch.setattr(retrieval, "get_db_connection", lambda: conn)
+    return conn
+
+
+def test_search_chunks_uses_cosine_distance(connection):
+    results, embeddings = search_chunks([1.0, 0.0], k=3, with_embeddings=True, embedding_model="model-a")
+
+    query, params = connection.executed[0]
+    assert "<=>" in query
+    assert "<->" not in query
+    assert params == ("[1.0,0.0]", "model-a", "[1.0,0.0]", 3)
+    assert results[0][0].metadata["document_id"] == "doc"
+    assert results[0][1] == 0.25
+    assert embeddings.shape == (1, 2)
+
+
+def test_search_chunks_filters_on_embedding_model(connection, monkeypatch):
+    monkeypatch.setattr(retrieval, "EMBEDDING_MODEL", "varsayilan-model")
+    search_chunks([1.0, 0.0])
+
+    query, params = connection.executed[0]
+    assert "embedding_model = %s" in query
+    assert params[1] == "varsayilan-model"
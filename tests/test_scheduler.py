@@ -0,0 +1,206 @@
+"""
+LLMScheduler testleri: öncelik sırası, şerit içinde geliş sırası, son başlama zamanı
+ve iptal edilen asenkron bekleyenlerin hakkı geri bırakması.
+"""
+import time
+import asyncio
+import threading
+
+import pytest
+
+from app.metrics import record_generation, reset_metrics, get_metrics
+from app.scheduler import LLMScheduler, LLMQueueTimeout, PRIORITY_INTERACTIVE, PRIORITY_BATCH
+
+
+@pytest.fixture(autouse=True)
+def clean_metrics():
+    reset_metrics()
+    yield
+    reset_metrics()
+
+
+def wait_until(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "koşul zamanında sağlanmadı"
+        time.sleep(0.005)
+
+
+def start_waiter(scheduler, name, priority, started):
+    """Hak alınca adını listeye ekleyip hemen bırakan senkron bekleyen başlatır"""
+    def run():
+        with scheduler.slot(priority, None):
+            started.append(name)
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread
+
+
+def test_sync_priority_and_fifo_order():
+    scheduler = LLMScheduler(max_concurrency=1)
+    scheduler.acquire(PRIORITY_INTERACTIVE, None)
+    started = []
+    threads = []
+    for name, priority in [("batch-1", PRIORITY_BATCH), ("interactive-1", PRIORITY_INTERACTIVE),
+                           ("batch-2", PRIORITY_BATCH), ("interactive-2", PRIORITY_INTERACTIVE)]:
+        threads.append(start_waiter(scheduler, name, priority, started))
+        wait_until(lambda: len(scheduler.waiting) == len(threads))
+
+    scheduler.release()
+    for thread in threads:
+        thread.join(2)
+
+    assert started == ["interactive-1", "interactive-2", "batch-1", "batch-2"]
+    assert scheduler.active == 0 and scheduler.waiting == []
+
+
+def test_async_priority_and_fifo_order():
+    async def scenario():
+        scheduler = LLMScheduler(max_concurrency=1)
+        await scheduler.aacquire(PRIORITY_INTERACTIVE, None)
+        started = []
+
+        async def waiter(name, priority):
+            await scheduler.aacquire(priority, None)
+            started.append(name)
+            scheduler.release()
+
+        tasks = []
+        for name, priority in [("batch-1", PRIORITY_BATCH), ("interactive-1", PRIORITY_INTERACTIVE),
+                               ("batch-2", PRIORITY_BATCH), ("interactive-2", PRIORITY_INTERACTIVE)]:
+            tasks.append(asyncio.create_task(waiter(name, priority)))
+            await asyncio.sleep(0)
+
+        assert scheduler.snapshot()["waiting"] == {"interactive": 2, "batch": 2}
+        scheduler.release()
+        await asyncio.wait_for(asyncio.gather(*tasks), 2)
+        return scheduler, started
+
+    scheduler, started = asyncio.run(scenario())
+    assert started == ["interactive-1", "interactive-2", "batch-1", "batch-2"]
+    assert scheduler.active == 0 and scheduler.waiting == []
+
+
+def test_async_waiters_do_not_use_threads():
+    async def scenario():
+        scheduler = LLMScheduler(max_concurrency=1)
+        await scheduler.aacquire(PRIORITY_INTERACTIVE, None)
+        threads_before = threading.active_count()
+        tasks = [asyncio.create_task(scheduler.aacquire(PRIORITY_BATCH, None)) for _ in range(50)]
+        await asyncio.sleep(0.05)
+        assert threading.active_count() == threads_before
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        scheduler.release()
+        return scheduler
+
+    scheduler = asyncio.run(scenario())
+    assert scheduler.active == 0 and scheduler.waiting == []
+
+
+def test_sync_and_async_waiters_share_queue():
+    async def scenario():
+        scheduler = LLMScheduler(max_concurrency=1)
+        scheduler.acquire(PRIORITY_INTERACTIVE, None)
+        started = []
+        thread = start_waiter(scheduler, "sync-batch", PRIORITY_BATCH, started)
+        await asyncio.to_thread(wait_until, lambda: len(scheduler.waiting) == 1)
+
+        async def waiter():
+            await scheduler.aacquire(PRIORITY_INTERACTIVE, None)
+            started.append("async-interactive")
+            scheduler.release()
+
+        task = asyncio.create_task(waiter())
+        await asyncio.sleep(0)
+        scheduler.release()
+        await asyncio.wait_for(task, 2)
+        await asyncio.to_thread(thread.join, 2)
+        return scheduler, started
+
+    scheduler, started = asyncio.run(scenario())
+    assert started == ["async-interactive", "sync-batch"]
+    assert scheduler.active == 0
+
+
+def test_upfront_rejection_uses_estimated_wait():
+    # Ortalama istek süresi 10 sn; önünde bir istek olan isteğin 1 sn bekleme hakkı yetmez
+    record_generation({"total_duration": 10_000_000_000})
+    scheduler = LLMScheduler(max_concurrency=1)
+    scheduler.acquire(PRIORITY_INTERACTIVE, None)
+
+    start_time = time.monotonic()
+    with pytest.raises(LLMQueueTimeout, match="kuyruğu dolu"):
+        scheduler.acquire(PRIORITY_INTERACTIVE, time.monotonic() + 1.0)
+    assert time.monotonic() - start_time < 0.5
+
+    async def async_attempt():
+        with pytest.raises(LLMQueueTimeout, match="kuyruğu dolu"):
+            await scheduler.aacquire(PRIORITY_INTERACTIVE, time.monotonic() + 1.0)
+
+    asyncio.run(async_attempt())
+    assert scheduler.waiting == []
+    assert get_metrics()["queue"]["interactive"]["rejected"] == 2
+
+
+def test_timeout_while_waiting():
+    scheduler = LLMScheduler(max_concurrency=1)
+    scheduler.acquire(PRIORITY_INTERACTIVE, None)
+
+    with pytest.raises(LLMQueueTimeout, match="başlatılamadı"):
+        scheduler.acquire(PRIORITY_INTERACTIVE, time.monotonic() + 0.05)
+
+    async def async_attempt():
+        with pytest.raises(LLMQueueTimeout, match="başlatılamadı"):
+            await scheduler.aacquire(PRIORITY_INTERACTIVE, time.monotonic() + 0.05)
+
+    asyncio.run(async_attempt())
+    assert scheduler.waiting == [] and scheduler.async_waiters == {}
+    assert scheduler.active == 1
+    assert get_metrics()["queue"]["interactive"]["rejected"] == 2
+
+    # Zaman aşımına uğrayan bekleyenler kuyruğu tıkamaz
+    scheduler.release()
+    scheduler.acquire(PRIORITY_BATCH, time.monotonic() + 0.05)
+    assert scheduler.active == 1
+
+
+def test_cancelled_waiter_leaves_queue():
+    async def scenario():
+        scheduler = LLMScheduler(max_concurrency=1)
+        await scheduler.aacquire(PRIORITY_INTERACTIVE, None)
+        task = asyncio.create_task(scheduler.aacquire(PRIORITY_INTERACTIVE, None))
+        await asyncio.sleep(0)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+        assert scheduler.waiting == []
+        scheduler.release()
+        await asyncio.wait_for(scheduler.aacquire(PRIORITY_BATCH, None), 1)
+        return scheduler
+
+    scheduler = asyncio.run(scenario())
+    assert scheduler.active == 1
+
+
+def test_slot_released_when_cancelled_after_grant():
+    async def scenario():
+        scheduler = LLMScheduler(max_concurrency=1)
+        await scheduler.aacquire(PRIORITY_INTERACTIVE, None)
+        task = asyncio.create_task(scheduler.aacquire(PRIORITY_INTERACTIVE, None))
+        await asyncio.sleep(0)
+
+        # Hak verilir, ancak bekleyen görev bildirimi almadan iptal edilir
+        scheduler.release()
+        assert scheduler.active == 1 and scheduler.waiting == []
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        await asyncio.sleep(0.01)
+        return scheduler
+
+    scheduler = asyncio.run(scenario())
+    assert scheduler.active == 0
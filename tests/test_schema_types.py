@@ -0,0 +1,118 @@
+"""
+Şema tip dili (app.schema_types) ve llm_enhanced model önbelleği testleri.
+"""
+from typing import Any, Dict, List, Optional
+
+import pytest
+
+from app import llm_enhanced
+from app.schema_types import SchemaTypeError, compile_model_schemas, parse_type, parse_type_expression
+
+
+def test_parse_type_expression_nesting():
+    assert parse_type_expression("str") == ("str", [])
+    assert parse_type_expression("list[Optional[Person]]") == ("list", [("Optional", [("Person", [])])])
+    assert parse_type_expression(" Dict [ str , list[int] ] ") == (
+        "Dict", [("str", []), ("list", [("int", [])])])
+
+
+@pytest.mark.parametrize("expression", [
+    "", "list[", "list[str", "list[]", "[str]", "str]", "list[str,]", "str str", "dict[str,,int]"
+])
+def test_parse_type_expression_rejects_malformed(expression):
+    with pytest.raises(SchemaTypeError):
+        parse_type_expression(expression)
+
+
+@pytest.mark.parametrize("expression", [
+    "__import__('os').system('id')",
+    "str; import os",
+    "list[str].__class__",
+    "eval(\"1\")",
+    "lambda: 0",
+    "Optional[str] or 1",
+])
+def test_parse_type_rejects_injection_strings(expression):
+    with pytest.raises(SchemaTypeError):
+        parse_type(expression)
+
+
+def test_parse_type_builds_python_types():
+    assert parse_type("list[str]") == List[str]
+    assert parse_type("dict[str, Any]") == Dict[str, Any]
+    assert parse_type("Optional[int]") == Optional[int]
+    assert parse_type("list") is list
+
+
+@pytest.mark.parametrize("expression", ["Unknown", "str[int]", "list[str, int]", "Optional", "dict[str]"])
+def test_parse_type_rejects_unknown_or_wrong_arity(expression):
+    with pytest.raises(SchemaTypeError):
+        parse_type(expression)
+
+
+def test_compile_model_schemas_nested_models():
+    compiled = compile_model_schemas({
+        "Library": {"fields": {
+            "name": {"type": "str"},
+            "books": {"type": "list[Book]"},
+            "owner": {"type": "Optional[Person]"}
+        }},
+        "Book": {"fields": {"title": {"type": "str"}, "author": {"type": "Person"}}},
+        "Person": {"fields": {"name": {"type": "str", "description": "Ad"}}}
+    })
+
+    assert compiled["errors"] == {}
+    library = compiled["models"]["Library"].model_validate(
+        {"name": "Merkez", "books": [{"title": "Kitap", "author": {"name": "Yazar"}}]})
+    assert library.books[0].author.name == "Yazar"
+    assert library.owner is None
+    assert compiled["models"]["Person"].model_fields["name"].description == "Ad"
+
+
+def test_compile_model_schemas_reports_cycles():
+    compiled = compile_model_schemas({
+        "A": {"fields": {"b": {"type": "B"}}},
+        "B": {"fields": {"a": {"type": "list[A]"}}},
+        "Self": {"fields": {"child": {"type": "Optional[Self]"}}},
+        "Ok": {"fields": {"x": {"type": "int"}}}
+    })
+
+    assert set(compiled["errors"]) == {"A", "B", "Self"}
+    assert "Döngüsel" in compiled["errors"]["Self"]
+    assert set(compiled["models"]) == {"Ok"}
+
+
+def test_compile_model_schemas_isolates_invalid_schemas():
+    compiled = compile_model_schemas({
+        "Unknown": {"fields": {"x": {"type": "Missing"}}},
+        "Injected": {"fields": {"x": {"type": "__import__('os')"}}},
+        "NoFields": {"description": "alan yok"},
+        "DependsOnBroken": {"fields": {"u": {"type": "Unknown"}}},
+        "Valid": {"fields": {"tags": {"type": "list[str]"}}}
+    })
+
+    assert set(compiled["errors"]) == {"Unknown", "Injected", "NoFields", "DependsOnBroken"}
+    assert "Bilinmeyen tip" in compiled["errors"]["Unknown"]
+    assert set(compiled["models"]) == {"Valid"}
+
+
+def test_enhanced_models_are_compiled_once(monkeypatch):
+    calls = []
+    original = llm_enhanced.compile_model_schemas
+
+    def counting_compile(definitions):
+        calls.append(definitions)
+        return original(definitions)
+
+    monkeypatch.setattr(llm_enhanced, "compile_model_schemas", counting_compile)
+    monkeypatch.setattr(llm_enhanced, "_models", None)
+    monkeypatch.setattr(llm_enhanced, "_response_formats", {})
+
+    film = llm_enhanced.create_film_info_model()
+    assert llm_enhanced.get_model_for_category("film") is film
+    assert llm_enhanced.get_model_for_category("diğer") is llm_enhanced.get_model("GeneralInfo")
+    assert llm_enhanced.get_response_format("FilmInfo") is llm_enhanced.get_response_format("FilmInfo")
+    assert len(calls) == 1
+    assert set(film.model_fields) == set(llm_enhanced.get_expected_schema("FilmInfo"))
+    assert llm_enhanced.get_expected_schema("FilmInfo")["cast"] == "list"
+    assert llm_enhanced.get_expected_schema("FilmInfo")["title"] == "str"